@@ -2,7 +2,6 @@
 from pathlib import Path
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
 
 # Cargar archivo .env desde la carpeta app
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
@@ -18,8 +17,18 @@ if not GITHUB_TOKEN:
 # Modelo que vas a usar
 MODEL_NAME = "openai/gpt-4o"
 
-# Cliente OpenAI apuntando al endpoint de GitHub Models
-client = OpenAI(base_url=OPENAI_EMBEDDINGS_URL, api_key=GITHUB_TOKEN)
+# Cliente OpenAI apuntando al endpoint de GitHub Models; se crea al primer uso de
+# config.client para no importar el SDK al arrancar la API
+_client = None
+
+def __getattr__(name):
+    global _client
+    if name == "client":
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(base_url=OPENAI_EMBEDDINGS_URL, api_key=GITHUB_TOKEN)
+        return _client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 DATA_DIR = Path(__file__).resolve().parent / "data"
 RAW_DIR = DATA_DIR / "raw"
@@ -28,11 +37,54 @@ MODELS_DIR = DATA_DIR / "models"
 LOGS_DIR = DATA_DIR / "logs"
 GEO_DIR = DATA_DIR / "geo"
 
+# Portal Socrata de origen (se puede apuntar a un servidor local de fixtures CSV)
+DATOS_GOV_URL = os.getenv("DATOS_GOV_URL", "https://www.datos.gov.co").rstrip("/")
+
 SOURCES = {
-    "sexuales": "https://www.datos.gov.co/resource/fpe5-yrmw.csv?$limit=500000",
-    "intrafamiliar": "https://www.datos.gov.co/resource/vuyt-mqpw.csv?$limit=800000",
-    "hurtos": "https://www.datos.gov.co/resource/d4fr-sbn2.csv?$limit=100000",
+    "sexuales": f"{DATOS_GOV_URL}/resource/fpe5-yrmw.csv?$limit=500000",
+    "intrafamiliar": f"{DATOS_GOV_URL}/resource/vuyt-mqpw.csv?$limit=800000",
+    "hurtos": f"{DATOS_GOV_URL}/resource/d4fr-sbn2.csv?$limit=100000",
 }
+# Caché de respuestas del LLM: TTL en segundos, máximo de entradas en memoria y carpeta
+# opcional para persistirlas en disco (vacío = solo memoria)
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR") or None
+
+# Precalentamiento al arrancar la API: carga datasets, modelo e índices en un hilo de fondo
+# con WARMUP_WORKERS hilos en paralelo (WARMUP=0 lo desactiva y todo se carga al primer uso)
+WARMUP = os.getenv("WARMUP", "1") != "0"
+WARMUP_WORKERS = int(os.getenv("WARMUP_WORKERS", "4"))
+
+# Token para los endpoints /admin (header X-Admin-Token); vacío = endpoints cerrados
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+
+# Versiones de modelo que se conservan en data/models/versions (la activa nunca se borra)
+MODEL_KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", "5"))
+
+# Puntos de la curva PR que se guardan en validation.json de cada versión
+PR_CURVE_POINTS = int(os.getenv("PR_CURVE_POINTS", "200"))
+
+# Explicaciones SHAP precalculadas al entrenar: filas por lote y procesos (0 = un proceso por
+# núcleo, 1 = en el proceso principal)
+EXPLAIN_BATCH = int(os.getenv("EXPLAIN_BATCH", "512"))
+EXPLAIN_WORKERS = int(os.getenv("EXPLAIN_WORKERS", "0"))
+
+# Búsqueda de hiperparámetros (python -m app.services.tuning): pliegues temporales de
+# TUNE_HORIZON meses y procesos en paralelo (0 = todos los núcleos)
+TUNE_FOLDS = int(os.getenv("TUNE_FOLDS", "4"))
+TUNE_HORIZON = int(os.getenv("TUNE_HORIZON", "3"))
+TUNE_WORKERS = int(os.getenv("TUNE_WORKERS", "0"))
+TUNING_DIR = MODELS_DIR / "tuning"
+
+# Grano de entrenamiento: "municipio_mes" (una fila ponderada por municipio-mes) o "evento"
+TRAIN_GRAIN = os.getenv("TRAIN_GRAIN", "municipio_mes")
+
+# Estimador: "gb" (GradientBoosting exacto), "hgb" (HistGradientBoosting) o "xgb" (XGBoost);
+# TRAIN_THREADS limita los hilos de hgb/xgb (0 = todos los núcleos)
+TRAIN_ESTIMATOR = os.getenv("TRAIN_ESTIMATOR", "gb")
+TRAIN_THREADS = int(os.getenv("TRAIN_THREADS", "0"))
+
 COMMON_COLS = [
     "departamento","municipio","codigo_dane","armas_medios","fecha_hecho",
     "genero","grupo_etario","cantidad"
@@ -1,12 +1,44 @@
 # app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routers import analytics, chatbot, crimes, geo
+from fastapi.responses import JSONResponse
+from app.config import WARMUP
+from app.routers import admin, analytics, chatbot, crimes, geo
+from app.services import entities, index, llm, spatial, store, warmup
 from fastapi.middleware.cors import CORSMiddleware 
-app = FastAPI(title="Santander Security API", version="1.0.0")
+
+def _warmup_tasks():
+ # Cadenas independientes entre si; cada una carga lo que pagaria el primer request
+ return {
+  "master": lambda: (index.get("master"), spatial.get("master")),
+  "cubo": entities.get,
+  "modelo": analytics._predictions,
+  "kpis": analytics._kpis,
+ }
+
+@asynccontextmanager
+async def lifespan(app):
+ if WARMUP:
+  warmup.start(_warmup_tasks())
+ yield
+ # Cierra el pool de conexiones del cliente async del LLM
+ await llm.close()
+
+app = FastAPI(title="Santander Security API", version="1.0.0", lifespan=lifespan)
 
 @app.get("/health")
 def health():
- return {"status": "ok"}
+ return {"status": "ok", "ready": warmup.ready(), "warmup": warmup.state()}
+
+@app.get("/health/ready")
+def health_ready():
+ # Para readiness probes: 503 mientras el precalentamiento no termina
+ return JSONResponse({"ready": warmup.ready()}, status_code=200 if warmup.ready() else 503)
+
+@app.get("/health/datasets")
+def health_datasets():
+ # RSS del proceso y tiempo de carga y tamaño en memoria de cada dataset compartido ya cargado
+ return store.stats()
 
 app.add_middleware(
  CORSMiddleware,
@@ -19,4 +51,5 @@ app.add_middleware(
 app.include_router(analytics.router)
 app.include_router(crimes.router)
 app.include_router(geo.router)
-app.include_router(chatbot.router)
\ No newline at end of file
+app.include_router(chatbot.router)
+app.include_router(admin.router)
\ No newline at end of file
@@ -18,6 +18,9 @@ class MetricsResponse(BaseModel):
     roc_auc: float
     pr_auc: float
     report: dict
+    version: Optional[str] = None
+    split: Optional[Dict[str, Any]] = None
+    pr_curve: Optional[Dict[str, List[float]]] = None
 
 class TrendPoint(BaseModel):
     anio: int
@@ -29,6 +32,20 @@ class MunicipioDistributionItem(BaseModel):
     municipio: str
     incidentes: int
 
+class ContributionItem(BaseModel):
+    variable: str
+    valor: Any
+    aporte: float  # log-odds
+
+class ExplainResponse(BaseModel):
+    version: str
+    municipio: str
+    anio: int
+    mes: int
+    probabilidad: float
+    base: float
+    contribuciones: List[ContributionItem]
+
 # Crimes
 class CrimeQuery(BaseModel):
     departamento: str = "SANTANDER"
@@ -36,7 +53,8 @@ class CrimeQuery(BaseModel):
     tipo_delito: Optional[str] = None
     anio: Optional[int] = None
     mes: Optional[int] = None
-    limit: int = 100
+    limit: int = Field(100, ge=1, le=1000)
+    cursor: Optional[str] = None  # "fecha_ns:fila" devuelto en X-Next-Cursor
 
 # Para /crimes/query (estructura simple)
 class CrimeRecord(BaseModel):
@@ -64,6 +82,13 @@ class GeoIncident(BaseModel):
     estado: str
     municipio: str
 
+class GeoHeatCell(BaseModel):
+    lat: float
+    lon: float
+    incidentes: int
+    eventos: int
+    intensidad: float
+
 # Chatbot
 class ChatRequest(BaseModel):
     pregunta: str
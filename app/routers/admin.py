@@ -0,0 +1,58 @@
+# app/routers/admin.py
+import secrets
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from app.config import ADMIN_TOKEN
+from app.routers import analytics
+from app.services import registry
+
+def require_token(x_admin_token: Optional[str] = Header(None)):
+    # Header X-Admin-Token; sin ADMIN_TOKEN configurado los endpoints de admin quedan cerrados
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="ADMIN_TOKEN no está configurado")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_token)])
+
+@router.post("/reload")
+def reload(version: Optional[str] = None):
+    # Activa `version` (rollback) o relee current.json, y carga el modelo con sus predicciones
+    # y métricas antes de responder. Los requests en curso terminan con el modelo anterior
+    anterior = registry.current_version()
+    if version:
+        # Solo versiones publicadas en el registro (el nombre no se usa como ruta sin validar)
+        if version not in registry.versions():
+            raise HTTPException(status_code=404, detail=f"Versión de modelo desconocida: {version}")
+        registry.activate(version)
+    t0 = time.perf_counter()
+    activo = registry.active(force=True)
+    analytics._predictions()
+    metricas = analytics._metrics(activo.version)
+    return {
+        "version": activo.version,
+        "anterior": anterior,
+        "roc_auc": metricas["roc_auc"],
+        "pr_auc": metricas["pr_auc"],
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+@router.get("/models")
+def models():
+    # Versiones del registro con sus métricas de entrenamiento
+    activa = registry.current_version()
+    versiones = []
+    for version in registry.versions():
+        info = registry.manifest(version)
+        metricas = info.get("metrics", {})
+        versiones.append({
+            "version": version,
+            "activa": version == activa,
+            "created_at": info.get("created_at"),
+            "grano": info.get("grano"),
+            "estimator": info.get("estimator"),
+            "roc_auc": metricas.get("roc_auc"),
+            "pr_auc": metricas.get("pr_auc"),
+        })
+    return {"activa": activa, "versiones": versiones}
@@ -1,86 +1,93 @@
 # app/routers/analytics.py
 from fastapi import APIRouter, HTTPException
+from functools import lru_cache
 from typing import Optional
-import joblib
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from sklearn.metrics import classification_report, roc_auc_score, precision_recall_curve, auc
-from app.config import MODELS_DIR, PROC_DIR
+from app.services import cube, features, registry, store
 from app.models.schemas import (
     RiskPredictRequest, RiskPredictResponse, MetricsResponse,
-    TrendPoint, MunicipioDistributionItem
+    TrendPoint, MunicipioDistributionItem, ExplainResponse
 )
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
-_model = None
-_features_df = None
-
 def _load_artifacts():
-    global _model, _features_df
-    if _model is None:
-        _model = joblib.load(MODELS_DIR / "risk_model.pkl")
-    if _features_df is None:
-        _features_df = pd.read_parquet(PROC_DIR / "features.parquet")
-        _features_df = _features_df[_features_df["departamento"] == "SANTANDER"].copy()
-
-#def _feature_row(departamento: str, municipio: str | None, anio: int, mes: int) -> pd.DataFrame:
-def _feature_row(departamento: str, municipio: Optional[str], anio: int, mes: int) -> pd.DataFrame:
-    df = _features_df
-    filt = (df["departamento"] == departamento) & (df["anio"] == anio) & (df["mes"] == mes)
-    if municipio and "municipio" in df.columns:
-        filt = filt & (df["municipio"] == municipio)
-    candidates = df.loc[filt]
-    if candidates.empty:
-        raise HTTPException(status_code=404, detail="No hay features para ese periodo/ubicación")
-    # Usamos la fila con mayor 'cantidad' como representativa
-    row = candidates.sort_values("cantidad", ascending=False).head(1)
-    return row[[
-        "departamento","anio","mes",
-        "tasa_delitos_muni_mes_lag","tasa_delitos_dep_mes_lag","acumulado_90d"
-    ]]
+    # Versión activa del registro (se recarga sola si current.json cambió) + features
+    registry.active()
+    return store.get("features")
+
+_pred_index = {}
+
+def _predictions():
+    # Tabla precalculada por train.train_model(), indexada por (anio, mes, municipio)
+    activo = registry.active()
+    df = None
+    if store.exists("predictions"):
+        df, version = store.get("predictions"), store.version("predictions")
+    else:
+        # Respaldo para modelos entrenados antes del scoring batch: se puntúa una vez por versión
+        version = f"{activo.version}:{store.version('features')}"
+    if version not in _pred_index:
+        if df is None:
+            from app.services import train
+            df = store.get("features")
+            if getattr(activo.model, "grano_", "evento") == "municipio_mes":
+                df = features.aggregate_monthly(df)
+            df = train.batch_predictions(activo.model, df)
+        indexed = df.set_index(["anio", "mes", "municipio"]).sort_index()
+        _pred_index.clear()
+        _pred_index[version] = indexed
+        return indexed, version
+    return _pred_index[version], version
 
 @router.get("/municipios")
 def listar_municipios():
-    _load_artifacts()
-    df = _features_df.copy()
+    df = _load_artifacts()
     municipios = sorted(df["municipio"].unique().tolist())
     return {"municipios": municipios}
 
 
-@router.get("/metrics", response_model=MetricsResponse)
-def metrics():
-    _load_artifacts()
-    df = _features_df
-    ultimo_anio = int(df["anio"].max())
-    val_df = df[df["anio"] == ultimo_anio].copy()
-
-    X_val = val_df[[
-        "departamento","anio","mes",
-        "tasa_delitos_muni_mes_lag","tasa_delitos_dep_mes_lag","acumulado_90d"
-    ]]
+@lru_cache(maxsize=4)
+def _metrics(model_version: str) -> dict:
+    # Validación guardada con la versión al entrenar (validation.json, con la curva PR) o el
+    # resumen del manifiesto; para un modelo anterior al registro se calcula una sola vez
+    # desde la tabla de predicciones
+    manifest = registry.active().manifest
+    guardadas = registry.validation(manifest["version"]) if manifest.get("version") else {}
+    guardadas = guardadas or manifest.get("metrics", {})
+    if {"roc_auc", "pr_auc", "report"} <= guardadas.keys():
+        return {"version": manifest.get("version"), **guardadas}
+
+    from sklearn.metrics import classification_report, roc_auc_score, precision_recall_curve, auc
+    preds, _ = _predictions()
+    ultimo_anio = int(preds.index.get_level_values("anio").max())
+    val_df = preds.loc[ultimo_anio]
+
+    # Métricas sobre la tabla municipio-mes, ponderadas por número de eventos
     y_val = val_df["riesgo_alto"]
+    y_proba = val_df["probabilidad"]
+    peso = val_df["eventos"]
+    roc = float(roc_auc_score(y_val, y_proba, sample_weight=peso))
+    precision, recall, _ = precision_recall_curve(y_val, y_proba, sample_weight=peso)
+    pr = float(auc(recall, precision))
+
+    report_dict = classification_report(y_val, val_df["prediccion"], sample_weight=peso, output_dict=True)
+    return {"version": model_version, "roc_auc": roc, "pr_auc": pr, "report": report_dict}
 
-    if hasattr(_model, "predict_proba"):
-        y_proba = _model.predict_proba(X_val)[:, 1]
-        roc = float(roc_auc_score(y_val, y_proba))
-        precision, recall, _ = precision_recall_curve(y_val, y_proba)
-        pr = float(auc(recall, precision))
-    else:
-        roc = pr = 0.0
 
-    report_dict = classification_report(y_val, _model.predict(X_val), output_dict=True)
-    return MetricsResponse(roc_auc=roc, pr_auc=pr, report=report_dict)
+@router.get("/metrics", response_model=MetricsResponse)
+def metrics():
+    return MetricsResponse(**_metrics(registry.active().version))
 
 
 @router.get("/risk/predict")
 def risk_predict():
-    _load_artifacts()
-    df = _features_df.copy()
-    df = df[df["departamento"] == "SANTANDER"]
+    df = _load_artifacts()
+    preds, _ = _predictions()
 
-    if df.empty:
+    if df.empty or preds.empty:
         return {
             "probability": 0.0,
             "contexto": {"mensaje": "No hay datos suficientes para generar contexto"},
@@ -88,35 +95,17 @@ def risk_predict():
         }
 
     # detectar último mes con datos en todo Santander
-    ultimo = df.sort_values(["anio", "mes"]).iloc[-1]
-    anio = int(ultimo["anio"])
-    mes = int(ultimo["mes"])
-
-    # features para predicción (todos los municipios juntos)
-    df_mes = df[(df["anio"] == anio) & (df["mes"] == mes)]
-    X = df_mes[[
-        "departamento", "anio", "mes",
-        "tasa_delitos_muni_mes_lag", "tasa_delitos_dep_mes_lag", "acumulado_90d"
-    ]]
-
-    if hasattr(_model, "predict_proba"):
-        proba = _model.predict_proba(X)[:, 1]
-        df_mes = df_mes.assign(probabilidad=proba)
-        y_proba = float(proba.mean())  # promedio general
-    else:
-        y_hat = _model.predict(X)
-        df_mes = df_mes.assign(probabilidad=y_hat)
-        y_proba = float(y_hat.mean())
-
-    # análisis contextual agregado
-    if not df_mes.empty:
-        genero_top = df_mes.groupby("genero")["cantidad"].sum().sort_values(ascending=False).index[0]
-        grupo_top = df_mes.groupby("grupo_etario")["cantidad"].sum().sort_values(ascending=False).index[0]
-        dia_top = df_mes.groupby("dia_semana")["cantidad"].sum().sort_values(ascending=False).index[0]
-        franja_top = df_mes.groupby("franja_hora")["cantidad"].sum().sort_values(ascending=False).index[0]
-        delito_top = df_mes.groupby("tipo_delito")["cantidad"].sum().sort_values(ascending=False).index[0]
-    else:
-        genero_top = grupo_top = dia_top = franja_top = delito_top = "SIN_DATO"
+    anio, mes = (int(v) for v in preds.index[-1][:2])
+
+    # predicciones precalculadas del mes (todos los municipios juntos)
+    pred_mes = preds.loc[(anio, mes)]
+    y_proba = float(np.average(pred_mes["probabilidad"], weights=pred_mes["eventos"]))  # promedio general
+
+    # análisis contextual agregado (marginales del mes precalculadas en el cubo)
+    genero_top, grupo_top, dia_top, franja_top, delito_top = (
+        (cube.top(f"mes_{campo}", campo, anio=anio, mes=mes) or ["SIN_DATO"])[0]
+        for campo in ["genero", "grupo_etario", "dia_semana", "franja_hora", "tipo_delito"]
+    )
 
     contexto = {
         "genero_predominante": genero_top,
@@ -129,8 +118,7 @@ def risk_predict():
 
     # ranking de municipios críticos (top 5 por probabilidad promedio)
     ranking = (
-        df_mes.groupby("municipio")["probabilidad"]
-        .mean()
+        pred_mes["probabilidad"]
         .sort_values(ascending=False)
         .head(5)
         .reset_index()
@@ -147,34 +135,23 @@ def risk_predict():
 
 
 
-@router.get("/prediction/trend")
-def prediction_trend():
-    _load_artifacts()
-    df = _features_df.copy()
-
-    # Reales
-    reales = df.groupby(["anio", "mes"], as_index=False)["cantidad"].sum().rename(columns={"cantidad": "reales"})
-    preds = []
-
-    for (anio, mes), sub in df.groupby(["anio", "mes"]):
-        X = sub[[
-            "departamento", "anio", "mes",
-            "tasa_delitos_muni_mes_lag", "tasa_delitos_dep_mes_lag", "acumulado_90d"
-        ]]
-        if hasattr(_model, "predict_proba"):
-            proba = _model.predict_proba(X)[:, 1]
-            pred_value = (proba * sub["cantidad"]).sum()
-        else:
-            y_hat = _model.predict(X)
-            pred_value = y_hat.sum()
-
-        # ruido controlado
-        noise = np.random.normal(loc=0, scale=0.05 * pred_value)
-        pred_value = max(0, int(pred_value + noise))
-
-        preds.append({"anio": int(anio), "mes": int(mes), "predichos": pred_value})
-
-    pred_df = pd.DataFrame(preds)
+@lru_cache(maxsize=8)
+def _trend(predictions_version: str, model_version: str, semilla: Optional[int]) -> dict:
+    # Memoizado por versión de predicciones y de modelo: se recalcula solo tras reentrenar
+    preds, _ = _predictions()
+    metricas = _metrics(model_version)
+
+    # Reales y esperados por mes desde la tabla precalculada
+    mensual = preds.groupby(level=["anio", "mes"])[["cantidad", "esperados"]].sum().reset_index()
+    reales = mensual[["anio", "mes", "cantidad"]].rename(columns={"cantidad": "reales"})
+    pred_df = mensual[["anio", "mes", "esperados"]].rename(columns={"esperados": "predichos"})
+
+    # ruido controlado opcional y reproducible (sin semilla la serie es determinista)
+    pred_value = pred_df["predichos"].to_numpy()
+    if semilla is not None:
+        rng = np.random.default_rng(semilla)
+        pred_value = pred_value + rng.normal(loc=0, scale=0.05 * pred_value)
+    pred_df["predichos"] = np.maximum(0, pred_value).astype(int)
 
     # calibración global
     calibration_factor = (reales["reales"].sum() / pred_df["predichos"].sum()) if pred_df["predichos"].sum() else 1.0
@@ -196,94 +173,123 @@ def prediction_trend():
     return {
         "serie": [TrendPoint(**r) for r in merged.to_dict(orient="records")],
         "reduccion_pct": round(reduccion_pct, 1),
-        "roc_auc": round(getattr(_model, "roc_auc_", 0.9996), 4),
-        "pr_auc": round(getattr(_model, "pr_auc_", 0.9998), 4)
+        "roc_auc": round(metricas["roc_auc"], 4),
+        "pr_auc": round(metricas["pr_auc"], 4)
     }
 
 
+@router.get("/prediction/trend")
+def prediction_trend(semilla: Optional[int] = None):
+    _, version = _predictions()
+    return _trend(version, registry.active().version, semilla)
+
+
+@lru_cache(maxsize=2)
+def _explanations(explanations_version: str) -> pd.DataFrame:
+    # Atribuciones precalculadas al entrenar, indexadas por (municipio, anio, mes)
+    df = store.get("explanations")
+    df = df.assign(municipio=df["municipio"].astype(str))
+    return df.set_index(["municipio", "anio", "mes"]).sort_index()
+
+@lru_cache(maxsize=1024)
+def _explain(explanations_version: str, model_version: str, municipio: str, anio: Optional[int],
+             mes: Optional[int], top: int) -> dict:
+    df = _explanations(explanations_version)
+    if municipio not in df.index.get_level_values("municipio"):
+        raise HTTPException(status_code=404, detail=f"Sin explicaciones para {municipio}")
+    filas = df.loc[municipio]
+    if anio is None:
+        anio = int(filas.index.get_level_values("anio").max())
+    if mes is None:
+        meses = filas.index.get_level_values("mes")[filas.index.get_level_values("anio") == anio]
+        mes = int(meses.max()) if len(meses) else 0
+    if (anio, mes) not in filas.index:
+        raise HTTPException(status_code=404, detail=f"Sin explicaciones para {municipio} en {anio}-{mes:02d}")
+    fila = filas.loc[(anio, mes)]
+    variables = [c[len("shap_"):] for c in fila.index if c.startswith("shap_")]
+    valores = {"anio": anio, "mes": mes, **fila.to_dict()}
+    aportes = sorted(variables, key=lambda v: abs(fila[f"shap_{v}"]), reverse=True)[:top]
+    return {
+        "version": model_version,
+        "municipio": municipio,
+        "anio": int(anio),
+        "mes": int(mes),
+        "probabilidad": float(fila["probabilidad"]),
+        "base": float(fila["base"]),
+        "contribuciones": [
+            {"variable": v, "valor": _json_value(valores.get(v)), "aporte": float(fila[f"shap_{v}"])} for v in aportes
+        ],
+    }
+
+def _json_value(valor):
+    if isinstance(valor, (np.integer, np.floating)):
+        return None if pd.isna(valor) else valor.item()
+    return valor
+
+@router.get("/explain", response_model=ExplainResponse)
+def explain(municipio: str, anio: Optional[int] = None, mes: Optional[int] = None, top: int = 5):
+    # Por qué el modelo activo ve riesgo en un municipio-mes: aportes SHAP (log-odds) de cada
+    # variable, de mayor a menor. Sin anio/mes se usa el último periodo del municipio
+    activo = registry.active()
+    if not store.exists("explanations"):
+        raise HTTPException(status_code=503, detail="El modelo activo no tiene explicaciones precalculadas "
+                                                    "(python -m app.services.explain --precompute)")
+    return _explain(store.version("explanations"), activo.version, municipio.strip().upper(), anio, mes, max(top, 1))
+
+
 
 
 @router.get("/distribution/municipios", response_model=list[MunicipioDistributionItem])
 def distribution_municipios():
-    _load_artifacts()
-    df = _features_df.copy()
+    celdas = cube.get("municipio_anio")
     # Último año para el panel
-    ultimo_anio = int(df["anio"].max())
-    df = df[df["anio"] == ultimo_anio]
-    dist = df.groupby("municipio", as_index=False)["cantidad"].sum().rename(columns={"cantidad": "incidentes"})
-    dist = dist.sort_values("incidentes", ascending=False)
+    ultimo_anio = int(celdas["anio"].max())
+    dist = cube.rollup("municipio_anio", "municipio", cube=celdas, anio=ultimo_anio).rename("incidentes").reset_index()
     return [MunicipioDistributionItem(**r) for r in dist.to_dict(orient="records")]
 
-def _month_bounds(last_date: pd.Timestamp):
-    cur_start = last_date.replace(day=1)
-    prev_start = (cur_start - pd.DateOffset(months=1)).replace(day=1)
-    return cur_start, prev_start
+def _kpis() -> dict:
+    # Snapshot generado por features.build(); si aún no existe se calcula en memoria
+    if store.exists("kpis"):
+        return store.get("kpis")["kpis"]
+    return features.kpi_snapshot(store.get("features"))["kpis"]
+
+def _variacion(actual, anterior) -> float:
+    return round((actual - anterior) / anterior * 100, 1) if actual is not None and anterior else 0.0
+
+def _kpi_conteo(nombre: str) -> dict:
+    k = _kpis()[nombre]
+    return {"valor": k["actual"], "variacion_pct": _variacion(k["actual"], k["anterior"])}
+
+def _kpi_valor(nombre: str) -> dict:
+    k = _kpis()[nombre]
+    valor = round(k["actual"], 1) if k["actual"] is not None else "N/A"
+    return {"valor": valor, "variacion_pct": _variacion(k["actual"], k["anterior"])}
+
+@router.get("/kpis")
+def kpis():
+    # Las cuatro tarjetas del dashboard en una sola consulta
+    return {
+        "incidents_total": _kpi_conteo("incidents_total"),
+        "response_time": _kpi_valor("response_time"),
+        "crime_rate": _kpi_valor("crime_rate"),
+        "cases_resolved": _kpi_conteo("cases_resolved"),
+    }
 
 @router.get("/incidents/total")
 def incidents_total():
-    df = pd.read_parquet(PROC_DIR / "features.parquet")
-    df = df[df["departamento"] == "SANTANDER"].copy()
-    df["fecha_hecho"] = pd.to_datetime(df["fecha_hecho"], errors="coerce")
-    last_date = df["fecha_hecho"].max()
-    cur_start = last_date.replace(day=1)
-    prev_start = (cur_start - pd.DateOffset(months=1)).replace(day=1)
-    cur = df[(df["fecha_hecho"] >= cur_start) & (df["fecha_hecho"] <= last_date)]
-    prev = df[(df["fecha_hecho"] >= prev_start) & (df["fecha_hecho"] < cur_start)]
-    cur_total = int(cur["cantidad"].sum())
-    prev_total = int(prev["cantidad"].sum())
-    var_pct = ((cur_total - prev_total) / prev_total * 100) if prev_total else 0.0
-    return {"valor": cur_total, "variacion_pct": round(var_pct, 1)}
+    return _kpi_conteo("incidents_total")
 
 
 @router.get("/response-time")
 def response_time():
-    df = pd.read_parquet(PROC_DIR / "features.parquet")
-    df = df[df["departamento"] == "SANTANDER"].copy()
-    df["fecha_hecho"] = pd.to_datetime(df["fecha_hecho"], errors="coerce")
-    last_date = df["fecha_hecho"].max()
-    cur_start = last_date.replace(day=1)
-    prev_start = (cur_start - pd.DateOffset(months=1)).replace(day=1)
-    cur = df[(df["fecha_hecho"] >= cur_start) & (df["fecha_hecho"] <= last_date)]
-    prev = df[(df["fecha_hecho"] >= prev_start) & (df["fecha_hecho"] < cur_start)]
-    cur_val = float(cur["acumulado_90d"].max()) if "acumulado_90d" in cur.columns and len(cur) else "N/A"
-    prev_val = float(prev["acumulado_90d"].max()) if "acumulado_90d" in prev.columns and len(prev) else 0.0
-    var_pct = ((cur_val - prev_val) / prev_val * 100) if isinstance(cur_val, float) and prev_val else 0.0
-    return {"valor": round(cur_val, 1) if isinstance(cur_val, float) else "N/A", "variacion_pct": round(var_pct, 1)}
+    return _kpi_valor("response_time")
 
 
 @router.get("/crime-rate")
 def crime_rate():
-    df = pd.read_parquet(PROC_DIR / "features.parquet")
-    df = df[df["departamento"] == "SANTANDER"].copy()
-    df["fecha_hecho"] = pd.to_datetime(df["fecha_hecho"], errors="coerce")
-    last_date = df["fecha_hecho"].max()
-    cur_start = last_date.replace(day=1)
-    prev_start = (cur_start - pd.DateOffset(months=1)).replace(day=1)
-    cur = df[(df["fecha_hecho"] >= cur_start) & (df["fecha_hecho"] <= last_date)]
-    prev = df[(df["fecha_hecho"] >= prev_start) & (df["fecha_hecho"] < cur_start)]
-    cur_rate = float(cur["tasa_delitos_dep_mes_lag"].mean()) if "tasa_delitos_dep_mes_lag" in cur.columns and len(cur) else "N/A"
-    prev_rate = float(prev["tasa_delitos_dep_mes_lag"].mean()) if "tasa_delitos_dep_mes_lag" in prev.columns and len(prev) else 0.0
-    var_pct = ((cur_rate - prev_rate) / prev_rate * 100) if isinstance(cur_rate, float) and prev_rate else 0.0
-    return {"valor": round(cur_rate, 1) if isinstance(cur_rate, float) else "N/A", "variacion_pct": round(var_pct, 1)}
-
-
+    return _kpi_valor("crime_rate")
 
 
 @router.get("/cases/resolved")
 def cases_resolved():
-    df = pd.read_parquet(PROC_DIR / "features.parquet")
-    df = df[df["departamento"] == "SANTANDER"].copy()
-    df["fecha_hecho"] = pd.to_datetime(df["fecha_hecho"], errors="coerce")
-
-    last_date = df["fecha_hecho"].max()
-    cur_start = last_date.replace(day=1)
-    prev_start = (cur_start - pd.DateOffset(months=1)).replace(day=1)
-
-    cur = df[(df["fecha_hecho"] >= cur_start) & (df["fecha_hecho"] <= last_date) & (df["riesgo_alto"] == 1)]
-    prev = df[(df["fecha_hecho"] >= prev_start) & (df["fecha_hecho"] < cur_start) & (df["riesgo_alto"] == 1)]
-
-    cur_total = int(cur["cantidad"].sum()) if "cantidad" in cur.columns else len(cur)
-    prev_total = int(prev["cantidad"].sum()) if "cantidad" in prev.columns else len(prev)
-    var_pct = ((cur_total - prev_total) / prev_total * 100) if prev_total else 0.0
-
-    return {"valor": cur_total, "variacion_pct": round(var_pct, 1)}
+    return _kpi_conteo("cases_resolved")
@@ -1,38 +1,25 @@
 # app/routers/chatbot.py
+import asyncio
+import json
 from fastapi import APIRouter
-import pandas as pd
+from fastapi.responses import StreamingResponse
 from typing import Optional
-from azure.ai.inference import ChatCompletionsClient
-from azure.ai.inference.models import SystemMessage, UserMessage
-from azure.core.credentials import AzureKeyCredential
-from app.config import PROC_DIR, OPENAI_EMBEDDINGS_URL, GITHUB_TOKEN, MODEL_NAME
+from app.config import MODEL_NAME
 from app.models.schemas import ChatRequest, ChatResponse
+from app.services import entities, llm
 
 router = APIRouter(prefix="/chatbot", tags=["chatbot"])
 
-# Inicializar cliente
-client = ChatCompletionsClient(
-    endpoint=OPENAI_EMBEDDINGS_URL,
-    credential=AzureKeyCredential(GITHUB_TOKEN),
-)
-
 def _summary(municipio: Optional[str], delito: Optional[str]):
-    df = pd.read_parquet(PROC_DIR / "features.parquet")
-    df = df[df["departamento"] == "SANTANDER"].copy()
-    if municipio and "municipio" in df.columns:
-        df = df[df["municipio"] == municipio.upper()]
-    if delito and "tipo_delito" in df.columns:
-        df = df[df["tipo_delito"] == delito.upper()]
-    total = int(df["cantidad"].sum()) if "cantidad" in df.columns else 0
-    hora_counts = (
-        df.groupby("franja_hora")["cantidad"].sum().sort_values(ascending=False)
-        if "franja_hora" in df.columns else pd.Series(dtype=int)
-    )
-    hora = hora_counts.index[0] if len(hora_counts) else "SIN_DATO"
-    top_muni = (
-        df.groupby("municipio")["cantidad"].sum().sort_values(ascending=False).head(3).index.tolist()
-        if "municipio" in df.columns else []
-    )
+    # Agregados desde el cubo del catálogo (sin filtrar el frame de features)
+    catalog = entities.get()
+    mask = catalog.mask({
+        "municipio": municipio.upper() if municipio else None,
+        "tipo_delito": delito.upper() if delito else None,
+    })
+    total = int(catalog.cantidad[mask].sum())
+    hora = (catalog.top("franja_hora", mask, por="cantidad") or ["SIN_DATO"])[0]
+    top_muni = catalog.top("municipio", mask, por="cantidad", n=3)
     reco = [
         f"Evita desplazarte en {hora.lower()} en zonas de alta concentración.",
         "Usa rutas iluminadas y comparte itinerarios con familiares.",
@@ -40,52 +27,12 @@ def _summary(municipio: Optional[str], delito: Optional[str]):
     ]
     return total, hora, top_muni, reco
 
-@router.post("/ask", response_model=ChatResponse)
-def ask(req: ChatRequest):
-    import unicodedata
-
-    # Función de normalización: minúsculas + quitar tildes
-    def normalize(text: str) -> str:
-        if not isinstance(text, str):
-            return ""
-        text = text.lower()
-        text = unicodedata.normalize("NFD", text)
-        return "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
-
-    # Cargar datos
-    df = pd.read_parquet(PROC_DIR / "features.parquet")
-    df = df[df["departamento"] == "SANTANDER"].copy()
-
-    pregunta = normalize(req.pregunta)
-
-    # setectar entidades clave 
-    def detectar(lista, texto):
-        lista_norm = [normalize(item) for item in lista]
-        return next((lista[i] for i, item in enumerate(lista_norm) if item in texto), None)
-
-    municipio = detectar(df["municipio"].dropna().unique(), pregunta)
-    tipo_delito = detectar(df["tipo_delito"].dropna().unique(), pregunta)
-    grupo_etario = detectar(df["grupo_etario"].dropna().unique(), pregunta)
-    franja_hora = detectar(df["franja_hora"].dropna().unique(), pregunta)
-    genero = detectar(df["genero"].dropna().unique(), pregunta)
-
-    # Aplicar filtros dinámicos 
-    df_filtrado = df.copy()
-    if municipio:
-        df_filtrado = df_filtrado[df_filtrado["municipio"] == municipio]
-    if tipo_delito:
-        df_filtrado = df_filtrado[df_filtrado["tipo_delito"] == tipo_delito]
-    if grupo_etario:
-        df_filtrado = df_filtrado[df_filtrado["grupo_etario"] == grupo_etario]
-    if franja_hora:
-        df_filtrado = df_filtrado[df_filtrado["franja_hora"] == franja_hora]
-    if genero:
-        df_filtrado = df_filtrado[df_filtrado["genero"] == genero]
-
-    # generar resumen 
-    total = int(df_filtrado["cantidad"].sum())
-    hora = df_filtrado["franja_hora"].value_counts().idxmax() if not franja_hora and not df_filtrado.empty else (franja_hora or "SIN_DATO")
-    top_muni = df_filtrado["municipio"].value_counts().head(3).index.tolist()
+def _ask_messages(pregunta: str):
+    # Entidades (Aho-Corasick sobre el catálogo) y datos filtrados (cubo) sin tocar el frame
+    ctx = entities.context(pregunta)
+    municipio, tipo_delito, grupo_etario = ctx["municipio"], ctx["tipo_delito"], ctx["grupo_etario"]
+    franja_hora, genero = ctx["franja_hora"], ctx["genero"]
+    total, hora, top_muni = ctx["total"], ctx["hora"], ctx["top_muni"]
     reco = [
         f"Evita desplazarte en la franja {hora.lower()} en zonas de alta concentración.",
         "Usa rutas iluminadas y comparte itinerarios con familiares.",
@@ -93,8 +40,9 @@ def ask(req: ChatRequest):
     ]
 
     # construir prompt para el LLM 
+    from azure.ai.inference.models import SystemMessage, UserMessage
     prompt = f"""
-    Usuario pregunta: {req.pregunta}
+    Usuario pregunta: {pregunta}
 
     Entidades detectadas:
     - Municipio: {municipio or "no especificado"}
@@ -113,40 +61,61 @@ def ask(req: ChatRequest):
     con un tono claro, útil y preventivo, integrando los datos anteriores en la respuesta.
     """
 
-    response = client.complete(
-        messages=[
-            SystemMessage(content="Eres un asistente comunitario de seguridad ciudadana."),
-            UserMessage(content=prompt)
-        ],
-        temperature=0.7,
-        top_p=1.0,
-        model=MODEL_NAME
-    )
-
-    return ChatResponse(answer=response.choices[0].message.content)
-
-
+    return [
+        SystemMessage(content="Eres un asistente comunitario de seguridad ciudadana."),
+        UserMessage(content=prompt)
+    ]
 
+# Parámetros de muestreo de /ask (también forman parte de la llave de caché)
+ASK_PARAMS = {"temperature": 0.7, "top_p": 1.0}
 
+@router.post("/ask", response_model=ChatResponse)
+async def ask(req: ChatRequest):
+    # El resumen de datos corre fuera del event loop; la llamada al LLM es async y no ocupa
+    # un hilo del threadpool de Starlette mientras espera al proveedor
+    messages = await asyncio.to_thread(_ask_messages, req.pregunta)
+    answer = await llm.acomplete(messages, model=MODEL_NAME, **ASK_PARAMS)
+    return ChatResponse(answer=answer)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/ask/stream")
+async def ask_stream(req: ChatRequest):
+    # Server-Sent Events: un evento "token" por fragmento a medida que llega y "done" al final
+    messages = await asyncio.to_thread(_ask_messages, req.pregunta)
+
+    async def eventos():
+        try:
+            async for token in llm.astream(messages, model=MODEL_NAME, **ASK_PARAMS):
+                yield _sse("token", {"token": token})
+            yield _sse("done", {})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(eventos(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.get("/quick/{tipo}", response_model=ChatResponse)
-def quick(tipo: str, municipio: Optional[str] = None):
+async def quick(tipo: str, municipio: Optional[str] = None):
     tipo = tipo.lower()
     if tipo == "estadisticas":
-        total, hora, top_muni, _ = _summary(municipio, None)
+        total, hora, top_muni, _ = await asyncio.to_thread(_summary, municipio, None)
         muni_txt = f" en {municipio}" if municipio else ""
         return ChatResponse(answer=f"Total de eventos{muni_txt}: {total}. Franja de mayor riesgo: {hora}.")
     elif tipo == "prediccion":
-        response = client.complete(
+        from azure.ai.inference.models import SystemMessage, UserMessage
+        # Prompt fijo: se sirve desde la caché hasta que vence el TTL
+        answer = await llm.acomplete(
             messages=[
                 SystemMessage(content="Eres un asistente comunitario."),
                 UserMessage(content="Genera una predicción de seguridad ciudadana para los próximos meses en Santander.")
             ],
             model=MODEL_NAME
         )
-        return ChatResponse(answer=response.choices[0].message.content)
+        return ChatResponse(answer=answer)
     elif tipo == "situacion":
-        total, hora, top_muni, _ = _summary(municipio, None)
+        total, hora, top_muni, _ = await asyncio.to_thread(_summary, municipio, None)
         return ChatResponse(
             answer=f"Situación en {municipio or 'el área'}: {total} eventos. Riesgo mayor en {hora}. "
                    f"Zonas críticas: {', '.join(top_muni) if top_muni else 'SIN_DATO'}."
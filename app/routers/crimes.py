@@ -1,51 +1,91 @@
 # app/routers/crimes.py
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 import pandas as pd
-from app.config import PROC_DIR
 from app.models.schemas import CrimeQuery, CrimeRecord, CrimeRecentRecord
+from app.services import index, serialize, store
 
 router = APIRouter(prefix="/crimes", tags=["crimes"])
 
-_df = None
+COLUMNS = ["departamento","municipio","fecha_hecho","tipo_delito","cantidad"]
+EXPORT_BATCH = 5000
 
 def _load_data():
-    global _df
-    if _df is None:
-        _df = pd.read_parquet(PROC_DIR / "master.parquet")
-        _df = _df[_df["departamento"] == "SANTANDER"].copy()
-        _df["fecha_hecho"] = pd.to_datetime(_df["fecha_hecho"], errors="coerce")
-
-@router.get("/recent", response_model=list[CrimeRecentRecord])
-def recent():
-    _load_data()
-    df = _df.sort_values("fecha_hecho", ascending=False).head(100)
-    out = []
-    for i, r in df.iterrows():
-        out.append(CrimeRecentRecord(
-            id=f"#{i:03d}",
-            tipo=str(r.get("tipo_delito", "OTRO")),
-            descripcion = f"Reporte reciente de {r.get('delito')}",
-            ubicacion=f"{str(r.get('municipio',''))}, {str(r.get('departamento',''))}",
-            fecha=str(r["fecha_hecho"]),
-            severidad="crítica" if (r.get("cantidad", 0) or 0) >= 3 else ("alta" if (r.get("cantidad", 0) or 0) == 2 else "media"),
-            estado="En Atención"
-        ))
+    return store.get("master")
+
+def _page(filtros: dict, limit: int, cursor: Optional[str]):
+    # Paginación keyset: las filas siguen el orden (fecha desc, fila) del índice; devuelve
+    # también el cursor de la última fila para el header X-Next-Cursor (None si no hay más)
+    idx = index.get("master")
+    try:
+        desde = idx.start(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pos = idx.positions(filtros, limit, desde)
+    siguiente = idx.cursor(pos[-1]) if limit > 0 and len(pos) == limit else None
+    return pos, siguiente
+
+# La respuesta ya viene codificada (ORJSONResponse): el esquema solo se documenta, no se valida
+@router.get("/recent", responses={200: {"model": list[CrimeRecentRecord]}})
+def recent(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None):
+    pos, siguiente = _page({}, limit, cursor)
+    df = _load_data().iloc[pos]
+    # Columnas calculadas en bloque y JSON codificado con orjson (sin iterrows ni modelos por fila)
+    out = serialize.records({
+        "id": "#" + pd.Series(df.index.astype(str), index=df.index).str.zfill(3),
+        "tipo": serialize.texto(df["tipo_delito"]),
+        "descripcion": "Reporte reciente de " + serialize.texto(df["delito"]),
+        "ubicacion": serialize.texto(df["municipio"]) + ", " + serialize.texto(df["departamento"]),
+        "fecha": df["fecha_hecho"].astype(str),
+        "severidad": serialize.severidad(df["cantidad"]),
+        "estado": "En Atención",
+    })
+    if siguiente:
+        out.headers["X-Next-Cursor"] = siguiente
     return out
 
+def _filtros(departamento, municipio=None, tipo_delito=None, anio=None, mes=None):
+    return {
+        "departamento": departamento,
+        "municipio": municipio or None,
+        "tipo_delito": tipo_delito or None,
+        "anio": anio or None,
+        "mes": mes or None,
+    }
+
 @router.post("/query", response_model=list[CrimeRecord])
-def query(payload: CrimeQuery):
-    _load_data()
-    df = _df.copy()
-    filt = (df["departamento"] == payload.departamento)
-    if payload.municipio and "municipio" in df.columns:
-        filt &= (df["municipio"] == payload.municipio)
-    if payload.tipo_delito and "tipo_delito" in df.columns:
-        filt &= (df["tipo_delito"] == payload.tipo_delito)
-    if payload.anio:
-        filt &= (df["anio"] == payload.anio)
-    if payload.mes:
-        filt &= (df["mes"] == payload.mes)
-
-    df = df.loc[filt, ["departamento","municipio","fecha_hecho","tipo_delito","cantidad"]].sort_values("fecha_hecho", ascending=False).head(payload.limit)
+def query(payload: CrimeQuery, response: Response):
+    df = _load_data()
+    # Intersección de postings ya ordenados por fecha desc: sin máscaras ni sort por consulta
+    filtros = _filtros(payload.departamento, payload.municipio, payload.tipo_delito, payload.anio, payload.mes)
+    pos, siguiente = _page(filtros, payload.limit, payload.cursor)
+    if siguiente:
+        response.headers["X-Next-Cursor"] = siguiente
+    df = df.loc[df.index[pos], COLUMNS]
     df["fecha_hecho"] = df["fecha_hecho"].astype(str)
     return [CrimeRecord(**r) for r in df.to_dict(orient="records")]
+
+@router.get("/export")
+def export(formato: str = Query("ndjson", pattern="^(ndjson|csv)$"), departamento: str = "SANTANDER",
+           municipio: Optional[str] = None, tipo_delito: Optional[str] = None,
+           anio: Optional[int] = None, mes: Optional[int] = None):
+    # Exportación completa en streaming: se serializa por lotes desde el índice, sin
+    # armar la respuesta entera en memoria
+    df = _load_data()
+    pos = index.get("master").positions(_filtros(departamento, municipio, tipo_delito, anio, mes))
+
+    def filas():
+        for inicio in range(0, len(pos), EXPORT_BATCH):
+            lote = df.loc[df.index[pos[inicio:inicio + EXPORT_BATCH]], COLUMNS]
+            lote["fecha_hecho"] = lote["fecha_hecho"].astype(str)
+            if formato == "csv":
+                yield lote.to_csv(index=False, header=inicio == 0)
+            else:
+                yield lote.to_json(orient="records", lines=True, force_ascii=False)
+        if formato == "csv" and not len(pos):
+            yield ",".join(COLUMNS) + "\n"
+
+    media_type = "text/csv" if formato == "csv" else "application/x-ndjson"
+    return StreamingResponse(filas(), media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename=crimes.{formato}"})
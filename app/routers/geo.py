@@ -1,37 +1,84 @@
 # app/routers/geo.py
-from fastapi import APIRouter
-import pandas as pd
-from app.config import PROC_DIR, GEO_DIR
-from app.models.schemas import GeoIncident
+from datetime import date, datetime, time
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+import numpy as np
+from app.models.schemas import GeoHeatCell, GeoIncident
+from app.services import index, serialize, spatial, store
 
 router = APIRouter(prefix="/geo", tags=["geo"])
 
-_df = None
-_geo = None
-
 def _load():
-    global _df, _geo
-    if _df is None:
-        _df = pd.read_parquet(PROC_DIR / "master.parquet")
-        _df = _df[_df["departamento"] == "SANTANDER"].copy()
-    if _geo is None:
-        _geo = pd.read_csv(GEO_DIR / "municipios.csv") 
+    return store.get("master")
 
-@router.get("/incidents", response_model=list[GeoIncident])
-def incidents():
-    _load()
-    df = _df.sort_values("fecha_hecho", ascending=False).head(200).reset_index(drop=True)
+def _ns(dia: Optional[date], fin: bool = False):
+    # Fecha (inclusive) a ns, comparable con los fecha_hecho del índice
+    if dia is None:
+        return None
+    return np.datetime64(datetime.combine(dia, time.max if fin else time.min), "ns").view("i8")
+
+def _incidents(limit: int = 200, bbox=None, zoom: Optional[int] = None, desde=None, hasta=None):
+    df = _load()
+    idx = index.get("master")
+    grid = spatial.get("master")
+    if zoom is None:
+        rangos = grid.query(bbox, _ns(desde), _ns(hasta, fin=True), limit)
+    else:
+        # Con zoom se descartan los marcadores que quedarían uno encima de otro
+        rangos = grid.declutter(grid.query(bbox, _ns(desde), _ns(hasta, fin=True)), zoom)[:limit]
+    sub = df.iloc[idx.order[rangos]]
+    return serialize.records({
+        "lat": grid.lat[rangos],
+        "lon": grid.lon[rangos],
+        "severidad": serialize.severidad(sub["cantidad"]),
+        "estado": "En Atención",
+        "municipio": serialize.texto(sub["municipio"]).to_numpy(),
+    })
 
-    df["codigo_dane"] = df["codigo_dane"].astype(str)
-    _geo["codigo_dane"] = _geo["codigo_dane"].astype(str)
-    df = df.merge(_geo, on="codigo_dane", how="left")  
-    incidents = []
-    for _, r in df.iterrows():
-        incidents.append(GeoIncident(
-            lat=float(r.get("lat", 0)),
-            lon=float(r.get("lon", 0)),
-            severidad="crítica" if (r.get("cantidad", 0) or 0) >= 3 else ("alta" if (r.get("cantidad", 0) or 0) == 2 else "media"),
-            estado="En Atención",
-            municipio=str(r.get("municipio", ""))
-        ))
-    return incidents
\ No newline at end of file
+def _bbox(min_lat, min_lon, max_lat, max_lon):
+    bbox = (min_lat, min_lon, max_lat, max_lon)
+    if all(v is None for v in bbox):
+        return None
+    if any(v is None for v in bbox):
+        raise HTTPException(status_code=400, detail="El bbox requiere min_lat, min_lon, max_lat y max_lon")
+    return bbox
+
+# Respuestas ya codificadas (ORJSONResponse): el esquema solo se documenta en OpenAPI
+@router.get("/incidents", responses={200: {"model": list[GeoIncident]}})
+def incidents(
+    min_lat: Optional[float] = None, min_lon: Optional[float] = None,
+    max_lat: Optional[float] = None, max_lon: Optional[float] = None,
+    zoom: Optional[int] = Query(None, ge=0, le=22),
+    desde: Optional[date] = None, hasta: Optional[date] = None,
+    limit: int = Query(200, ge=1, le=5000),
+):
+    # Incidentes más recientes dentro del viewport (bbox) y la ventana de tiempo
+    return _incidents(limit, _bbox(min_lat, min_lon, max_lat, max_lon), zoom, desde, hasta)
+
+@router.get("/heatmap", responses={200: {"model": list[GeoHeatCell]}})
+def heatmap(
+    zoom: int = Query(8, ge=0, le=22),
+    min_lat: Optional[float] = None, min_lon: Optional[float] = None,
+    max_lat: Optional[float] = None, max_lon: Optional[float] = None,
+    desde: Optional[date] = None, hasta: Optional[date] = None,
+):
+    # Conteos por celda al zoom pedido: el payload queda acotado por el número de celdas
+    # del viewport y no por el número de eventos
+    _load()
+    bbox = _bbox(min_lat, min_lon, max_lat, max_lon)
+    if desde is None and hasta is None:
+        celdas = spatial.heatmap(zoom)
+    else:
+        grid = spatial.get("master")
+        celdas = grid.bins(grid.query(None, _ns(desde), _ns(hasta, fin=True)), zoom)
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        celdas = celdas[celdas["lat"].between(min_lat, max_lat) & celdas["lon"].between(min_lon, max_lon)]
+    maximo = max(int(celdas["incidentes"].max()), 1) if len(celdas) else 1
+    return serialize.records({
+        "lat": celdas["lat"].round(6).to_numpy(),
+        "lon": celdas["lon"].round(6).to_numpy(),
+        "incidentes": celdas["incidentes"].to_numpy(),
+        "eventos": celdas["eventos"].to_numpy(),
+        "intensidad": (celdas["incidentes"] / maximo).round(4).to_numpy(),
+    })
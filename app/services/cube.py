@@ -0,0 +1,136 @@
+# app/services/cube.py
+import argparse
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from app.config import PROC_DIR
+from app.services import dataset, store
+
+# Variables del contexto de /analytics/risk/predict (la más frecuente de cada una en el mes)
+CONTEXTO = ["genero", "grupo_etario", "dia_semana", "franja_hora", "tipo_delito"]
+
+# Agregados que leen los routers, cada uno a su propio grano (departamento se conserva para
+# que aplique el mismo filtro de Santander del store):
+#   entidades      -> catálogo y filtros del chatbot (entities.Catalog)
+#   municipio_anio -> /analytics/distribution/municipios
+#   mes_<campo>    -> marginales por mes para el contexto de /analytics/risk/predict
+ROLLUPS = {
+    "entidades": ["departamento", "municipio", "tipo_delito", "grupo_etario", "franja_hora", "genero"],
+    "municipio_anio": ["departamento", "anio", "municipio"],
+    **{f"mes_{campo}": ["departamento", "anio", "mes", campo] for campo in CONTEXTO},
+}
+
+# Columnas de features que necesitan los agregados
+DIMS = list(dict.fromkeys(c for dims in ROLLUPS.values() for c in dims))
+
+# Medidas: suma de cantidad y número de filas de features (eventos)
+MEASURES = ["cantidad", "eventos"]
+
+
+def build(df: pd.DataFrame) -> pd.DataFrame:
+    # Todos los agregados en una sola tabla larga: la columna `rollup` dice a cuál pertenece
+    # cada celda y solo sus dimensiones tienen valor. Los nulos de una dimensión se conservan
+    # como su propia celda para que los totales coincidan con el frame de eventos
+    cantidad = pd.to_numeric(df["cantidad"], errors="coerce").fillna(0)
+    partes = []
+    for nombre, dims in ROLLUPS.items():
+        dims = [c for c in dims if c in df.columns]
+        parte = cantidad.groupby([df[c] for c in dims], dropna=False, observed=True).agg(["sum", "size"])
+        parte = parte.rename(columns={"sum": "cantidad", "size": "eventos"}).reset_index()
+        parte.insert(0, "rollup", nombre)
+        partes.append(parte)
+    cube = pd.concat(partes, ignore_index=True)
+    cube["cantidad"] = cube["cantidad"].astype(np.int64)
+    # Dimensiones de texto como categóricas: los filtros comparan códigos, no cadenas
+    for col in cube.select_dtypes(include="object").columns:
+        cube[col] = cube[col].astype("category")
+    return cube
+
+
+def write(df: pd.DataFrame, path=None):
+    path = path or store.ARTIFACTS["cube"]
+    cube = build(df)
+    dataset.compact(cube).to_parquet(path, index=False)
+    print(f"✅ Cubo guardado en {path} ({len(cube)} celdas en {len(ROLLUPS)} agregados para {len(df)} filas)")
+    return cube
+
+
+@lru_cache(maxsize=2)
+def _from_features(version: str) -> pd.DataFrame:
+    return build(store.get("features"))
+
+
+def _table() -> pd.DataFrame:
+    # Cubo generado por features.build(); si aún no existe se arma una vez desde features
+    if store.exists("cube"):
+        return store.get("cube")
+    return _from_features(store.version("features"))
+
+
+def version() -> str:
+    return store.version("cube") if store.exists("cube") else f"features:{store.version('features')}"
+
+
+def split(cube: pd.DataFrame, name: str) -> pd.DataFrame:
+    # Celdas de un agregado con solo sus dimensiones y medidas
+    cols = [c for c in ROLLUPS[name] if c in cube.columns] + MEASURES
+    celdas = cube.loc[(cube["rollup"] == name).to_numpy(dtype=bool), cols].reset_index(drop=True)
+    for col in celdas.select_dtypes(include="category").columns:
+        celdas[col] = celdas[col].cat.remove_unused_categories()
+    return celdas
+
+
+@lru_cache(maxsize=2 * len(ROLLUPS))
+def _get(version: str, name: str) -> pd.DataFrame:
+    return split(_table(), name)
+
+
+def get(name: str) -> pd.DataFrame:
+    return _get(version(), name)
+
+
+def select(name: str, cube: pd.DataFrame = None, **filtros) -> pd.DataFrame:
+    # Celdas del agregado que cumplen los filtros por valor exacto (None = sin filtro)
+    cube = get(name) if cube is None else cube
+    mask = np.ones(len(cube), dtype=bool)
+    for col, valor in filtros.items():
+        if valor is not None:
+            mask &= (cube[col] == valor).to_numpy(dtype=bool)
+    return cube[mask]
+
+
+def rollup(name: str, by, medida: str = "cantidad", cube: pd.DataFrame = None, **filtros) -> pd.Series:
+    # Suma de la medida por `by` (columna o lista) dentro del corte, de mayor a menor
+    celdas = select(name, cube, **filtros)
+    if not isinstance(by, str):
+        out = celdas.groupby(by, observed=True)[medida].sum()
+        return out.sort_values(ascending=False, kind="stable")
+    # Una sola dimensión: bincount sobre los códigos, sin el costo fijo de un groupby
+    col = celdas[by]
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        codes, uniques = col.cat.codes.to_numpy(), col.cat.categories
+    else:
+        codes, uniques = pd.factorize(col, sort=True)
+    validos = codes >= 0
+    suma = np.bincount(codes[validos], weights=celdas[medida].to_numpy()[validos], minlength=len(uniques))
+    presentes = np.bincount(codes[validos], minlength=len(uniques)) > 0
+    out = pd.Series(suma[presentes].astype(np.int64), index=pd.Index(uniques[presentes], name=by), name=medida)
+    return out.sort_values(ascending=False, kind="stable")
+
+
+def top(name: str, campo: str, n: int = 1, medida: str = "cantidad", cube: pd.DataFrame = None, **filtros) -> list:
+    serie = rollup(name, campo, medida, cube, **filtros)
+    return serie[serie > 0].head(n).index.tolist()
+
+
+def total(name: str, medida: str = "cantidad", cube: pd.DataFrame = None, **filtros) -> int:
+    return int(select(name, cube, **filtros)[medida].sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--build", action="store_true")
+    args = parser.parse_args()
+    if args.build:
+        write(dataset.read(PROC_DIR / "features.parquet", columns=DIMS + ["cantidad"],
+                           filters=[("departamento", "=", "SANTANDER")]))
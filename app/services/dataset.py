@@ -0,0 +1,70 @@
+# app/services/dataset.py
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pathlib import Path
+
+# Particionado de master.parquet y features.parquet (directorios Hive anio=/tipo_delito=)
+PARTITION_COLS = ["anio", "tipo_delito"]
+
+# Textos de baja cardinalidad que se guardan con codificación de diccionario
+LOW_CARDINALITY = [
+    "departamento", "municipio", "codigo_dane", "armas_medios", "genero", "grupo_etario",
+    "delito", "modalidad_hurto", "modalidad", "dia_semana", "franja_hora", "grupo_edad_bin",
+]
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    # Categóricas para textos repetidos y enteros con el tipo más pequeño posible
+    df = df.copy()
+    for col in LOW_CARDINALITY:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].astype("category")
+    for col in df.select_dtypes(include="integer").columns:
+        if col not in PARTITION_COLS:
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    # El año es llave de partición: entero (nullable) para que el directorio sea anio=2024
+    if "anio" in df.columns and not pd.api.types.is_integer_dtype(df["anio"]):
+        df["anio"] = df["anio"].astype("Int32")
+    return df
+
+
+def write(df: pd.DataFrame, path: Path, partition_cols=None) -> Path:
+    # Escribe el dataset particionado en un directorio temporal y lo reemplaza al final,
+    # así los lectores nunca ven un dataset a medio escribir
+    partition_cols = [c for c in (partition_cols or PARTITION_COLS) if c in df.columns]
+    table = pa.Table.from_pandas(compact(df), preserve_index=False)
+    tmp = path.with_name(path.name + ".tmp")
+    old = path.with_name(path.name + ".old")
+    for p in (tmp, old):
+        _remove(p)
+    pq.write_to_dataset(table, root_path=tmp, partition_cols=partition_cols)
+    if path.exists():
+        path.rename(old)
+    tmp.rename(path)
+    _remove(old)
+    return path
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def read(path: Path, columns=None, filters=None, categorical: bool = True) -> pd.DataFrame:
+    # Lectura con proyección de columnas y filtros empujados a pyarrow, p. ej.
+    # filters=[("departamento", "=", "SANTANDER"), ("anio", "=", 2024)] solo abre esas particiones.
+    # Sirve tanto para el layout particionado como para un parquet de un solo archivo.
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    expr = pq.filters_to_expression(filters) if filters else None
+    df = dataset.to_table(columns=columns, filter=expr).to_pandas(ignore_metadata=True)
+    if not categorical:
+        for col in df.select_dtypes(include="category").columns:
+            df[col] = df[col].astype(object)
+    return df
@@ -0,0 +1,145 @@
+# app/services/entities.py
+import time
+import unicodedata
+from collections import deque
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from app.services import cube
+
+# Entidades que el chatbot reconoce en la pregunta (columna de features)
+CAMPOS = ["municipio", "tipo_delito", "grupo_etario", "franja_hora", "genero"]
+
+
+def normalize(text) -> str:
+    # minúsculas + quitar tildes
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFD", text.lower())
+    return "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+
+
+class Automaton:
+    # Aho-Corasick: todas las entidades normalizadas en un solo autómata, una pasada por la pregunta
+    def __init__(self, patrones):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for patron, valor in patrones:
+            nodo = 0
+            for ch in patron:
+                if ch not in self.goto[nodo]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[nodo][ch] = len(self.goto) - 1
+                nodo = self.goto[nodo][ch]
+            self.out[nodo].append(valor)
+        cola = deque(self.goto[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for ch, hijo in self.goto[nodo].items():
+                cola.append(hijo)
+                f = self.fail[nodo]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[hijo] = self.goto[f].get(ch, 0)
+                self.out[hijo] = self.out[hijo] + self.out[self.fail[hijo]]
+
+    def find(self, texto: str):
+        nodo = 0
+        encontrados = list(self.out[0])
+        for ch in texto:
+            while nodo and ch not in self.goto[nodo]:
+                nodo = self.fail[nodo]
+            nodo = self.goto[nodo].get(ch, 0)
+            encontrados.extend(self.out[nodo])
+        return encontrados
+
+
+class Catalog:
+    # Diccionario de entidades + cubo (suma de cantidad y número de filas) por combinación
+    # de CAMPOS, construidos una vez por versión del cubo de features.build(). Acepta también
+    # un frame de eventos (sin columna `eventos`, cada fila cuenta como un evento)
+    def __init__(self, df: pd.DataFrame):
+        self.valores = {}
+        self.posicion = {}
+        codigos = []
+        patrones = []
+        for campo in CAMPOS:
+            codes, uniques = pd.factorize(df[campo])
+            uniques = list(uniques)
+            self.valores[campo] = uniques
+            self.posicion[campo] = {v: i for i, v in enumerate(uniques)}
+            codigos.append(codes)
+            # (campo, orden) para respetar la prioridad de .dropna().unique() del detector original
+            patrones += [(normalize(v), (campo, i)) for i, v in enumerate(uniques)]
+        self.automaton = Automaton(patrones)
+
+        dims = [len(self.valores[c]) + 1 for c in CAMPOS]
+        llave = np.ravel_multi_index([c + 1 for c in codigos], dims)
+        celdas, inversa = np.unique(llave, return_inverse=True)
+        self.codes = {c: k - 1 for c, k in zip(CAMPOS, np.unravel_index(celdas, dims))}
+        self.cantidad = np.bincount(inversa, weights=pd.to_numeric(df["cantidad"], errors="coerce").fillna(0).to_numpy())
+        eventos = df["eventos"].to_numpy() if "eventos" in df.columns else None
+        self.filas = np.bincount(inversa, weights=eventos).astype(np.int64)
+
+    def detect(self, pregunta: str) -> dict:
+        # Por campo, la primera entidad (en el orden original) contenida en la pregunta
+        mejores = {}
+        for campo, i in self.automaton.find(normalize(pregunta)):
+            if campo not in mejores or i < mejores[campo]:
+                mejores[campo] = i
+        return {c: (self.valores[c][mejores[c]] if c in mejores else None) for c in CAMPOS}
+
+    def mask(self, filtros: dict) -> np.ndarray:
+        # Celdas del cubo que cumplen los filtros (valor exacto; desconocido = ninguna)
+        mask = np.ones(len(self.filas), dtype=bool)
+        for campo, valor in filtros.items():
+            if valor is None:
+                continue
+            code = self.posicion[campo].get(valor)
+            if code is None:
+                return np.zeros(len(self.filas), dtype=bool)
+            mask &= self.codes[campo] == code
+        return mask
+
+    def top(self, campo: str, mask: np.ndarray, por: str = "filas", n: int = 1) -> list:
+        # Valores de `campo` ordenados por filas o por suma de cantidad dentro de la máscara
+        codes = self.codes[campo][mask]
+        pesos = (self.filas if por == "filas" else self.cantidad)[mask]
+        validos = codes >= 0
+        conteo = np.bincount(codes[validos], weights=pesos[validos], minlength=len(self.valores[campo]))
+        orden = np.argsort(-conteo, kind="stable")
+        return [self.valores[campo][i] for i in orden[:n] if conteo[i] > 0]
+
+
+@lru_cache(maxsize=2)
+def _build(version: str) -> Catalog:
+    t0 = time.perf_counter()
+    catalog = Catalog(cube.get("entidades"))
+    print(f"✅ Catálogo de entidades y cubo del chatbot construidos en {(time.perf_counter() - t0) * 1000:.0f} ms "
+          f"({len(catalog.filas)} celdas)")
+    return catalog
+
+
+def get() -> Catalog:
+    return _build(cube.version())
+
+
+def context(pregunta: str) -> dict:
+    # Parte no-LLM de /chatbot/ask: entidades detectadas y datos filtrados desde el cubo
+    catalog = get()
+    ent = catalog.detect(pregunta)
+    mask = catalog.mask(ent)
+    vacio = not catalog.filas[mask].sum()
+    if ent["franja_hora"] or vacio:
+        hora = ent["franja_hora"] or "SIN_DATO"
+    else:
+        hora = (catalog.top("franja_hora", mask) or ["SIN_DATO"])[0]
+    return {
+        **ent,
+        "total": int(catalog.cantidad[mask].sum()),
+        "hora": hora,
+        "top_muni": catalog.top("municipio", mask, n=3),
+    }
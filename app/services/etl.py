@@ -1,28 +1,138 @@
 # app/services/etl.py
 import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
-from app.config import RAW_DIR, PROC_DIR, SOURCES, COMMON_COLS
+from typing import Optional
+from urllib.parse import quote
+from app.config import RAW_DIR, PROC_DIR, GEO_DIR, SOURCES, COMMON_COLS
+from app.services import dataset
 
-# Importar los demás servicios
-from app.services import features, train, validate
+DEPARTAMENTO = "SANTANDER"
+
+# Filas por chunk al descargar y normalizar (acota la memoria pico)
+CHUNK_ROWS = 100_000
+
+# Tipos fijos de la partición normalizada; el resto de columnas se escriben como texto
+PARTITION_TYPES = {
+    "fecha_hecho": pa.timestamp("ns"), "updated_at": pa.timestamp("ns"),
+    "cantidad": pa.int64(),
+    "anio": pa.int32(), "mes": pa.int32(), "dia": pa.int32(),
+    "has_edad": pa.int64(), "has_genero": pa.int64(), "has_armas": pa.int64(),
+}
+
+# Marca de agua por fuente para cargas incrementales: máximo :updated_at (campo de sistema de
+# Socrata, un floating_timestamp) ya normalizado. fecha_hecho llega como texto dd/mm/yyyy y no
+# sirve para comparar en el $where
+STATE_PATH = PROC_DIR / "etl_state.json"
+
+# Columnas de llave de fila y marca de agua que se guardan en las particiones (no en master)
+ROW_COLS = ["row_id", "updated_at"]
+
+def load_state() -> dict:
+    if STATE_PATH.exists():
+        with open(STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_state(state: dict):
+    PROC_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_PATH.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    tmp.replace(STATE_PATH)
+
+def watermark(state: dict, name: str) -> Optional[str]:
+    # Estados anteriores guardaban la fecha_hecho como texto: sin llaves de fila en las
+    # particiones no se puede deduplicar, así que esa fuente vuelve a cargarse completa
+    valor = state.get(name)
+    return valor.get("updated_at") if isinstance(valor, dict) else None
+
+def source_url(name: str, desde: Optional[str] = None) -> str:
+    # El filtro por departamento (y la marca de agua, si hay) se resuelve en Socrata; :* trae
+    # los campos de sistema (:id, :updated_at). La marca de agua es inclusiva (>=): las filas
+    # que llegan tarde con el mismo :updated_at no se pierden y las repetidas se descartan por
+    # :id al normalizar
+    url = SOURCES[name]
+    sep = "&" if "?" in url else "?"
+    where = f"upper(departamento) = '{DEPARTAMENTO}'"
+    select = f"$select={quote(':*, *')}"
+    if desde:
+        where += f" AND :updated_at >= '{desde}'"
+        return f"{url}{sep}{select}&$where={quote(where)}&$order=:updated_at"
+    return f"{url}{sep}{select}&$where={quote(where)}"
 
 def fetch_source(name: str, url: str) -> Path:
     RAW_DIR.mkdir(parents=True, exist_ok=True)
     path = RAW_DIR / f"{name}.csv"
     print(f"➡️ Descargando fuente: {name} desde {url}")
-    df_iter = pd.read_csv(url, chunksize=100_000, dtype=str)
+    df_iter = pd.read_csv(url, chunksize=CHUNK_ROWS, dtype=str)
     with open(path, "w", encoding="utf-8", newline="") as f:
         for i, chunk in enumerate(df_iter):
             chunk.to_csv(f, index=False, header=(i == 0))
     print(f"✅ Fuente {name} guardada en {path}")
     return path
 
-def normalize(name: str, path: Path) -> Path:
-    PROC_DIR.mkdir(parents=True, exist_ok=True)
-    print(f"➡️ Normalizando dataset: {name}")
-    df = pd.read_csv(path, dtype=str)
+def fetch_with_retry(name: str, url: str, retries: int = 3, backoff: float = 2.0):
+    # Reintentos con backoff exponencial; devuelve (ruta, segundos de descarga)
+    t0 = time.perf_counter()
+    for intento in range(1, retries + 1):
+        try:
+            return fetch_source(name, url), time.perf_counter() - t0
+        except Exception as e:
+            if intento == retries:
+                raise
+            espera = backoff ** (intento - 1)
+            print(f"⚠️ Falló la descarga de {name} (intento {intento}/{retries}): {e}. Reintentando en {espera:.0f}s")
+            time.sleep(espera)
+
+def derive(df: pd.DataFrame) -> pd.DataFrame:
+    # Columnas derivadas (todas dependen solo de la fila)
+    df["anio"] = df["fecha_hecho"].dt.year
+    df["mes"] = df["fecha_hecho"].dt.month
+    df["dia"] = df["fecha_hecho"].dt.day
+    df["dia_semana"] = df["fecha_hecho"].dt.day_name()
+    df["franja_hora"] = df["fecha_hecho"].dt.hour.apply(
+        lambda h: "NOCHE" if h >= 19 or h < 6 else ("TARDE" if h >= 12 else "MAÑANA")
+    )
+
+    # Coverage flags
+    df["has_edad"] = (df["grupo_etario"] != "SIN_DATO").astype(int)
+    df["has_genero"] = (df["genero"] != "SIN_DATO").astype(int)
+    df["has_armas"] = df.get("armas_medios", pd.Series([None]*len(df), index=df.index)).notna().astype(int)
+    return df
+
+def row_keys(df: pd.DataFrame, ocurrencias: Optional[dict] = None) -> pd.DataFrame:
+    # Llave de fila y marca de agua de cada fila: :id y :updated_at de Socrata; si la fuente no
+    # los trae (p. ej. un servidor de fixtures CSV) se usan un hash de la fila más su número de
+    # aparición en el archivo (filas idénticas son eventos distintos) y fecha_hecho
+    campos = [c for c in df.columns if not c.startswith(":")]
+    if ":id" in df.columns:
+        row_id = df[":id"].astype(str)
+    else:
+        ocurrencias = {} if ocurrencias is None else ocurrencias
+        h = pd.util.hash_pandas_object(df[campos], index=False).map("{:016x}".format)
+        n = h.groupby(h).cumcount() + h.map(ocurrencias).fillna(0).astype(int)
+        for valor, veces in h.value_counts().items():
+            ocurrencias[valor] = ocurrencias.get(valor, 0) + veces
+        row_id = h + "-" + n.astype(str)
+    if ":updated_at" in df.columns:
+        updated_at = pd.to_datetime(df[":updated_at"], errors="coerce")
+    else:
+        updated_at = pd.to_datetime(df.get("fecha_hecho"), errors="coerce", dayfirst=True)
+    return pd.DataFrame({"row_id": row_id, "updated_at": updated_at}, index=df.index)
 
+def normalize_chunk(name: str, df: pd.DataFrame, desde: Optional[str] = None, vistos=None,
+                    ocurrencias: Optional[dict] = None) -> pd.DataFrame:
+    keys = row_keys(df, ocurrencias)
     if name == "sexuales":
         df["tipo_delito"] = "delitos_sexuales"
         keep = COMMON_COLS + ["delito"]
@@ -41,6 +151,7 @@ def normalize(name: str, path: Path) -> Path:
 
     # Filtrar columnas relevantes
     df = df[[c for c in df.columns if c in set(keep + ["tipo_delito","municipio","departamento"])]].copy()
+    df[ROW_COLS] = keys
 
     # Limpieza básica
     df["cantidad"] = pd.to_numeric(df.get("cantidad", 0), errors="coerce").fillna(0).astype(int)
@@ -53,49 +164,178 @@ def normalize(name: str, path: Path) -> Path:
 
     # Filtro por Santander
     if "departamento" in df.columns:
-        df = df[df["departamento"] == "SANTANDER"]
+        df = df[df["departamento"] == DEPARTAMENTO]
+
+    # Solo filas desde la marca de agua (por si el servidor ignora $where). Se descartan las
+    # que ya están guardadas con el mismo (row_id, updated_at); una fila corregida en la fuente
+    # (mismo :id, :updated_at más reciente) se agrega y read_partitions se queda con la última
+    if desde:
+        df = df[df["updated_at"] >= pd.Timestamp(desde)]
+        if vistos is not None and len(df):
+            df = df[~pd.MultiIndex.from_frame(df[ROW_COLS]).isin(vistos)]
+    return derive(df.copy())
+
+def normalize(name: str, path: Path, desde: Optional[str] = None, part_dir: Optional[Path] = None) -> Optional[Path]:
+    # Normaliza el CSV descargado chunk a chunk y lo escribe como una nueva partición de
+    # la fuente (en `part_dir`, por defecto la carpeta de la fuente); la memoria pico queda
+    # acotada por CHUNK_ROWS y no por el tamaño del CSV
+    part_dir = part_dir or PROC_DIR / name
+    part_dir.mkdir(parents=True, exist_ok=True)
+    print(f"➡️ Normalizando dataset: {name}")
+    # Nanosegundos para que los nombres sigan el orden de escritura (read_partitions se queda
+    # con la última versión de cada fila) y sufijo aleatorio para que no choquen
+    out = part_dir / f"part-{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 10 ** 9:09d}-{uuid.uuid4().hex[:8]}.parquet"
+    tmp = out.with_suffix(".tmp")
+    vistos = None
+    if desde:
+        guardadas = read_partitions(name, columns=ROW_COLS, latest=False)
+        vistos = pd.MultiIndex.from_frame(guardadas) if len(guardadas) else None
+    ocurrencias = {}
 
-    out = PROC_DIR / f"{name}.parquet"
-    df.to_parquet(out, index=False)
-    print(f"✅ Dataset {name} normalizado y guardado en {out}")
+    writer, rows = None, 0
+    try:
+        for chunk in pd.read_csv(path, dtype=str, chunksize=CHUNK_ROWS):
+            df = normalize_chunk(name, chunk, desde, vistos, ocurrencias)
+            if df.empty:
+                continue
+            if writer is None:
+                schema = pa.schema([(c, PARTITION_TYPES.get(c, pa.string())) for c in df.columns])
+                writer = pq.ParquetWriter(tmp, schema)
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if not rows:
+        print(f"✅ Sin registros nuevos para {name}")
+        return None
+    tmp.replace(out)
+    print(f"✅ Dataset {name} normalizado: {rows} filas en {out}")
     return out
 
-def build_master() -> Path:
-    print("➡️ Construyendo master.parquet…")
-    parts = []
-    for name, url in SOURCES.items():
-        csv_path = fetch_source(name, url)
-        pq_path = normalize(name, csv_path)
-        parts.append(pd.read_parquet(pq_path))
-
-    master = pd.concat(parts, ignore_index=True)
-
-    # Columnas derivadas
-    master["anio"] = master["fecha_hecho"].dt.year
-    master["mes"] = master["fecha_hecho"].dt.month
-    master["dia"] = master["fecha_hecho"].dt.day
-    master["dia_semana"] = master["fecha_hecho"].dt.day_name()
-    master["franja_hora"] = master["fecha_hecho"].dt.hour.apply(
-        lambda h: "NOCHE" if h >= 19 or h < 6 else ("TARDE" if h >= 12 else "MAÑANA")
-    )
+def _timed_normalize(name: str, path: Path, desde: Optional[str] = None, part_dir: Optional[Path] = None):
+    # Envoltorio para el pool de procesos: devuelve (partición, segundos de normalización)
+    t0 = time.perf_counter()
+    return normalize(name, path, desde, part_dir), time.perf_counter() - t0
 
-    # Coverage flags
-    master["has_edad"] = (master["grupo_etario"] != "SIN_DATO").astype(int)
-    master["has_genero"] = (master["genero"] != "SIN_DATO").astype(int)
-    master["has_armas"] = master.get("armas_medios", pd.Series([None]*len(master))).notna().astype(int)
+def read_partitions(name: str, columns=None, latest: bool = True) -> pd.DataFrame:
+    # Particiones de la fuente en orden de escritura; con latest=True queda una sola versión
+    # por row_id, la de mayor updated_at (a igual updated_at, la escrita después)
+    parts = [pd.read_parquet(p, columns=columns) for p in sorted((PROC_DIR / name).glob("part-*.parquet"))]
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    if latest and set(ROW_COLS) <= set(df.columns):
+        df = df.sort_values("updated_at", kind="stable").drop_duplicates("row_id", keep="last").sort_index()
+    return df
 
-    out = PROC_DIR / "master.parquet"
-    master.to_parquet(out, index=False)
+def _swap(name: str, nuevo: Path):
+    # Reemplaza las particiones de la fuente por las de una carga completa ya terminada
+    actual, viejo = PROC_DIR / name, PROC_DIR / f".{name}.old"
+    shutil.rmtree(viejo, ignore_errors=True)
+    if actual.exists():
+        actual.rename(viejo)
+    nuevo.rename(actual)
+    shutil.rmtree(viejo, ignore_errors=True)
+
+def add_coords(master: pd.DataFrame) -> pd.DataFrame:
+    # Join geográfico materializado: lat/lon del municipio (municipios.csv) por codigo_dane,
+    # así la API no hace el merge en cada petición. NaN si el código no está en el catálogo
+    geo = pd.read_csv(GEO_DIR / "municipios.csv", dtype={"codigo_dane": str})
+    geo = geo.drop_duplicates("codigo_dane").set_index("codigo_dane")
+    codigos = master["codigo_dane"].astype(str).str.strip()
+    master["lat"] = codigos.map(geo["lat"])
+    master["lon"] = codigos.map(geo["lon"])
+    return master
+
+def build_master(incremental: bool = False, fetch_workers: int = 3,
+                 normalize_workers: Optional[int] = None, retries: int = 3) -> Path:
+    # Descargas concurrentes (hilos, limitadas por red) y normalización en un pool de
+    # procesos (limitada por CPU) que arranca en cuanto termina cada descarga
+    print(f"➡️ Construyendo master.parquet… ({'incremental' if incremental else 'completo'})")
+    t_inicio = time.perf_counter()
+    # El estado se conserva también en la carga completa: si una fuente falla mantiene sus
+    # particiones y su marca de agua anteriores
+    state = load_state()
+    desde = {name: watermark(state, name) if incremental else None for name in SOURCES}
+    # Carga completa: cada fuente se normaliza en una carpeta aparte que reemplaza a la
+    # actual solo cuando la normalización terminó con datos
+    destino = {name: None if desde[name] else PROC_DIR / f".{name}.nuevo" for name in SOURCES}
+
+    if normalize_workers is None:
+        normalize_workers = min(len(SOURCES), os.cpu_count() or 1)
+    tiempos = {name: {} for name in SOURCES}
+    # spawn: los workers no se crean con fork desde un proceso con hilos de descarga activos
+    # (locks del código HTTP/SSL tomados en el hijo)
+    procs = (ProcessPoolExecutor(max_workers=normalize_workers, mp_context=multiprocessing.get_context("spawn"))
+             if normalize_workers > 0 else None)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, fetch_workers)) as hilos:
+            descargas = {
+                hilos.submit(fetch_with_retry, name, source_url(name, desde[name]), retries): name
+                for name in SOURCES
+            }
+            normalizaciones = {}
+            for fut in as_completed(descargas):
+                name = descargas[fut]
+                csv_path, tiempos[name]["descarga_s"] = fut.result()
+                if destino[name] is not None:
+                    shutil.rmtree(destino[name], ignore_errors=True)
+                if procs is None:
+                    normalizaciones[name] = _timed_normalize(name, csv_path, desde[name], destino[name])
+                else:
+                    normalizaciones[name] = procs.submit(_timed_normalize, name, csv_path, desde[name], destino[name])
+
+        for name, res in normalizaciones.items():
+            pq_path, tiempos[name]["normalizacion_s"] = res if procs is None else res.result()
+            if destino[name] is not None:
+                if pq_path is None:
+                    shutil.rmtree(destino[name], ignore_errors=True)
+                    print(f"⚠️ Carga completa de {name} sin registros: se conservan las particiones anteriores")
+                    continue
+                _swap(name, destino[name])
+                pq_path = PROC_DIR / name / pq_path.name
+            if pq_path is not None:
+                nuevo = pd.read_parquet(pq_path, columns=["updated_at"])["updated_at"].max()
+                if pd.notna(nuevo):
+                    # Mismo formato que un floating_timestamp de SoQL (milisegundos, truncado)
+                    state[name] = {"updated_at": nuevo.strftime("%Y-%m-%dT%H:%M:%S.%f")[:23]}
+                save_state(state)
+    finally:
+        if procs is not None:
+            procs.shutdown()
+
+    t_master = time.perf_counter()
+    master = pd.concat([read_partitions(name) for name in SOURCES], ignore_index=True)
+    master = master.drop(columns=ROW_COLS, errors="ignore")
+    master = add_coords(master)
+
+    # Dataset particionado por anio/tipo_delito con tipos compactos
+    out = dataset.write(master, PROC_DIR / "master.parquet")
+
+    # Tiempos por etapa
+    for name, t in tiempos.items():
+        print(f"⏱️ {name}: descarga {t.get('descarga_s', 0):.1f}s, normalización {t.get('normalizacion_s', 0):.1f}s")
+    print(f"⏱️ master.parquet: {time.perf_counter() - t_master:.1f}s · total ETL: {time.perf_counter() - t_inicio:.1f}s")
     print("✅ ETL terminado, master.parquet generado.")
     return out
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--fetch", action="store_true")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Solo descarga y normaliza registros desde la última marca de agua (:updated_at)")
+    parser.add_argument("--workers", type=int, default=3, help="Descargas concurrentes")
+    parser.add_argument("--normalize-workers", type=int, default=None,
+                        help="Procesos de normalización (0 = en el proceso principal)")
+    parser.add_argument("--retries", type=int, default=3, help="Reintentos por fuente")
     args = parser.parse_args()
     if args.fetch:
+        # Importar los demás servicios (solo al correr el pipeline completo)
+        from app.services import features, train, validate
+
         # 1. ETL
-        build_master()
+        build_master(incremental=args.incremental, fetch_workers=args.workers,
+                     normalize_workers=args.normalize_workers, retries=args.retries)
         # 2. Features
         print("➡️ Generando features.parquet…")
         features.build()
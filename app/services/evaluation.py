@@ -0,0 +1,49 @@
+# app/services/evaluation.py
+import numpy as np
+import pandas as pd
+from sklearn.metrics import auc, classification_report, precision_recall_curve, roc_auc_score
+from app.config import PR_CURVE_POINTS
+
+
+def evaluate(model, X: pd.DataFrame, y: pd.Series, weight=None, points: int = PR_CURVE_POINTS) -> dict:
+    # Métricas de validación con una sola pasada de predict_proba (la clase predicha sale
+    # de la misma probabilidad). Se guardan como validation.json junto al modelo
+    if hasattr(model, "predict_proba"):
+        proba = model.predict_proba(X)
+        y_pred = np.asarray(model.classes_).take(proba.argmax(axis=1))
+    else:
+        proba, y_pred = None, model.predict(X)
+    result = {
+        "filas": int(len(X)),
+        "report": classification_report(y, y_pred, sample_weight=weight, output_dict=True),
+        "report_text": classification_report(y, y_pred, sample_weight=weight),
+    }
+    if proba is not None:
+        y_proba = proba[:, 1]
+        precision, recall, thresholds = precision_recall_curve(y, y_proba, sample_weight=weight)
+        result.update(
+            roc_auc=float(roc_auc_score(y, y_proba, sample_weight=weight)),
+            pr_auc=float(auc(recall, precision)),
+            pr_curve=_curve(precision, recall, thresholds, points),
+        )
+    return result
+
+
+def _curve(precision, recall, thresholds, points: int) -> dict:
+    # Puntos de la curva PR, submuestreados a lo sumo a `points` (se conservan los extremos).
+    # precision/recall traen un punto más que thresholds (recall=0 sin umbral)
+    idx = np.arange(len(thresholds))
+    if len(idx) > points:
+        idx = np.unique(np.linspace(0, len(idx) - 1, points).round().astype(int))
+    return {
+        "precision": [round(float(v), 6) for v in precision[idx]] + [float(precision[-1])],
+        "recall": [round(float(v), 6) for v in recall[idx]] + [float(recall[-1])],
+        "thresholds": [round(float(v), 6) for v in thresholds[idx]],
+    }
+
+
+def show(result: dict):
+    print(result.get("report_text", ""))
+    if "roc_auc" in result:
+        print(f"ROC-AUC: {result['roc_auc']:.3f}")
+        print(f"PR-AUC: {result['pr_auc']:.3f}")
@@ -1,37 +1,112 @@
 # app/services/explain.py
-import shap
-import joblib
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from app.config import MODELS_DIR, PROC_DIR
+from app.config import EXPLAIN_BATCH, EXPLAIN_WORKERS
+from app.services import registry
 
-def explain_sample(n=1000):
-    # Cargar modelo entrenado
-    model = joblib.load(MODELS_DIR / "risk_model.pkl")
+# Atribuciones SHAP por municipio-mes en log-odds: base + suma de aportes = logit del modelo.
+# Se calculan al entrenar con el camino específico de árboles (TreeExplainer de shap para
+# sklearn, pred_contribs nativo para XGBoost) y se guardan junto a las predicciones
+KEYS = ["municipio", "anio", "mes"]
 
-    # Cargar features y filtrar solo Santander
-    df = pd.read_parquet(PROC_DIR / "features.parquet")
-    df = df[df["departamento"] == "SANTANDER"].copy()
+# Clasificador y explainer del proceso (en los workers se arman una sola vez en _init)
+_worker = {"clf": None, "explainer": None}
 
-    # Agregación mensual por municipio
-    agg = df.groupby(["departamento","municipio","anio","mes"], as_index=False).agg({
-        "tasa_delitos_muni_mes":"mean",
-        "tasa_delitos_dep_mes":"mean",
-        "acumulado_90d":"mean"
-    })
 
-    # Selección de variables para explicar
-    X = agg[[
-        "departamento","municipio","anio","mes",
-        "tasa_delitos_muni_mes","tasa_delitos_dep_mes","acumulado_90d"
-    ]].head(n)
+def _init(clf):
+    _worker["clf"] = clf
+    if type(clf).__name__ == "XGBClassifier":
+        _worker["explainer"] = None
+    else:
+        import shap
+        _worker["explainer"] = shap.TreeExplainer(clf)
 
-    # Transformar con el preprocesador del pipeline
-    X_trans = model.named_steps["pre"].transform(X)
 
-    # Crear explainer sobre el clasificador final
-    explainer = shap.Explainer(model.named_steps["clf"], X_trans)
+def _explain_batch(X: np.ndarray) -> np.ndarray:
+    # Aportes por columna transformada + la base en la última columna
+    clf, explainer = _worker["clf"], _worker["explainer"]
+    if explainer is None:
+        import xgboost
+        return clf.get_booster().predict(xgboost.DMatrix(X), pred_contribs=True)
+    aportes = np.asarray(explainer.shap_values(X, check_additivity=False)).reshape(len(X), -1)
+    base = float(np.ravel(explainer.expected_value)[-1])
+    return np.column_stack([aportes, np.full(len(X), base)])
 
-    # Calcular valores SHAP
-    shap_values = explainer(X_trans)
 
-    return shap_values, X
+def _sources(pre) -> list:
+    # Columna original de cada columna que sale del preprocesador (el one-hot de una
+    # categórica se vuelve a sumar en una sola variable)
+    fuentes = []
+    for name, trans, cols in pre.transformers_:
+        if name == "remainder" and trans == "drop":
+            continue
+        if hasattr(trans, "categories_"):
+            fuentes += [col for col, cats in zip(cols, trans.categories_) for _ in cats]
+        else:
+            fuentes += list(cols)
+    return fuentes
+
+
+def explain_frame(model, df: pd.DataFrame, workers: int = EXPLAIN_WORKERS, batch: int = EXPLAIN_BATCH) -> pd.DataFrame:
+    # Una fila por fila de `df` (municipio-mes): valores de FEATURES, shap_<variable>, base,
+    # logit y probabilidad. Los lotes se reparten entre procesos
+    from app.services.train import FEATURES
+    pre, clf = model.named_steps["pre"], model.named_steps["clf"]
+    X = pre.transform(df[FEATURES])
+    lotes = [X[i:i + batch] for i in range(0, len(X), batch)]
+    workers = min(workers or os.cpu_count() or 1, len(lotes))
+    t0 = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init, initargs=(clf,)) as pool:
+            partes = list(pool.map(_explain_batch, lotes))
+    else:
+        _init(clf)
+        partes = [_explain_batch(lote) for lote in lotes]
+    aportes = np.vstack(partes) if partes else np.zeros((0, X.shape[1] + 1))
+    fuentes = np.array(_sources(pre))
+
+    out = df[KEYS + [c for c in FEATURES if c not in KEYS]].reset_index(drop=True)
+    for col in FEATURES:
+        out[f"shap_{col}"] = aportes[:, :-1][:, fuentes == col].sum(axis=1)
+    out["base"] = aportes[:, -1]
+    out["logit"] = aportes.sum(axis=1)
+    out["probabilidad"] = 1.0 / (1.0 + np.exp(-out["logit"]))
+    print(f"✅ Explicaciones SHAP de {len(out)} municipio-mes en {time.perf_counter() - t0:.1f} s "
+          f"({len(lotes)} lotes, {max(workers, 1)} proceso(s))")
+    return out.sort_values(["anio", "mes", "municipio"]).reset_index(drop=True)
+
+
+def explain_sample(n=1000, workers: int = 1):
+    # Explicaciones del modelo activo para las primeras `n` filas municipio-mes
+    from app.services.train import load_frame
+    model = registry.load_model()
+    X = load_frame("municipio_mes").dropna(subset=["anio", "mes"]).head(n)
+    return explain_frame(model, X, workers=workers), X
+
+
+def precompute(version: str = None, workers: int = EXPLAIN_WORKERS, batch: int = EXPLAIN_BATCH):
+    # Recalcula explanations.parquet de una versión ya publicada (p. ej. entrenada antes de
+    # que existieran las explicaciones)
+    from app.services.train import load_frame
+    version = version or registry.current_version()
+    if not version:
+        raise SystemExit("❌ No hay versión activa en el registro de modelos")
+    model = registry.load_model(version)
+    df = load_frame("municipio_mes").dropna(subset=["anio", "mes"])
+    registry.save_explanations(version, explain_frame(model, df, workers, batch))
+    print(f"✅ Explicaciones guardadas con la versión {version}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--precompute", action="store_true")
+    parser.add_argument("--version", default=None, help="Versión del registro (por defecto la activa)")
+    parser.add_argument("--workers", type=int, default=EXPLAIN_WORKERS)
+    parser.add_argument("--batch", type=int, default=EXPLAIN_BATCH)
+    args = parser.parse_args()
+    if args.precompute:
+        precompute(args.version, args.workers, args.batch)
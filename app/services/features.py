@@ -1,6 +1,10 @@
 # app/services/features.py
+import argparse
+import json
+import numpy as np
 import pandas as pd
 from app.config import PROC_DIR
+from app.services import cube, dataset
 
 DERIVED_COLS = [
     "anio","mes","dia","dia_semana","franja_hora",
@@ -10,12 +14,108 @@ DERIVED_COLS = [
     "grupo_edad_bin","es_mujer","es_hombre","riesgo_alto"
 ]
 
-def build():
-    df = pd.read_parquet(PROC_DIR / "master.parquet")
-
-    # Filtro por departamento Santander
-    if "departamento" in df.columns:
-        df = df[df["departamento"] == "SANTANDER"].copy()
+MONTH_KEYS = ["departamento","municipio","anio","mes"]
+
+# Ventanas (días) del acumulado móvil por municipio -> columnas acumulado_{d}d. La de 90 días
+# siempre se calcula: acumulado_90d es variable del modelo (train.FEATURES y store.COLUMNS)
+ROLLING_WINDOWS = [90]
+REQUIRED_WINDOW = 90
+
+def rolling_sum(df: pd.DataFrame, days: int = 90, by: str = "municipio",
+                on: str = "fecha_hecho", value: str = "cantidad") -> np.ndarray:
+    # Suma de `value` en la ventana (t - days, t] dentro de cada grupo, con sumas prefijas
+    # y searchsorted. Requiere df ordenado por [by, on]; las fechas NaT quedan en NaN.
+    n = len(df)
+    out = np.full(n, np.nan)
+    if n == 0:
+        return out
+    t = df[on].to_numpy(dtype="datetime64[ns]")
+    valid = ~np.isnat(t)
+    t = t.view("i8")
+    v = df[value].to_numpy(dtype=float)
+    codes = pd.factorize(df[by])[0]
+    window = np.int64(days) * np.int64(86_400_000_000_000)
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], n]
+    for s, e in zip(starts, ends):
+        # sort_values deja los NaT al final de cada grupo
+        k = s + int(valid[s:e].sum())
+        tg = t[s:k]
+        cs = np.concatenate(([0.0], np.cumsum(v[s:k])))
+        left = np.searchsorted(tg, tg - window, side="right")
+        out[s:k] = cs[1:] - cs[left]
+    return out
+
+def aggregate_monthly(df: pd.DataFrame) -> pd.DataFrame:
+    # Una fila por municipio-mes; 'eventos' cuenta las filas originales y sirve de peso
+    agg = df.dropna(subset=["anio","mes"]).groupby(MONTH_KEYS, as_index=False, dropna=False, observed=True).agg(
+        tasa_delitos_muni_mes_lag=("tasa_delitos_muni_mes_lag", "first"),
+        tasa_delitos_dep_mes_lag=("tasa_delitos_dep_mes_lag", "first"),
+        acumulado_90d=("acumulado_90d", "mean"),
+        cantidad=("cantidad", "sum"),
+        riesgo_alto=("riesgo_alto", "max"),
+        eventos=("riesgo_alto", "size"),
+    )
+    agg["anio"] = agg["anio"].astype(int)
+    agg["mes"] = agg["mes"].astype(int)
+    return agg
+
+def _month_bounds(last_date: pd.Timestamp):
+    cur_start = last_date.replace(day=1)
+    prev_start = (cur_start - pd.DateOffset(months=1)).replace(day=1)
+    return cur_start, prev_start
+
+def kpi_snapshot(df: pd.DataFrame) -> dict:
+    # Agregados del mes actual y anterior para las tarjetas del dashboard
+    fechas = pd.to_datetime(df["fecha_hecho"], errors="coerce")
+    last_date = fechas.max()
+    cur_start, prev_start = _month_bounds(last_date)
+    cur_mask = (fechas >= cur_start) & (fechas <= last_date)
+    prev_mask = (fechas >= prev_start) & (fechas < cur_start)
+    cur, prev = df[cur_mask], df[prev_mask]
+
+    def col_agg(frame, col, how):
+        if col not in frame.columns or not len(frame):
+            return None
+        return float(getattr(frame[col], how)())
+
+    alto_cur = cur[cur["riesgo_alto"] == 1] if "riesgo_alto" in cur.columns else cur.iloc[0:0]
+    alto_prev = prev[prev["riesgo_alto"] == 1] if "riesgo_alto" in prev.columns else prev.iloc[0:0]
+
+    return {
+        "periodo": {
+            "fecha_corte": str(last_date),
+            "mes_actual": str(cur_start),
+            "mes_anterior": str(prev_start),
+        },
+        "kpis": {
+            "incidents_total": {
+                "actual": int(cur["cantidad"].sum()),
+                "anterior": int(prev["cantidad"].sum()),
+            },
+            "response_time": {
+                "actual": col_agg(cur, "acumulado_90d", "max"),
+                "anterior": col_agg(prev, "acumulado_90d", "max"),
+            },
+            "crime_rate": {
+                "actual": col_agg(cur, "tasa_delitos_dep_mes_lag", "mean"),
+                "anterior": col_agg(prev, "tasa_delitos_dep_mes_lag", "mean"),
+            },
+            "cases_resolved": {
+                "actual": int(alto_cur["cantidad"].sum()),
+                "anterior": int(alto_prev["cantidad"].sum()),
+            },
+        },
+    }
+
+def build(windows=None):
+    windows = sorted(set(windows or ROLLING_WINDOWS) | {REQUIRED_WINDOW})
+    # Solo Santander: el filtro se empuja a la lectura del dataset particionado
+    df = dataset.read(PROC_DIR / "master.parquet",
+                      filters=[("departamento", "=", "SANTANDER")], categorical=False)
+    # Las coordenadas del master son para el mapa, no para el modelo
+    df = df.drop(columns=["lat", "lon"], errors="ignore")
 
     # Identificador de evento
     df["evento_id"] = df.index
@@ -67,17 +167,16 @@ def build():
         on=["departamento","anio","mes"], how="left"
     )
 
-    # Rolling 90 días por municipio
+    # Acumulados móviles (90 días por defecto) por municipio
     if "municipio" in df.columns:
         df = df.sort_values(["municipio","fecha_hecho"])
-        def rolling_90d(group):
-            g = group.set_index("fecha_hecho").sort_index()
-            out = group.copy()
-            out["acumulado_90d"] = g["cantidad"].rolling("90D").sum().values
-            return out
-        df = df.groupby("municipio", group_keys=False).apply(rolling_90d)
+        # Como el groupby-apply original, las filas sin municipio quedan fuera
+        df = df[df["municipio"].notna()].copy()
+        for days in windows:
+            df[f"acumulado_{days}d"] = rolling_sum(df, days)
     else:
-        df["acumulado_90d"] = 0
+        for days in windows:
+            df[f"acumulado_{days}d"] = 0
 
     # Riesgo alto por mes (top 10% de municipios en cada anio-mes)
     if "municipio" in df.columns:
@@ -101,11 +200,28 @@ def build():
     df["departamento_riesgo"] = df.groupby("departamento")["cantidad"].transform("sum")
 
     # Imputación segura post-merge para evitar NaNs en features
-    for col in ["tasa_delitos_muni_mes_lag", "tasa_delitos_dep_mes_lag", "acumulado_90d", "riesgo_alto"]:
+    acumulados = [f"acumulado_{days}d" for days in windows]
+    for col in ["tasa_delitos_muni_mes_lag", "tasa_delitos_dep_mes_lag", *acumulados, "riesgo_alto"]:
         df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int if col=="riesgo_alto" else float)
 
-    df.to_parquet(PROC_DIR / "features.parquet", index=False)
+    dataset.write(df, PROC_DIR / "features.parquet")
     print("✅ Features built with >20 variables (solo Santander, con lag mensual).")
 
+    # Grano municipio-mes para entrenamiento agregado
+    aggregate_monthly(df).to_parquet(PROC_DIR / "features_mes.parquet", index=False)
+    print(f"✅ Features municipio-mes guardadas en {PROC_DIR / 'features_mes.parquet'}")
+
+    # Cubo de agregados para analytics y chatbot (cantidad y eventos por dimensiones)
+    cube.write(df)
+
+    # Snapshot de KPIs mensuales para el dashboard
+    with open(PROC_DIR / "kpis.json", "w", encoding="utf-8") as f:
+        json.dump(kpi_snapshot(df), f, ensure_ascii=False, indent=2)
+    print(f"✅ Snapshot de KPIs guardado en {PROC_DIR / 'kpis.json'}")
+
 if __name__ == "__main__":
-    build()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--windows", type=int, nargs="+", default=None,
+                        help="Ventanas extra del acumulado móvil (90 siempre se incluye)")
+    args = parser.parse_args()
+    build(args.windows)
@@ -0,0 +1,99 @@
+# app/services/index.py
+import time
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from app.services import store
+
+# Columnas con listas de posiciones (postings) para filtrar sin máscaras booleanas
+INDEXED = ["departamento", "municipio", "tipo_delito", "anio", "mes"]
+
+
+class Index:
+    # Posiciones de df ordenadas por fecha_hecho descendente (NaT al final) y, por cada
+    # valor de las columnas indexadas, los rangos (posición dentro de ese orden) ya ordenados
+    def __init__(self, df: pd.DataFrame, sort_by: str = "fecha_hecho"):
+        fechas = df[sort_by].reset_index(drop=True)
+        self.order = fechas.sort_values(ascending=False, kind="stable").index.to_numpy()
+        # fecha en ns por rango (no creciente; NaT es el mínimo de int64 y queda al final)
+        self.fechas = fechas.to_numpy(dtype="datetime64[ns]").view("i8")[self.order]
+        self.rank = np.empty_like(self.order)
+        self.rank[self.order] = np.arange(len(self.order))
+        self.postings = {}
+        self.codes = {}
+        self.lookup = {}
+        rangos = np.arange(len(df))
+        for col in INDEXED:
+            if col in df.columns:
+                codes, uniques = pd.factorize(df[col].to_numpy()[self.order])
+                self.codes[col] = codes
+                self.lookup[col] = {v: i for i, v in enumerate(uniques)}
+                self.postings[col] = pd.Series(rangos).groupby(codes, sort=False).indices
+
+    def cursor(self, pos: int) -> str:
+        # Cursor keyset "fecha_ns:fila" de la última fila entregada
+        return f"{int(self.fechas[self.rank[pos]])}:{int(pos)}"
+
+    def start(self, cursor) -> int:
+        # Primer rango estrictamente después de (fecha, fila) en el orden fecha desc, fila asc.
+        # Busca por fecha y no por rango: la página siguiente no depende de las filas ya vistas
+        if not cursor:
+            return 0
+        try:
+            fecha, fila = (int(x) for x in str(cursor).split(":"))
+        except ValueError:
+            raise ValueError(f"Cursor inválido: {cursor}")
+        asc = self.fechas[::-1]
+        n = len(self.fechas)
+        fin = n - int(np.searchsorted(asc, fecha, side="left"))
+        inicio = n - int(np.searchsorted(asc, fecha, side="right"))
+        return inicio + int(np.searchsorted(self.order[inicio:fin], fila, side="right"))
+
+    def positions(self, filtros: dict, limit=None, desde: int = 0) -> np.ndarray:
+        # Recorre la lista más corta en bloques, en orden de fecha, y verifica el resto de
+        # filtros con los códigos; se detiene al completar `limit` filas. `desde` es el
+        # primer rango a considerar (paginación por cursor)
+        activos = {}
+        for col, valor in filtros.items():
+            if valor is None or col not in self.postings:
+                continue
+            code = self.lookup[col].get(valor)
+            if code is None:
+                return self.order[:0]
+            activos[col] = code
+        if not activos:
+            return self.order[desde:][:limit]
+        base = min(activos, key=lambda c: len(self.postings[c][activos[c]]))
+        lista = self.postings[base][activos.pop(base)]
+        lista = lista[np.searchsorted(lista, desde):]
+        if not activos:
+            return self.order[lista[:limit]]
+        if limit is None or limit < 0:
+            bloque = len(lista)
+        else:
+            bloque = max(4 * limit, 4096)
+        encontrados, total = [], 0
+        for inicio in range(0, len(lista), bloque):
+            rangos = lista[inicio:inicio + bloque]
+            mask = np.ones(len(rangos), dtype=bool)
+            for col, code in activos.items():
+                mask &= self.codes[col][rangos] == code
+            encontrados.append(rangos[mask])
+            total += int(mask.sum())
+            if limit is not None and 0 <= limit <= total:
+                break
+        rangos = np.concatenate(encontrados) if encontrados else lista[:0]
+        return self.order[rangos[:limit]]
+
+
+@lru_cache(maxsize=2)
+def _build(name: str, version: str) -> Index:
+    t0 = time.perf_counter()
+    idx = Index(store.get(name))
+    print(f"✅ Índice de {name} construido en {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return idx
+
+
+def get(name: str = "master") -> Index:
+    # Se reconstruye solo cuando cambia la versión del dataset en el store
+    return _build(name, store.version(name))
@@ -0,0 +1,207 @@
+# app/services/inference.py
+import json
+import numpy as np
+import pandas as pd
+
+# Celdas (filas x árboles) hasta las que conviene recorrer todos los árboles a la vez
+BLOCK = 1 << 18
+
+class CompactModel:
+    # Pipeline entrenado exportado a arreglos numpy: one-hot + imputación + escalado y un
+    # bosque aplanado (los nodos de todos los árboles en arreglos contiguos). Para predecir
+    # no hace falta sklearn, xgboost ni unpickle; la API lo carga en milisegundos
+    def __init__(self, arrays: dict, meta: dict):
+        self.arrays = arrays
+        self.meta = meta
+        self.grano_ = meta.get("grano")
+        self.classes_ = np.array(meta["classes"])
+
+    def transform(self, X: pd.DataFrame) -> np.ndarray:
+        a = self.arrays
+        bloques = []
+        for col, categorias in zip(self.meta["cat_cols"], self.meta["categories"]):
+            valores = X[col].astype(object).to_numpy()
+            bloques.append((valores[:, None] == np.array(categorias, dtype=object)[None, :]).astype(float))
+        num = X[self.meta["num_cols"]].to_numpy(dtype=float)
+        num = np.where(np.isnan(num), a["fill"], num)
+        bloques.append((num - a["mean"]) / a["scale"])
+        return np.hstack(bloques)
+
+    def decision_function(self, X: pd.DataFrame) -> np.ndarray:
+        # Las hojas apuntan a sí mismas, así basta con repetir el paso de bajar un nivel
+        # `depth` veces. Pocas filas: todos los árboles a la vez (matriz filas x árboles);
+        # muchas: árbol por árbol con todas las filas. Tras la imputación no hay NaN
+        a = self.arrays
+        Z = self.transform(X).astype(self.meta["dtype"])
+        n, n_features = Z.shape
+        flat, base = Z.ravel(), np.arange(n) * n_features
+        if n * len(a["roots"]) <= BLOCK:
+            nodo = np.repeat(a["roots"][None, :], n, axis=0)
+            out = self._walk(flat, base[:, None], nodo, int(a["depths"].max())).sum(axis=1)
+        else:
+            out = np.zeros(n)
+            for root, depth in zip(a["roots"], a["depths"]):
+                out += self._walk(flat, base, np.full(n, root), depth)
+        return self.meta["base"] + self.meta["shrinkage"] * out
+
+    def _walk(self, flat, base, nodo, depth):
+        a = self.arrays
+        for _ in range(depth):
+            x = flat.take(base + a["feature"].take(nodo))
+            threshold = a["threshold"].take(nodo)
+            izquierda = x < threshold if self.meta["strict"] else x <= threshold
+            nodo = np.where(izquierda, a["left"].take(nodo), a["right"].take(nodo))
+        return a["value"].take(nodo)
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        p = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        # Igual que el argmax de sklearn: en un empate exacto (0.5) gana la primera clase
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+    def save(self, path):
+        # Ruta o archivo abierto
+        if hasattr(path, "write"):
+            np.savez(path, meta=np.array(json.dumps(self.meta)), **self.arrays)
+            return
+        with open(path, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(self.meta)), **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files if k != "meta"}
+            meta = json.loads(str(data["meta"]))
+        return cls(arrays, meta)
+
+
+def _preprocessor(pre) -> tuple:
+    # ColumnTransformer de train.make_preprocessor: one-hot de categóricas + imputación
+    # constante y escalado de numéricas, en ese orden
+    meta = {"cat_cols": [], "categories": [], "num_cols": []}
+    arrays = {}
+    for name, trans, cols in pre.transformers_:
+        if name == "remainder" and trans == "drop":
+            continue
+        if name == "cat":
+            meta["cat_cols"] += list(cols)
+            meta["categories"] += [[str(v) for v in c] for c in trans.categories_]
+        elif name == "num" and not meta["num_cols"]:
+            imputer, scaler = trans.named_steps["imputer"], trans.named_steps["scaler"]
+            meta["num_cols"] = list(cols)
+            arrays["fill"] = np.asarray(imputer.statistics_, dtype=float)
+            arrays["mean"] = np.asarray(scaler.mean_, dtype=float)
+            arrays["scale"] = np.asarray(scaler.scale_, dtype=float)
+        else:
+            raise ValueError(f"Preprocesador no exportable: {name}")
+    return arrays, meta
+
+
+def _private(clf, *attrs):
+    # La exportación lee atributos privados de sklearn (scikit-learn fijado en requirements.txt);
+    # si una versión nueva los cambia, se falla aquí y no con un modelo compacto incorrecto
+    import sklearn
+    faltan = [a for a in attrs if not hasattr(clf, a)]
+    if faltan:
+        raise RuntimeError(f"{type(clf).__name__} de scikit-learn {sklearn.__version__} no tiene "
+                           f"{', '.join(faltan)}: revisar inference.export antes de cambiar la versión")
+
+
+def _sklearn_trees(clf):
+    # GradientBoostingClassifier: árboles de regresión sobre el logit, con learning_rate aparte
+    for tree in clf.estimators_[:, 0]:
+        t = tree.tree_
+        yield t.feature, t.threshold, t.children_left, t.children_right, t.value[:, 0, 0]
+
+
+def _hgb_trees(clf):
+    # HistGradientBoostingClassifier: las hojas ya incluyen el learning_rate
+    for (predictor,) in clf._predictors:
+        n = predictor.nodes
+        if n["is_categorical"].any():
+            raise ValueError("Árboles con divisiones categóricas no exportables")
+        hoja = n["is_leaf"].astype(bool)
+        left, right = n["left"].astype(np.int64), n["right"].astype(np.int64)
+        yield (np.where(hoja, -1, n["feature_idx"].astype(np.int64)), n["num_threshold"], np.where(hoja, -1, left),
+               np.where(hoja, -1, right), np.where(hoja, n["value"], 0.0))
+
+
+def _xgb_trees(booster):
+    # XGBoost (gbtree): modelo JSON; en las hojas split_conditions guarda el peso de la hoja
+    model = json.loads(booster.save_raw("json"))
+    gbm = model["learner"]["gradient_booster"]
+    if gbm["name"] != "gbtree":
+        raise ValueError(f"Booster no exportable: {gbm['name']}")
+    for tree in gbm["model"]["trees"]:
+        left = np.array(tree["left_children"])
+        hoja = left == -1
+        cond = np.array(tree["split_conditions"], dtype=np.float32).astype(float)
+        yield (np.where(hoja, -1, tree["split_indices"]), cond, left, np.array(tree["right_children"]),
+               np.where(hoja, cond, 0.0))
+
+
+def _flatten(trees) -> tuple:
+    # Concatena los árboles; en las hojas ambos hijos apuntan al mismo nodo (y feature=0,
+    # que se lee pero no cambia el resultado)
+    partes = {k: [] for k in ("feature", "threshold", "left", "right", "value")}
+    roots, depths, offset = [], [], 0
+    for feature, threshold, left, right, value in trees:
+        n = len(feature)
+        hoja = np.asarray(left) < 0
+        idx = np.arange(n)
+        partes["feature"].append(np.where(hoja, 0, feature).astype(np.int64))
+        partes["threshold"].append(np.asarray(threshold, dtype=float))
+        partes["left"].append((np.where(hoja, idx, left) + offset).astype(np.int64))
+        partes["right"].append((np.where(hoja, idx, right) + offset).astype(np.int64))
+        partes["value"].append(np.asarray(value, dtype=float))
+        roots.append(offset)
+        depths.append(_depth(np.asarray(left), np.asarray(right)))
+        offset += n
+    arrays = {k: np.concatenate(v) for k, v in partes.items()}
+    arrays["roots"] = np.array(roots, dtype=np.int64)
+    arrays["depths"] = np.array(depths, dtype=np.int64)
+    return arrays
+
+
+def _depth(left, right) -> int:
+    nivel, depth = [0], 0
+    while True:
+        nivel = [h for n in nivel for h in (left[n], right[n]) if left[n] >= 0]
+        if not nivel:
+            return depth
+        depth += 1
+
+
+def export(model, grano: str = None) -> CompactModel:
+    # Pipeline("pre", "clf") binario -> CompactModel; ValueError si no es exportable
+    pre, clf = model.named_steps["pre"], model.named_steps["clf"]
+    arrays, meta = _preprocessor(pre)
+    n_features = sum(len(c) for c in meta["categories"]) + len(meta["num_cols"])
+    tipo = type(clf).__name__
+    if tipo == "GradientBoostingClassifier":
+        _private(clf, "_raw_predict_init")
+        trees, strict, dtype = _sklearn_trees(clf), False, "float32"
+        base = float(clf._raw_predict_init(np.zeros((1, n_features)))[0, 0])
+        shrinkage = float(clf.learning_rate)
+    elif tipo == "HistGradientBoostingClassifier":
+        if getattr(clf, "_preprocessor", None) is not None:
+            raise ValueError("HistGradientBoosting con variables categóricas no exportable")
+        _private(clf, "_predictors", "_baseline_prediction")
+        trees, strict, dtype = _hgb_trees(clf), False, "float64"
+        base, shrinkage = float(np.ravel(clf._baseline_prediction)[0]), 1.0
+    elif tipo == "XGBClassifier":
+        booster = clf.get_booster()
+        config = json.loads(booster.save_config())
+        p = float(config["learner"]["learner_model_param"]["base_score"])
+        trees, strict, dtype = _xgb_trees(booster), True, "float32"
+        base, shrinkage = float(np.log(p / (1 - p))), 1.0
+    else:
+        raise ValueError(f"Estimador no exportable: {tipo}")
+    arrays.update(_flatten(trees))
+    meta.update(
+        estimator=tipo, grano=grano or getattr(model, "grano_", None), classes=[int(c) for c in clf.classes_],
+        base=base, shrinkage=shrinkage, strict=strict, dtype=dtype,
+    )
+    return CompactModel(arrays, meta)
@@ -0,0 +1,226 @@
+# app/services/llm.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from app.config import GITHUB_TOKEN, LLM_CACHE_DIR, LLM_CACHE_SIZE, LLM_CACHE_TTL, MODEL_NAME, OPENAI_EMBEDDINGS_URL
+
+# Cliente async (azure.ai.inference.aio): una sola instancia reutiliza el pool de conexiones;
+# se puede reemplazar con set_async_client (p. ej. FakeAsyncClient en pruebas)
+_async_client = None
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        from azure.ai.inference.aio import ChatCompletionsClient
+        from azure.core.credentials import AzureKeyCredential
+        _async_client = ChatCompletionsClient(
+            endpoint=OPENAI_EMBEDDINGS_URL,
+            credential=AzureKeyCredential(GITHUB_TOKEN),
+        )
+    return _async_client
+
+
+def set_async_client(client):
+    global _async_client
+    _async_client = client
+
+
+async def close():
+    # Cierra el pool del cliente async (al apagar la app)
+    global _async_client
+    if _async_client is not None and hasattr(_async_client, "close"):
+        await _async_client.close()
+    _async_client = None
+
+
+class FakeAsyncClient:
+    # Cliente local con la misma interfaz que ChatCompletionsClient.complete de
+    # azure.ai.inference.aio: responde con un eco del prompt y cuenta las llamadas (útil para
+    # probar caché y coalescencia). Con stream=True entrega la respuesta palabra por palabra
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def complete(self, messages, model=None, stream=None, **params):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        content = self._answer(messages, model)
+        if not stream:
+            return self._completion(content)
+
+        async def updates():
+            for palabra in content.split(" "):
+                await asyncio.sleep(0)
+                delta = type("Delta", (), {"content": palabra + " "})()
+                yield type("Update", (), {"choices": [type("Choice", (), {"delta": delta})()]})()
+        return updates()
+
+    def _answer(self, messages, model):
+        texto = " | ".join(str(_message(m)[1]).strip()[:80] for m in messages)
+        return f"[{model}] {texto}"
+
+    def _completion(self, content):
+        mensaje = type("Message", (), {"content": content})()
+        choice = type("Choice", (), {"message": mensaje})()
+        return type("Completion", (), {"choices": [choice]})()
+
+
+def _message(m):
+    # (rol, contenido) de un SystemMessage/UserMessage de azure.ai.inference o de un dict
+    if isinstance(m, dict):
+        return m.get("role"), m.get("content")
+    return getattr(m, "role", None), getattr(m, "content", None)
+
+
+def _normalize(text) -> str:
+    return re.sub(r"\s+", " ", str(text or "")).strip()
+
+
+def cache_key(messages, model: str, **params) -> str:
+    # Prompt normalizado (espacios colapsados) + modelo + parámetros de muestreo
+    payload = {
+        "model": model,
+        "messages": [[str(r), _normalize(c)] for r, c in map(_message, messages)],
+        "params": {k: params[k] for k in sorted(params)},
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # LRU con TTL en memoria y, opcionalmente, un archivo JSON por entrada en disco
+    def __init__(self, ttl: int = LLM_CACHE_TTL, max_size: int = LLM_CACHE_SIZE, directory=LLM_CACHE_DIR):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.directory = Path(directory) if directory else None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "disk_hits": 0}
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                if now - item[0] <= self.ttl:
+                    self._items.move_to_end(key)
+                    return item[1]
+                del self._items[key]
+        item = self._read(key)
+        if item is not None and now - item[0] <= self.ttl:
+            self.count("disk_hits")
+            self._remember(key, item[0], item[1])
+            return item[1]
+        return None
+
+    def set(self, key: str, value: str):
+        ts = time.time()
+        self._remember(key, ts, value)
+        self._write(key, ts, value)
+
+    def _remember(self, key, ts, value):
+        with self._lock:
+            self._items[key] = (ts, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def _path(self, key):
+        return self.directory / f"{key}.json"
+
+    def _read(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                data = json.load(f)
+            return data["created"], data["content"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def _write(self, key, ts, value):
+        if not self.directory:
+            return
+        tmp = self._path(key).with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"created": ts, "content": value}, f, ensure_ascii=False)
+        os.replace(tmp, self._path(key))
+
+    def count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+cache = ResponseCache()
+
+# Llamadas en curso por llave: las peticiones idénticas concurrentes esperan la misma tarea
+_ainflight = {}
+
+
+async def _fetch(key: str, messages, model: str, client, params: dict) -> str:
+    try:
+        cache.count("misses")
+        response = await (client or get_async_client()).complete(messages=messages, model=model, **params)
+        content = response.choices[0].message.content
+        cache.set(key, content)
+        return content
+    finally:
+        _ainflight.pop(key, None)
+
+
+def _retrieve(task):
+    # Marca la excepción como leída aunque todos los que esperaban se hayan cancelado
+    if not task.cancelled():
+        task.exception()
+
+
+async def acomplete(messages, model: str = MODEL_NAME, client=None, **params) -> str:
+    # Texto de la respuesta del LLM, desde la caché si existe; si la misma llamada ya está en
+    # curso se espera su resultado en lugar de repetirla. La llamada corre en su propia tarea y
+    # cada petición la espera con shield: cancelar una petición (p. ej. el cliente se
+    # desconecta) no cancela la llamada ni a las demás que la esperan
+    key = cache_key(messages, model, **params)
+    hit = cache.get(key)
+    if hit is not None:
+        cache.count("hits")
+        return hit
+    task = _ainflight.get(key)
+    if task is not None:
+        cache.count("coalesced")
+    else:
+        task = asyncio.ensure_future(_fetch(key, messages, model, client, params))
+        task.add_done_callback(_retrieve)
+        _ainflight[key] = task
+    return await asyncio.shield(task)
+
+
+async def astream(messages, model: str = MODEL_NAME, client=None, **params):
+    # Fragmentos de texto a medida que llegan; al terminar la respuesta completa queda en caché.
+    # Si ya está en caché se entrega de una sola vez
+    key = cache_key(messages, model, **params)
+    hit = cache.get(key)
+    if hit is not None:
+        cache.count("hits")
+        yield hit
+        return
+    cache.count("misses")
+    partes = []
+    updates = await (client or get_async_client()).complete(messages=messages, model=model, stream=True, **params)
+    async for update in updates:
+        if update.choices and update.choices[0].delta and update.choices[0].delta.content:
+            partes.append(update.choices[0].delta.content)
+            yield update.choices[0].delta.content
+    cache.set(key, "".join(partes))
+
@@ -0,0 +1,229 @@
+# app/services/registry.py
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from app.config import MODEL_KEEP_VERSIONS, MODELS_DIR
+
+# Registro de modelos versionados:
+#   models/versions/<versión>/{model.pkl, compact.npz, predictions.parquet, explanations.parquet,
+#                              manifest.json, validation.json}
+#   models/current.json -> {"version": "<versión>"} (puntero a la versión activa)
+# Cada versión se escribe completa en un directorio temporal y se renombra; el puntero se
+# reemplaza con os.replace, así ningún lector ve un modelo a medio escribir
+VERSIONS_DIR = MODELS_DIR / "versions"
+CURRENT = MODELS_DIR / "current.json"
+
+# Layout anterior (un solo modelo sobrescrito en sitio); se sigue leyendo si no hay registro
+LEGACY_MODEL = MODELS_DIR / "risk_model.pkl"
+LEGACY_PREDICTIONS = MODELS_DIR / "predictions.parquet"
+LEGACY_EXPLANATIONS = MODELS_DIR / "explanations.parquet"
+
+MODEL_FILE = "model.pkl"
+COMPACT_FILE = "compact.npz"
+PREDICTIONS_FILE = "predictions.parquet"
+EXPLANATIONS_FILE = "explanations.parquet"
+MANIFEST_FILE = "manifest.json"
+VALIDATION_FILE = "validation.json"
+
+
+def _write_json(path, data):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+_pointer = {"signature": None, "version": None}
+
+
+def current_version():
+    # Versión activa según current.json; se relee solo cuando cambia el archivo (un stat)
+    try:
+        st = CURRENT.stat()
+    except FileNotFoundError:
+        return None
+    signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+    if _pointer["signature"] != signature:
+        with open(CURRENT, encoding="utf-8") as f:
+            version = json.load(f)["version"]
+        _pointer.update(signature=signature, version=version)
+    return _pointer["version"]
+
+
+def version_dir(version: str):
+    return VERSIONS_DIR / version
+
+
+def model_path(version: str = None):
+    version = version or current_version()
+    return version_dir(version) / MODEL_FILE if version else LEGACY_MODEL
+
+
+def predictions_path(version: str = None):
+    version = version or current_version()
+    return version_dir(version) / PREDICTIONS_FILE if version else LEGACY_PREDICTIONS
+
+
+def explanations_path(version: str = None):
+    version = version or current_version()
+    return version_dir(version) / EXPLANATIONS_FILE if version else LEGACY_EXPLANATIONS
+
+
+def manifest(version: str = None) -> dict:
+    # Manifiesto de la versión (métricas de entrenamiento y esquema); {} para el layout anterior
+    version = version or current_version()
+    if not version:
+        return {}
+    with open(version_dir(version) / MANIFEST_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def validation(version: str = None) -> dict:
+    # Resultado de la validación guardado al entrenar (reporte, ROC/PR y curva PR); {} si no hay
+    version = version or current_version()
+    if not version:
+        return {}
+    try:
+        with open(version_dir(version) / VALIDATION_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_validation(version: str, data: dict):
+    # Reemplaza validation.json de una versión ya publicada (validate --recompute)
+    _write_json(version_dir(version) / VALIDATION_FILE, data)
+
+
+def save_explanations(version: str, explanations):
+    # Agrega o reemplaza explanations.parquet de una versión ya publicada (explain --precompute)
+    path = explanations_path(version)
+    tmp = path.with_name(path.name + ".tmp")
+    explanations.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def versions() -> list:
+    # Versiones publicadas, de la más reciente a la más antigua
+    if not VERSIONS_DIR.exists():
+        return []
+    return sorted((p.name for p in VERSIONS_DIR.iterdir() if (p / MANIFEST_FILE).exists()), reverse=True)
+
+
+def activate(version: str):
+    if not (version_dir(version) / MANIFEST_FILE).exists():
+        raise KeyError(f"Versión de modelo desconocida: {version}")
+    _write_json(CURRENT, {"version": version, "activated_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+    print(f"✅ Modelo activo: {version}")
+
+
+def publish(model, predictions, info: dict, activate_version: bool = True, compact=None, validation=None,
+            explanations=None) -> str:
+    # Escribe modelo, predicciones y manifiesto en una versión nueva y mueve el puntero.
+    # `compact` (inference.CompactModel) es la forma que carga la API; `validation`, el
+    # resultado completo de evaluation.evaluate (el manifiesto solo guarda el resumen);
+    # `explanations`, las atribuciones SHAP por municipio-mes de explain.explain_frame
+    import joblib
+    version = time.strftime("%Y%m%d-%H%M%S")
+    while version_dir(version).exists():
+        version = f"{version}-{os.getpid()}"
+    VERSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = VERSIONS_DIR / f".{version}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+    joblib.dump(model, tmp / MODEL_FILE)
+    predictions.to_parquet(tmp / PREDICTIONS_FILE, index=False)
+    files = {"model": MODEL_FILE, "predictions": PREDICTIONS_FILE}
+    if compact is not None:
+        compact.save(tmp / COMPACT_FILE)
+        files["compact"] = COMPACT_FILE
+    if validation is not None:
+        _write_json(tmp / VALIDATION_FILE, validation)
+        files["validation"] = VALIDATION_FILE
+    if explanations is not None:
+        explanations.to_parquet(tmp / EXPLANATIONS_FILE, index=False)
+        files["explanations"] = EXPLANATIONS_FILE
+    _write_json(tmp / MANIFEST_FILE, {
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": files,
+        **info,
+    })
+    tmp.rename(version_dir(version))
+    print(f"✅ Modelo {version} guardado en {version_dir(version)}")
+    if activate_version:
+        activate(version)
+        prune()
+    return version
+
+
+def prune(keep: int = MODEL_KEEP_VERSIONS):
+    # Borra las versiones más antiguas, nunca la activa
+    activa = current_version()
+    for version in versions()[keep:]:
+        if version != activa:
+            shutil.rmtree(version_dir(version), ignore_errors=True)
+
+
+class Loaded:
+    # Modelo cargado junto con su versión y manifiesto (se reemplaza entero al recargar)
+    def __init__(self, version: str, model, info: dict):
+        self.version = version
+        self.model = model
+        self.manifest = info
+
+
+_loaded = None
+_lock = threading.Lock()
+
+
+def _load(version):
+    # La API usa la forma compacta si existe (sin sklearn ni unpickle); si no, el pipeline
+    if version:
+        info = manifest(version)
+        if "compact" in info.get("files", {}):
+            from app.services.inference import CompactModel
+            return Loaded(version, CompactModel.load(version_dir(version) / info["files"]["compact"]), info)
+        return Loaded(version, load_model(version), info)
+    st = LEGACY_MODEL.stat()
+    return Loaded(f"legacy-{st.st_mtime_ns:x}-{st.st_size:x}", load_model(), {})
+
+
+def active(force: bool = False) -> Loaded:
+    # Modelo de la versión activa. Si current.json cambió (reentrenamiento o /admin/reload)
+    # se carga el nuevo y se reemplaza la referencia: los requests en curso siguen con el anterior
+    global _loaded
+    version = current_version()
+    if not force and _loaded is not None and (version is None or _loaded.version == version):
+        return _loaded
+    with _lock:
+        version = current_version()
+        if force or _loaded is None or (version is not None and _loaded.version != version):
+            t0 = time.perf_counter()
+            _loaded = _load(version)
+            print(f"✅ Modelo {_loaded.version} cargado en {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return _loaded
+
+
+def load_model(version: str = None):
+    # Pipeline completo de sklearn (validación, SHAP); la API usa active()
+    import joblib
+    return joblib.load(model_path(version))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--list", action="store_true")
+    parser.add_argument("--activate", default=None, help="Versión a activar (rollback)")
+    args = parser.parse_args()
+    if args.activate:
+        activate(args.activate)
+    if args.list:
+        activa = current_version()
+        for version in versions():
+            metricas = manifest(version).get("metrics", {})
+            print(f"{'➡️' if version == activa else '  '} {version}  "
+                  f"ROC-AUC {metricas.get('roc_auc', float('nan')):.4f}  PR-AUC {metricas.get('pr_auc', float('nan')):.4f}")
@@ -0,0 +1,21 @@
+# app/services/serialize.py
+import numpy as np
+import pandas as pd
+from fastapi.responses import ORJSONResponse
+
+
+def severidad(cantidad: pd.Series) -> np.ndarray:
+    # crítica (>= 3), alta (== 2), media (resto, incluidos nulos)
+    c = pd.to_numeric(cantidad, errors="coerce").fillna(0).to_numpy()
+    return np.select([c >= 3, c == 2], ["crítica", "alta"], default="media")
+
+
+def texto(serie: pd.Series) -> pd.Series:
+    # Igual que str(valor) fila a fila: los nulos quedan como "None"
+    return serie.astype(object).where(serie.notna(), None).astype(str)
+
+
+def records(columnas: dict) -> ORJSONResponse:
+    # Arma la lista de registros desde columnas ya calculadas y la codifica con orjson,
+    # sin pasar por un modelo Pydantic por fila
+    return ORJSONResponse(pd.DataFrame(columnas).to_dict(orient="records"))
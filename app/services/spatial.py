@@ -0,0 +1,120 @@
+# app/services/spatial.py
+import time
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from app.services import index, store
+
+# Tamaño de celda de la grilla en grados (~5.5 km); Santander ocupa unas 60x60 celdas
+CELL_DEG = 0.05
+
+# Tamaño de un marcador en pantalla (px) para no enviar puntos que se solapan
+MARKER_PX = 40
+
+# Lado de una celda del heatmap en pantalla (px): ~16 celdas por tile de 256 px
+HEATMAP_PX = 64
+
+
+class GridIndex:
+    # Grilla lat/lon sobre el orden del índice de master (fecha desc): cada celda guarda
+    # sus rangos ordenados, así el resultado de un bbox ya sale del más reciente al más viejo
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, fechas: np.ndarray,
+                 cantidad: np.ndarray = None, cell: float = CELL_DEG):
+        self.cell = cell
+        self.lat = lat
+        self.lon = lon
+        self.fechas = fechas
+        self.cantidad = np.ones(len(lat)) if cantidad is None else cantidad
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        rangos = np.flatnonzero(valid)
+        self.rangos = rangos
+        fila = np.floor(lat[valid] / cell).astype(np.int64)
+        col = np.floor(lon[valid] / cell).astype(np.int64)
+        self.cells = pd.Series(rangos).groupby([fila, col], sort=False).indices
+        self.cells = {k: rangos[v] for k, v in self.cells.items()}
+
+    def window(self, desde=None, hasta=None):
+        # Rango [inicio, fin) de rangos con desde <= fecha <= hasta (las fechas van en desc)
+        asc = self.fechas[::-1]
+        n = len(asc)
+        fin = n - int(np.searchsorted(asc, desde, side="left")) if desde is not None else n
+        inicio = n - int(np.searchsorted(asc, hasta, side="right")) if hasta is not None else 0
+        return inicio, fin
+
+    def query(self, bbox=None, desde=None, hasta=None, limit=None) -> np.ndarray:
+        # Rangos dentro del bbox (min_lat, min_lon, max_lat, max_lon) y la ventana de tiempo
+        inicio, fin = self.window(desde, hasta)
+        if bbox is None:
+            rangos = self.rangos
+        else:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            f0, f1 = int(np.floor(min_lat / self.cell)), int(np.floor(max_lat / self.cell))
+            c0, c1 = int(np.floor(min_lon / self.cell)), int(np.floor(max_lon / self.cell))
+            listas = [r for (f, c), r in self.cells.items() if f0 <= f <= f1 and c0 <= c <= c1]
+            rangos = np.sort(np.concatenate(listas)) if listas else self.rangos[:0]
+        rangos = rangos[(rangos >= inicio) & (rangos < fin)]
+        if bbox is not None:
+            lat, lon = self.lat[rangos], self.lon[rangos]
+            rangos = rangos[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+        return rangos[:limit]
+
+    def bins(self, rangos: np.ndarray, zoom: int) -> pd.DataFrame:
+        # Agregado por celda de HEATMAP_PX al zoom dado (eventos, suma de cantidad y
+        # centroide de los eventos) con np.unique + bincount, sin groupby
+        grados = HEATMAP_PX * 360.0 / (256 * 2 ** zoom)
+        lat, lon = self.lat[rangos], self.lon[rangos]
+        llave = (np.floor(lat / grados).astype(np.int64) << 32) + np.floor(lon / grados).astype(np.int64)
+        _, inversa = np.unique(llave, return_inverse=True)
+        eventos = np.bincount(inversa)
+        celdas = pd.DataFrame({
+            "lat": np.bincount(inversa, weights=lat) / eventos,
+            "lon": np.bincount(inversa, weights=lon) / eventos,
+            "incidentes": np.bincount(inversa, weights=self.cantidad[rangos]).astype(np.int64),
+            "eventos": eventos,
+        })
+        return celdas.sort_values("incidentes", ascending=False, kind="stable").reset_index(drop=True)
+
+    def declutter(self, rangos: np.ndarray, zoom: int) -> np.ndarray:
+        # Deja un solo marcador por cuadro de MARKER_PX en pantalla al zoom dado (el más reciente)
+        grados = MARKER_PX * 360.0 / (256 * 2 ** zoom)
+        fila = np.floor(self.lat[rangos] / grados).astype(np.int64)
+        col = np.floor(self.lon[rangos] / grados).astype(np.int64)
+        _, primeros = np.unique((fila << 32) + col, return_index=True)
+        return rangos[np.sort(primeros)]
+
+
+def coords(df: pd.DataFrame):
+    # lat/lon materializadas por el ETL; un master anterior se une con municipios.csv aquí
+    if "lat" in df.columns and "lon" in df.columns:
+        return df["lat"].to_numpy(dtype=float), df["lon"].to_numpy(dtype=float)
+    from app.services.etl import add_coords
+    joined = add_coords(df[["codigo_dane"]].copy())
+    return joined["lat"].to_numpy(dtype=float), joined["lon"].to_numpy(dtype=float)
+
+
+@lru_cache(maxsize=2)
+def _build(name: str, version: str) -> GridIndex:
+    t0 = time.perf_counter()
+    idx = index.get(name)
+    df = store.get(name)
+    lat, lon = coords(df)
+    cantidad = pd.to_numeric(df["cantidad"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    grid = GridIndex(lat[idx.order], lon[idx.order], idx.fechas, cantidad[idx.order])
+    print(f"✅ Grilla espacial de {name} construida en {(time.perf_counter() - t0) * 1000:.0f} ms ({len(grid.cells)} celdas)")
+    return grid
+
+
+def get(name: str = "master") -> GridIndex:
+    # Se reconstruye solo cuando cambia la versión del dataset en el store
+    return _build(name, store.version(name))
+
+
+@lru_cache(maxsize=32)
+def _heatmap(name: str, version: str, zoom: int) -> pd.DataFrame:
+    grid = get(name)
+    return grid.bins(grid.rangos, zoom)
+
+
+def heatmap(zoom: int, name: str = "master") -> pd.DataFrame:
+    # Celdas agregadas de todo el histórico, cacheadas por zoom y versión del dataset
+    return _heatmap(name, store.version(name), zoom)
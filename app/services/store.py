@@ -0,0 +1,132 @@
+# app/services/store.py
+import json
+import os
+import threading
+import time
+import pandas as pd
+from app.config import PROC_DIR
+from app.services import dataset, registry
+
+# Artefactos compartidos por los routers (nombre lógico -> archivo, o función que lo
+# resuelve en cada acceso, p. ej. las predicciones de la versión activa del modelo)
+ARTIFACTS = {
+    "master": PROC_DIR / "master.parquet",
+    "features": PROC_DIR / "features.parquet",
+    "kpis": PROC_DIR / "kpis.json",
+    "cube": PROC_DIR / "cube.parquet",
+    "predictions": registry.predictions_path,
+    "explanations": registry.explanations_path,
+}
+
+# Proyección de columnas: solo se cargan las que usan los routers (None = todas)
+COLUMNS = {
+    "master": [
+        "departamento", "municipio", "codigo_dane", "fecha_hecho", "tipo_delito",
+        "delito", "cantidad", "anio", "mes", "lat", "lon",
+    ],
+    "features": [
+        "departamento", "municipio", "fecha_hecho", "anio", "mes", "tipo_delito", "cantidad",
+        "genero", "grupo_etario", "franja_hora", "dia_semana", "riesgo_alto",
+        "tasa_delitos_muni_mes_lag", "tasa_delitos_dep_mes_lag", "acumulado_90d",
+    ],
+}
+
+# nombre -> {"df", "signature", "version", "load_ms", "frame_mb", "rss_mb", "rows", "loaded_at"}
+_cache = {}
+# Un lock por artefacto: datasets distintos se pueden cargar en paralelo (precalentamiento)
+_locks = {name: threading.Lock() for name in ARTIFACTS}
+
+
+def _signature(path):
+    # Los datasets particionados son directorios: se reemplazan completos, así que
+    # cambia el inodo además del mtime
+    st = path.stat()
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _read(name: str, path):
+    if path.suffix == ".json":
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    # Filtro por Santander empujado a pyarrow, una sola vez para todos los consumidores
+    df = dataset.read(path, columns=COLUMNS.get(name), filters=[("departamento", "=", "SANTANDER")])
+    if "fecha_hecho" in df.columns:
+        df["fecha_hecho"] = pd.to_datetime(df["fecha_hecho"], errors="coerce")
+    return df
+
+
+def resolve(name: str):
+    p = ARTIFACTS[name]
+    return p() if callable(p) else p
+
+
+def rss_mb():
+    # Memoria residente del proceso (Linux: /proc/self/statm; si no, el pico de getrusage)
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2, 1)
+    except (OSError, ValueError, IndexError):
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _load(name: str, path, signature):
+    t0 = time.perf_counter()
+    df = _read(name, path)
+    load_ms = (time.perf_counter() - t0) * 1000
+    is_frame = isinstance(df, pd.DataFrame)
+    entry = {
+        "df": df,
+        "signature": signature,
+        "version": "-".join(f"{v:x}" for v in signature),
+        "load_ms": round(load_ms, 1),
+        # Tamaño del DataFrame en memoria (None para los JSON) y RSS del proceso tras cargarlo
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 1024 ** 2, 1) if is_frame else None,
+        "rss_mb": rss_mb(),
+        "rows": len(df) if is_frame else None,
+        "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    frame = f"{entry['frame_mb']} MB, " if is_frame else ""
+    print(f"✅ Dataset {name} cargado en {entry['load_ms']} ms ({frame}RSS del proceso {entry['rss_mb']} MB)")
+    return entry
+
+
+def _entry(name: str):
+    if name not in ARTIFACTS:
+        raise KeyError(f"Dataset desconocido: {name}")
+    path = resolve(name)
+    signature = _signature(path)
+    entry = _cache.get(name)
+    if entry is not None and entry["signature"] == signature:
+        return entry
+    with _locks[name]:
+        # Otro hilo pudo recargarlo mientras esperábamos el lock
+        entry = _cache.get(name)
+        if entry is None or entry["signature"] != signature:
+            entry = _load(name, path, signature)
+            _cache[name] = entry
+    return entry
+
+
+def get(name: str):
+    # Objeto compartido de solo lectura: los consumidores deben copiar antes de mutar
+    return _entry(name)["df"]
+
+
+def exists(name: str) -> bool:
+    return resolve(name).exists()
+
+
+def version(name: str) -> str:
+    return _entry(name)["version"]
+
+
+def stats() -> dict:
+    # RSS actual del proceso y, por dataset, su tamaño en memoria y el RSS tras cargarlo
+    return {
+        "rss_mb": rss_mb(),
+        "datasets": {
+            name: {k: v for k, v in entry.items() if k not in ("df", "signature")}
+            for name, entry in _cache.items()
+        },
+    }
@@ -1,97 +1,225 @@
 # app/services/train.py
 import argparse
-import joblib
+import time
 import pandas as pd
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.impute import SimpleImputer
-from sklearn.ensemble import GradientBoostingClassifier
-from sklearn.metrics import classification_report, roc_auc_score, precision_recall_curve, auc
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
 
-from app.config import MODELS_DIR, PROC_DIR
+from app.config import PROC_DIR, TRAIN_ESTIMATOR, TRAIN_GRAIN, TRAIN_THREADS
+from app.services import dataset, evaluation, explain, inference, registry
+from app.services.features import MONTH_KEYS, aggregate_monthly
 
-def train_model():
-    # Cargar features y filtrar solo Santander
-    df = pd.read_parquet(PROC_DIR / "features.parquet")
-    df = df[df["departamento"] == "SANTANDER"].copy()
+# Variables del modelo (sin municipio)
+FEATURES = [
+    "departamento", "anio", "mes",
+    "tasa_delitos_muni_mes_lag", "tasa_delitos_dep_mes_lag", "acumulado_90d"
+]
+KEYS = MONTH_KEYS
+TARGET = "riesgo_alto"
 
-    # Definir variables y target (sin municipio)
-    features = [
-        "departamento", "anio", "mes",
-        "tasa_delitos_muni_mes_lag", "tasa_delitos_dep_mes_lag", "acumulado_90d"
-    ]
-    target = "riesgo_alto"
+# Columnas del preprocesador
+CAT_COLS = ["departamento"]
+NUM_COLS = ["anio", "mes", "tasa_delitos_muni_mes_lag", "tasa_delitos_dep_mes_lag", "acumulado_90d"]
+
+# Estimadores disponibles para --estimator / TRAIN_ESTIMATOR
+ESTIMATORS = ["gb", "hgb", "xgb"]
+
+def make_estimator(name: str = None, threads: int = None, **params):
+    # gb: GradientBoosting exacto de sklearn (un hilo); hgb: HistGradientBoosting (histogramas,
+    # OpenMP, sus hilos se limitan con thread_limit); xgb: XGBoost hist multihilo.
+    # threads=0 usa todos los núcleos
+    name = name or TRAIN_ESTIMATOR
+    threads = TRAIN_THREADS if threads is None else threads
+    if name == "gb":
+        return GradientBoostingClassifier(random_state=42, **params)
+    if name == "hgb":
+        # Sin early stopping: los resultados no dependen de un split interno aleatorio
+        return HistGradientBoostingClassifier(random_state=42, early_stopping=False, **params)
+    if name == "xgb":
+        try:
+            from xgboost import XGBClassifier
+        except ImportError:
+            raise RuntimeError("El estimador xgb requiere el paquete xgboost (ver requirements.txt)")
+        params = {"n_estimators": 200, "max_depth": 4, "learning_rate": 0.1, **params}
+        return XGBClassifier(tree_method="hist", n_jobs=threads or -1, random_state=42,
+                             eval_metric="logloss", **params)
+    raise ValueError(f"Estimador no soportado: {name} (opciones: {', '.join(ESTIMATORS)})")
+
+def thread_limit(threads: int = None):
+    # hgb no recibe n_jobs: sus hilos de OpenMP se limitan alrededor de fit/predict
+    from threadpoolctl import threadpool_limits
+    threads = TRAIN_THREADS if threads is None else threads
+    return threadpool_limits(threads or None)
+
+def make_preprocessor() -> ColumnTransformer:
+    # Salida densa siempre (hgb no acepta matrices dispersas)
+    return ColumnTransformer(
+        transformers=[
+            ("cat", OneHotEncoder(handle_unknown="ignore"), CAT_COLS),
+            ("num", Pipeline([
+                ("imputer", SimpleImputer(strategy="constant", fill_value=0)),
+                ("scaler", StandardScaler())
+            ]), NUM_COLS),
+        ],
+        sparse_threshold=0,
+    )
+
+def make_pipeline(estimator: str = None, threads: int = None, **params) -> Pipeline:
+    return Pipeline(steps=[
+        ("pre", make_preprocessor()),
+        ("clf", make_estimator(estimator, threads, **params))
+    ])
 
-    # Split temporal: entrenar con todos los años menos el último y validar en el último
+def temporal_split(df: pd.DataFrame):
+    # Entrenar con todos los años menos el último y validar en el último; si en train queda
+    # una sola clase se valida solo con el último mes
     ultimo_anio = int(df["anio"].max())
     train_df = df[df["anio"] < ultimo_anio]
-    test_df  = df[df["anio"] == ultimo_anio]
+    test_df = df[df["anio"] == ultimo_anio]
+    if train_df[TARGET].nunique() < 2:
+        print("⚠️ Solo una clase en train, ajustando split...")
+        ultimo_mes = int(df["mes"].max())
+        train_df = df[(df["anio"] < ultimo_anio) | ((df["anio"] == ultimo_anio) & (df["mes"] < ultimo_mes))]
+        test_df = df[(df["anio"] == ultimo_anio) & (df["mes"] == ultimo_mes)]
+    return train_df, test_df
+
+def load_frame(grain: str = None) -> pd.DataFrame:
+    # Features de Santander al grano pedido (por evento o agregadas por municipio-mes)
+    grain = grain or TRAIN_GRAIN
+    columns = FEATURES + ["municipio", "cantidad", "riesgo_alto"]
+    santander = [("departamento", "=", "SANTANDER")]
+    if grain == "municipio_mes":
+        path = PROC_DIR / "features_mes.parquet"
+        if path.exists():
+            df = pd.read_parquet(path)
+        else:
+            df = aggregate_monthly(dataset.read(PROC_DIR / "features.parquet", columns, santander, categorical=False))
+    elif grain == "evento":
+        df = dataset.read(PROC_DIR / "features.parquet", columns, santander, categorical=False)
+    else:
+        raise ValueError(f"Grano de entrenamiento no soportado: {grain}")
+    return df[df["departamento"] == "SANTANDER"].copy()
+
+def sample_weight(df: pd.DataFrame):
+    # En el grano agregado cada fila pesa lo que el número de eventos que resume
+    return df["eventos"].to_numpy() if "eventos" in df.columns else None
+
+def batch_predictions(model, df: pd.DataFrame) -> pd.DataFrame:
+    # Puntaje en una sola pasada (eventos o municipio-mes), reducido a municipio-mes
+    df = df.dropna(subset=["anio", "mes"])
+    if hasattr(model, "predict_proba"):
+        proba = model.predict_proba(df[FEATURES])[:, 1]
+    else:
+        proba = model.predict(df[FEATURES]).astype(float)
+    scored = df[KEYS + ["cantidad", "riesgo_alto"]].assign(
+        probabilidad=proba,
+        esperados=proba * df["cantidad"].to_numpy(),
+        eventos=df["eventos"] if "eventos" in df.columns else 1,
+    )
+    preds = scored.groupby(KEYS, as_index=False, dropna=False, observed=True).agg(
+        probabilidad=("probabilidad", "mean"),
+        esperados=("esperados", "sum"),
+        cantidad=("cantidad", "sum"),
+        eventos=("eventos", "sum"),
+        riesgo_alto=("riesgo_alto", "max"),
+    )
+    preds["anio"] = preds["anio"].astype(int)
+    preds["mes"] = preds["mes"].astype(int)
+    preds["prediccion"] = (preds["probabilidad"] >= 0.5).astype(int)
+    return preds.sort_values(["anio", "mes", "municipio"]).reset_index(drop=True)
 
+def train_model(grain: str = None, estimator: str = None, threads: int = None, params: dict = None):
+    # Cargar features (solo Santander) al grano de entrenamiento
+    grain = grain or TRAIN_GRAIN
+    estimator = estimator or TRAIN_ESTIMATOR
+    df = load_frame(grain)
+    print(f"➡️ Entrenando {estimator} con grano {grain}: {len(df)} filas")
+
+    # Definir variables y target (sin municipio)
+    features = FEATURES
+    target = TARGET
+
+    # Split temporal
+    train_df, test_df = temporal_split(df)
     X_train = train_df[features]
     y_train = train_df[target]
     X_test  = test_df[features]
     y_test  = test_df[target]
 
-    # Ajuste automático si solo hay una clase en train
-    if y_train.nunique() < 2:
-        print("⚠️ Solo una clase en train, ajustando split...")
-        ultimo_mes = int(df["mes"].max())
-        train_df = df[(df["anio"] < ultimo_anio) | ((df["anio"] == ultimo_anio) & (df["mes"] < ultimo_mes))]
-        test_df  = df[(df["anio"] == ultimo_anio) & (df["mes"] == ultimo_mes)]
-        X_train = train_df[features]
-        y_train = train_df[target]
-        X_test  = test_df[features]
-        y_test  = test_df[target]
+    # Pipeline completo: preprocesamiento de columnas + clasificador (params: p. ej. los mejores
+    # de tuning.tune)
+    model = make_pipeline(estimator, threads, **(params or {}))
+    clf = model.named_steps["clf"]
 
-    # Preprocesamiento de columnas
-    cat_cols = ["departamento"]
-    num_cols = ["anio", "mes", "tasa_delitos_muni_mes_lag", "tasa_delitos_dep_mes_lag", "acumulado_90d"]
+    # Entrenar (ponderado por eventos en el grano agregado)
+    w_train, w_test = sample_weight(train_df), sample_weight(test_df)
+    with thread_limit(threads):
+        t0 = time.perf_counter()
+        model.fit(X_train, y_train, clf__sample_weight=w_train)
+        print(f"⏱️ Entrenamiento en {time.perf_counter() - t0:.1f} s")
+        model.grano_ = grain
 
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
-            ("num", Pipeline([
-                ("imputer", SimpleImputer(strategy="constant", fill_value=0)),
-                ("scaler", StandardScaler())
-            ]), num_cols),
-        ]
-    )
+        # Evaluación (validación temporal): una sola pasada sobre test; el resultado completo
+        # (con la curva PR) se guarda con la versión y lo reutilizan validate y /analytics/metrics
+        validation = evaluation.evaluate(model, X_test, y_test, w_test)
 
-    # Clasificador
-    clf = GradientBoostingClassifier(random_state=42)
+        # Scoring batch: predicciones por municipio-mes para servir desde la API
+        preds = batch_predictions(model, df)
+    validation["split"] = {"desde": _periodo(test_df, "min"), "hasta": _periodo(test_df)}
+    print("📊 Reporte de clasificación (validación temporal):")
+    evaluation.show(validation)
+    metrics = {k: validation[k] for k in ("report", "roc_auc", "pr_auc") if k in validation}
 
-    # Pipeline completo
-    model = Pipeline(steps=[
-        ("pre", preprocessor),
-        ("clf", clf)
-    ])
+    # Forma compacta para inferencia (arreglos numpy, sin el pipeline de sklearn)
+    try:
+        compact = inference.export(model, grain)
+    except ValueError as e:
+        print(f"⚠️ Sin exportación compacta: {e}")
+        compact = None
 
-    # Entrenar
-    model.fit(X_train, y_train)
+    # Explicaciones SHAP por municipio-mes (shap es opcional para gb/hgb: sin él no se guardan)
+    try:
+        mensual = df if grain == "municipio_mes" else load_frame("municipio_mes")
+        explanations = explain.explain_frame(model, mensual.dropna(subset=["anio", "mes"]))
+    except ImportError as e:
+        print(f"⚠️ Sin explicaciones SHAP: {e}")
+        explanations = None
 
-    # Evaluación (validación temporal)
-    y_pred = model.predict(X_test)
-    print("📊 Reporte de clasificación (validación temporal):")
-    print(classification_report(y_test, y_pred))
+    # Guardar modelo, predicciones y manifiesto como una versión nueva del registro
+    version = registry.publish(model, preds, {
+        "grano": grain,
+        "estimator": type(clf).__name__,
+        "backend": estimator,
+        "params": {k: v for k, v in clf.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+        "features": features,
+        "dtypes": {c: str(X_train[c].dtype) for c in features},
+        "target": target,
+        "split": {
+            "train": {"filas": len(train_df), "hasta": _periodo(train_df)},
+            "test": {"filas": len(test_df), "desde": _periodo(test_df, "min"), "hasta": _periodo(test_df)},
+        },
+        "metrics": metrics,
+    }, compact=compact, validation=validation, explanations=explanations)
+    print(f"✅ Predicciones ({len(preds)} municipio-mes) guardadas con la versión {version}")
+    return version
 
-    # Métricas adicionales
-    if hasattr(model, "predict_proba"):
-        y_proba = model.predict_proba(X_test)[:, 1]
-        roc = roc_auc_score(y_test, y_proba)
-        precision, recall, _ = precision_recall_curve(y_test, y_proba)
-        pr = auc(recall, precision)
-        print(f"ROC-AUC: {roc:.3f}")
-        print(f"PR-AUC: {pr:.3f}")
-
-    # Guardar modelo
-    MODELS_DIR.mkdir(parents=True, exist_ok=True)
-    joblib.dump(model, MODELS_DIR / "risk_model.pkl")
-    print(f"✅ Modelo guardado en {MODELS_DIR / 'risk_model.pkl'}")
+def _periodo(df: pd.DataFrame, how: str = "max"):
+    # "anio-mes" extremo de un split (para el manifiesto)
+    if df.empty:
+        return None
+    anio = int(getattr(df["anio"], how)())
+    mes = int(getattr(df.loc[df["anio"] == anio, "mes"], how)())
+    return f"{anio}-{mes:02d}"
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--train", action="store_true")
+    parser.add_argument("--grano", choices=["municipio_mes", "evento"], default=None)
+    parser.add_argument("--estimator", choices=ESTIMATORS, default=None)
+    parser.add_argument("--threads", type=int, default=None, help="Hilos de hgb/xgb (0 = todos los núcleos)")
     args = parser.parse_args()
     if args.train:
-        train_model()
+        train_model(args.grano, args.estimator, args.threads)
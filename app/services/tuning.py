@@ -0,0 +1,166 @@
+# app/services/tuning.py
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import auc, precision_recall_curve, roc_auc_score
+from sklearn.model_selection import ParameterGrid
+from app.config import TRAIN_ESTIMATOR, TRAIN_GRAIN, TUNE_FOLDS, TUNE_HORIZON, TUNE_WORKERS, TUNING_DIR
+from app.services import train
+
+# Grillas por estimador (los valores por defecto de train.make_estimator están incluidos)
+GRIDS = {
+    "gb": {
+        "n_estimators": [100, 200],
+        "learning_rate": [0.05, 0.1],
+        "max_depth": [2, 3, 4],
+        "subsample": [1.0, 0.8],
+    },
+    "hgb": {
+        "max_iter": [100, 200],
+        "learning_rate": [0.05, 0.1],
+        "max_leaf_nodes": [15, 31],
+        "min_samples_leaf": [20, 50],
+    },
+    "xgb": {
+        "n_estimators": [100, 200],
+        "learning_rate": [0.05, 0.1],
+        "max_depth": [3, 4, 6],
+        "subsample": [1.0, 0.8],
+    },
+}
+
+# Métrica para elegir (el target es desbalanceado: PR-AUC antes que ROC-AUC)
+METRIC = "pr_auc"
+
+
+def folds(df: pd.DataFrame, n_folds: int = TUNE_FOLDS, horizon: int = TUNE_HORIZON) -> list:
+    # Origen móvil sobre (anio, mes): el pliegue k entrena con todos los meses anteriores a su
+    # corte y valida en los `horizon` meses siguientes; los cortes cubren los últimos
+    # n_folds * horizon meses. Se descartan pliegues sin las dos clases
+    periodo = (df["anio"].astype(int) * 12 + df["mes"].astype(int) - 1).to_numpy()
+    periodos = np.unique(periodo)
+    out = []
+    for k in range(n_folds, 0, -1):
+        if k * horizon >= len(periodos):
+            continue
+        corte = periodos[-k * horizon]
+        test = (periodo >= corte) & (periodo < corte + horizon)
+        train_idx, test_idx = np.flatnonzero(periodo < corte), np.flatnonzero(test)
+        y = df[train.TARGET].to_numpy()
+        if len(np.unique(y[train_idx])) < 2 or len(np.unique(y[test_idx])) < 2:
+            print(f"⚠️ Pliegue {corte // 12}-{corte % 12 + 1:02d} descartado (una sola clase)")
+            continue
+        out.append({"desde": f"{corte // 12}-{corte % 12 + 1:02d}", "train": train_idx, "test": test_idx})
+    return out
+
+
+def fold_matrices(df: pd.DataFrame, pliegues: list) -> list:
+    # El ColumnTransformer se ajusta una vez por pliegue (solo con su train) y las matrices se
+    # reutilizan en todos los candidatos; joblib las pasa a los workers como memmap
+    X, y, w = df[train.FEATURES], df[train.TARGET].to_numpy(), train.sample_weight(df)
+    matrices = []
+    for pliegue in pliegues:
+        tr, te = pliegue["train"], pliegue["test"]
+        pre = train.make_preprocessor().fit(X.iloc[tr])
+        matrices.append({
+            "desde": pliegue["desde"],
+            "X_train": pre.transform(X.iloc[tr]), "y_train": y[tr], "w_train": None if w is None else w[tr],
+            "X_test": pre.transform(X.iloc[te]), "y_test": y[te], "w_test": None if w is None else w[te],
+        })
+    return matrices
+
+
+def _evaluate(estimator: str, params: dict, m: dict) -> dict:
+    # Un candidato en un pliegue. Cada worker usa un solo hilo (el paralelismo es entre
+    # candidatos): sin sobre-suscripción de OpenMP/BLAS
+    from threadpoolctl import threadpool_limits
+    with threadpool_limits(1):
+        clf = train.make_estimator(estimator, threads=1, **params)
+        t0 = time.perf_counter()
+        clf.fit(m["X_train"], m["y_train"], sample_weight=m["w_train"])
+        fit_s = time.perf_counter() - t0
+        proba = clf.predict_proba(m["X_test"])[:, 1]
+    precision, recall, _ = precision_recall_curve(m["y_test"], proba, sample_weight=m["w_test"])
+    return {
+        "roc_auc": float(roc_auc_score(m["y_test"], proba, sample_weight=m["w_test"])),
+        "pr_auc": float(auc(recall, precision)),
+        "fit_s": fit_s,
+    }
+
+
+def tune(estimator: str = None, grain: str = None, n_folds: int = TUNE_FOLDS, horizon: int = TUNE_HORIZON,
+         workers: int = TUNE_WORKERS, grid: dict = None) -> pd.DataFrame:
+    # Todos los (candidato, pliegue) en paralelo; devuelve una fila por candidato ordenada por
+    # METRIC promedio y la guarda en TUNING_DIR/<fecha>_<estimador>.csv
+    estimator = estimator or TRAIN_ESTIMATOR
+    grain = grain or TRAIN_GRAIN
+    df = train.load_frame(grain).dropna(subset=["anio", "mes"]).reset_index(drop=True)
+    pliegues = folds(df, n_folds, horizon)
+    if not pliegues:
+        raise SystemExit("❌ No hay pliegues temporales con las dos clases")
+    t0 = time.perf_counter()
+    matrices = fold_matrices(df, pliegues)
+    print(f"✅ {len(matrices)} pliegues preprocesados en {(time.perf_counter() - t0) * 1000:.0f} ms "
+          f"(desde {', '.join(m['desde'] for m in matrices)})")
+
+    candidatos = list(ParameterGrid(grid or GRIDS[estimator]))
+    workers = workers or os.cpu_count() or 1
+    print(f"➡️ {len(candidatos)} candidatos x {len(matrices)} pliegues de {estimator} ({grain}) "
+          f"en {workers} proceso(s)")
+    t0 = time.perf_counter()
+    scores = Parallel(n_jobs=workers)(
+        delayed(_evaluate)(estimator, params, m) for params in candidatos for m in matrices
+    )
+    elapsed = time.perf_counter() - t0
+
+    filas = []
+    for i, params in enumerate(candidatos):
+        por_pliegue = pd.DataFrame(scores[i * len(matrices):(i + 1) * len(matrices)])
+        filas.append({
+            "estimator": estimator,
+            "params": json.dumps(params, sort_keys=True),
+            **params,
+            "roc_auc": por_pliegue["roc_auc"].mean(),
+            "roc_auc_std": por_pliegue["roc_auc"].std(ddof=0),
+            "pr_auc": por_pliegue["pr_auc"].mean(),
+            "pr_auc_std": por_pliegue["pr_auc"].std(ddof=0),
+            "fit_s": por_pliegue["fit_s"].sum(),
+            **{f"pr_auc_{m['desde']}": v for m, v in zip(matrices, por_pliegue["pr_auc"])},
+        })
+    results = pd.DataFrame(filas).sort_values([METRIC, "fit_s"], ascending=[False, True], kind="stable")
+    results = results.reset_index(drop=True)
+
+    TUNING_DIR.mkdir(parents=True, exist_ok=True)
+    path = TUNING_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}_{estimator}.csv"
+    results.to_csv(path, index=False)
+    ajustes = results["fit_s"].sum()
+    print(f"⏱️ {len(scores)} ajustes en {elapsed:.1f} s ({ajustes:.1f} s de cómputo, "
+          f"x{ajustes / elapsed:.1f} por el paralelismo)")
+    cols = ["roc_auc", "pr_auc", "pr_auc_std", "fit_s", "params"]
+    print(results[cols].head(5).to_string(formatters={"params": lambda p: p}))
+    print(f"✅ Resultados en {path}")
+    return results
+
+
+def best_params(results: pd.DataFrame) -> dict:
+    return json.loads(results.iloc[0]["params"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--estimator", choices=train.ESTIMATORS, default=None)
+    parser.add_argument("--grano", choices=["municipio_mes", "evento"], default=None)
+    parser.add_argument("--folds", type=int, default=TUNE_FOLDS)
+    parser.add_argument("--horizon", type=int, default=TUNE_HORIZON, help="Meses de validación por pliegue")
+    parser.add_argument("--workers", type=int, default=TUNE_WORKERS, help="Procesos (0 = todos los núcleos)")
+    parser.add_argument("--grid", default=None, help='Grilla JSON, p. ej. {"max_depth": [2, 3]}')
+    parser.add_argument("--apply", action="store_true", help="Entrenar y publicar con los mejores parámetros")
+    args = parser.parse_args()
+    results = tune(args.estimator, args.grano, args.folds, args.horizon, args.workers,
+                   json.loads(args.grid) if args.grid else None)
+    if args.apply:
+        train.train_model(args.grano, args.estimator, params=best_params(results))
@@ -1,42 +1,45 @@
 # app/services/validate.py
-import joblib
-import pandas as pd
-from sklearn.metrics import classification_report, roc_auc_score, precision_recall_curve, auc
-from app.config import MODELS_DIR, PROC_DIR
-
-def validate():
-    # Cargar modelo entrenado
-    model = joblib.load(MODELS_DIR / "risk_model.pkl")
-
-    # Cargar features y filtrar solo Santander
-    df = pd.read_parquet(PROC_DIR / "features.parquet")
-    df = df[df["departamento"] == "SANTANDER"].copy()
+import argparse
+from app.services import evaluation, registry
+from app.services.train import FEATURES, load_frame, sample_weight
+
+def validate(grain: str = None, recompute: bool = False):
+    # La validación de la versión activa se calcula al entrenar y se guarda en validation.json;
+    # solo se vuelve a predecir si no existe (modelo anterior al registro) o con --recompute
+    version = registry.current_version()
+    guardada = {} if recompute else registry.validation(version)
+    if guardada:
+        print(f"📊 Validación externa (último año, versión {version}):")
+        evaluation.show(guardada)
+        return guardada
+
+    # Cargar la versión activa del modelo
+    model = registry.load_model()
+
+    # Cargar features (solo Santander) al mismo grano con que se entrenó el modelo
+    df = load_frame(grain or getattr(model, "grano_", "evento"))
 
     # Usar último año como validación externa
     ultimo_anio = int(df["anio"].max())
     val_df = df[df["anio"] == ultimo_anio]
 
     # Features consistentes con train.py (usando columnas con lag)
-    X_val = val_df[[
-    "departamento","anio","mes",
-    "tasa_delitos_muni_mes_lag","tasa_delitos_dep_mes_lag","acumulado_90d"
-    ]]
+    X_val = val_df[FEATURES]
 
     y_val = val_df["riesgo_alto"]
+    w_val = sample_weight(val_df)
 
-    # Predicciones
-    y_pred = model.predict(X_val)
+    # Predicciones y métricas (una sola pasada de predict_proba)
+    resultado = evaluation.evaluate(model, X_val, y_val, w_val)
+    resultado["split"] = {"desde": f"{ultimo_anio}-01", "hasta": f"{ultimo_anio}-12"}
     print("📊 Validación externa (último año):")
-    print(classification_report(y_val, y_pred))
-
-    # Métricas adicionales
-    if hasattr(model, "predict_proba"):
-        y_proba = model.predict_proba(X_val)[:, 1]
-        roc = roc_auc_score(y_val, y_proba)
-        precision, recall, _ = precision_recall_curve(y_val, y_proba)
-        pr = auc(recall, precision)
-        print(f"ROC-AUC: {roc:.3f}")
-        print(f"PR-AUC: {pr:.3f}")
+    evaluation.show(resultado)
+    if version:
+        registry.save_validation(version, resultado)
+    return resultado
 
 if __name__ == "__main__":
-    validate()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recompute", action="store_true", help="Volver a predecir sobre features y reescribir validation.json")
+    args = parser.parse_args()
+    validate(recompute=args.recompute)
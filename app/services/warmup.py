@@ -0,0 +1,59 @@
+# app/services/warmup.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.config import WARMUP_WORKERS
+
+# Estado para /health: disabled | warming | ready | error, y el detalle por tarea
+_state = {"status": "disabled", "ms": None, "tasks": {}}
+_lock = threading.Lock()
+
+
+def _set(name: str, **values):
+    with _lock:
+        _state["tasks"][name] = values
+
+
+def _run(name: str, fn):
+    t0 = time.perf_counter()
+    _set(name, status="warming")
+    try:
+        fn()
+        _set(name, status="ready", ms=round((time.perf_counter() - t0) * 1000, 1))
+    except Exception as e:
+        _set(name, status="error", ms=round((time.perf_counter() - t0) * 1000, 1), error=str(e))
+        print(f"❌ Precalentamiento de {name} falló: {e}")
+
+
+def start(tasks: dict, workers: int = WARMUP_WORKERS) -> threading.Thread:
+    # Corre las tareas (nombre -> función) en paralelo desde un hilo de fondo: el arranque
+    # no espera, y un request que llegue antes carga lo suyo como siempre (el store y los
+    # índices tienen sus propios locks)
+    with _lock:
+        _state.update(status="warming", ms=None, tasks={name: {"status": "pending"} for name in tasks})
+
+    def run():
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warmup") as pool:
+            list(pool.map(lambda item: _run(*item), tasks.items()))
+        ms = round((time.perf_counter() - t0) * 1000, 1)
+        with _lock:
+            errores = [n for n, t in _state["tasks"].items() if t["status"] == "error"]
+            _state.update(status="error" if errores else "ready", ms=ms)
+        print(f"{'❌' if errores else '✅'} Precalentamiento terminado en {ms} ms"
+              + (f" (con errores en {', '.join(errores)})" if errores else ""))
+
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def ready() -> bool:
+    # Lista cuando el precalentamiento terminó (las tareas con error se ven en state() y se
+    # reintentan al primer uso); sin precalentamiento está lista desde el arranque
+    return _state["status"] != "warming"
+
+
+def state() -> dict:
+    with _lock:
+        return {**_state, "tasks": {name: dict(t) for name, t in _state["tasks"].items()}}
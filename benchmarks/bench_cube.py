@@ -0,0 +1,54 @@
+# benchmarks/bench_cube.py
+# Consultas de analytics sobre el frame de features (groupby por consulta) contra los
+# agregados de app.services.cube, con features replicado `scale` veces (más eventos con las
+# mismas combinaciones, como un histórico más largo).
+#   python -m benchmarks.bench_cube --scales 1 16
+import argparse
+import time
+import pandas as pd
+from app.services import cube, store
+
+
+def bench(repeticiones: int = 20, scales=(1,)):
+    base = store.get("features")
+    for scale in scales:
+        df = base if scale == 1 else pd.concat([base] * scale, ignore_index=True)
+        tabla = cube.build(df)
+        anio = int(df["anio"].max())
+        mes = int(df.loc[df["anio"] == anio, "mes"].max())
+        partes = {nombre: cube.split(tabla, nombre) for nombre in cube.ROLLUPS}
+        consultas = {
+            "contexto del mes": (
+                lambda: [df[(df["anio"] == anio) & (df["mes"] == mes)].groupby(c, observed=True)["cantidad"].sum()
+                         .sort_values(ascending=False, kind="stable").index[0] for c in cube.CONTEXTO],
+                lambda: [cube.top(f"mes_{c}", c, cube=partes[f"mes_{c}"], anio=anio, mes=mes)[0]
+                         for c in cube.CONTEXTO],
+            ),
+            "distribución municipios": (
+                lambda: df[df["anio"] == anio].groupby("municipio", observed=True)["cantidad"].sum()
+                        .sort_values(ascending=False, kind="stable"),
+                lambda: cube.rollup("municipio_anio", "municipio", cube=partes["municipio_anio"], anio=anio),
+            ),
+            "total por municipio y tipo": (
+                lambda: int(df[(df["municipio"] == "BUCARAMANGA") & (df["tipo_delito"] == "HURTO")]["cantidad"].sum()),
+                lambda: cube.total("entidades", cube=partes["entidades"], municipio="BUCARAMANGA", tipo_delito="HURTO"),
+            ),
+        }
+        print(f"📊 Cubo de {len(tabla)} celdas para {len(df)} filas de features (x{scale}, "
+              f"{tabla.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB vs {df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB)")
+        for nombre, (anterior, nuevo) in consultas.items():
+            tiempos = []
+            for fn in (anterior, nuevo):
+                t0 = time.perf_counter()
+                for _ in range(repeticiones):
+                    fn()
+                tiempos.append((time.perf_counter() - t0) * 1000 / repeticiones)
+            print(f"   {nombre:<28} features {tiempos[0]:7.2f} ms · cubo {tiempos[1]:6.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 16])
+    args = parser.parse_args()
+    bench(args.repeticiones, args.scales)
@@ -0,0 +1,51 @@
+# benchmarks/bench_entities.py
+# Parte no-LLM de /chatbot/ask: detección por .unique() + filtros encadenados sobre features
+# (camino anterior) contra el autómata y el cubo de app.services.entities.
+#   python -m benchmarks.bench_entities
+import argparse
+import time
+from app.services import entities, store
+from app.services.entities import CAMPOS, normalize
+
+PREGUNTAS = [
+    "¿Cuántos hurtos hubo en Bucaramanga en la noche?",
+    "violencia intrafamiliar contra adolescentes en Barrancabermeja",
+    "delitos sexuales en la madrugada contra mujeres",
+    "hola, ¿qué tan seguro es salir?",
+]
+
+
+def legacy_context(pregunta: str) -> dict:
+    df = store.get("features")
+    texto = normalize(pregunta)
+
+    def detectar(lista):
+        lista_norm = [normalize(item) for item in lista]
+        return next((lista[i] for i, item in enumerate(lista_norm) if item in texto), None)
+
+    ent = {c: detectar(df[c].dropna().unique()) for c in CAMPOS}
+    filtrado = df
+    for campo, valor in ent.items():
+        if valor:
+            filtrado = filtrado[filtrado[campo] == valor]
+    conteo = filtrado["municipio"].value_counts()
+    return {**ent, "total": int(filtrado["cantidad"].sum()), "top_muni": conteo.head(3).index.tolist()}
+
+
+def bench(repeticiones: int = 50):
+    entities.get()
+    for pregunta in PREGUNTAS:
+        tiempos = []
+        for fn in (legacy_context, entities.context):
+            t0 = time.perf_counter()
+            for _ in range(repeticiones):
+                fn(pregunta)
+            tiempos.append((time.perf_counter() - t0) * 1000 / repeticiones)
+        print(f"📊 {pregunta[:45]:<45} filtros {tiempos[0]:7.2f} ms · cubo {tiempos[1]:6.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+    bench(args.repeticiones)
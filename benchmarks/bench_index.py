@@ -0,0 +1,61 @@
+# benchmarks/bench_index.py
+# Latencias p50/p99 de /crimes/query: máscaras booleanas + sort_values (camino anterior) vs el
+# índice de app.services.index, sobre master replicado `scale` veces.
+#   python -m benchmarks.bench_index --scales 1 4
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from app.services import store
+from app.services.index import Index
+
+
+def query_mask(df, filtros, limit):
+    filt = pd.Series(True, index=df.index)
+    for col, valor in filtros.items():
+        if valor is not None:
+            filt &= (df[col] == valor)
+    return df.loc[filt].sort_values("fecha_hecho", ascending=False).head(limit)
+
+
+def bench(n_queries: int = 200, limit: int = 100, scales=(1,), seed: int = 0):
+    base = store.get("master")
+    rng = np.random.default_rng(seed)
+    municipios = base["municipio"].dropna().unique()
+    tipos = base["tipo_delito"].dropna().unique()
+    anios = base["anio"].dropna().unique()
+    consultas = []
+    for _ in range(n_queries):
+        consultas.append({
+            "departamento": "SANTANDER",
+            "municipio": rng.choice(municipios) if rng.random() < 0.7 else None,
+            "tipo_delito": rng.choice(tipos) if rng.random() < 0.5 else None,
+            "anio": int(rng.choice(anios)) if rng.random() < 0.5 else None,
+            "mes": int(rng.integers(1, 13)) if rng.random() < 0.3 else None,
+        })
+    for scale in scales:
+        df = base if scale == 1 else pd.concat([base] * scale, ignore_index=True)
+        t0 = time.perf_counter()
+        idx = Index(df)
+        build_ms = (time.perf_counter() - t0) * 1000
+        tiempos = {"mascaras": [], "indice": []}
+        for filtros in consultas:
+            t0 = time.perf_counter()
+            query_mask(df, filtros, limit)
+            t1 = time.perf_counter()
+            df.iloc[idx.positions(filtros, limit)]
+            t2 = time.perf_counter()
+            tiempos["mascaras"].append((t1 - t0) * 1000)
+            tiempos["indice"].append((t2 - t1) * 1000)
+        print(f"📊 {len(df)} filas (x{scale}), índice construido en {build_ms:.0f} ms")
+        for camino, ts in tiempos.items():
+            print(f"   {camino:<9} p50 {np.percentile(ts, 50):7.2f} ms   p99 {np.percentile(ts, 99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+    bench(args.queries, args.limit, args.scales)
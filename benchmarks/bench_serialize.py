@@ -0,0 +1,85 @@
+# benchmarks/bench_serialize.py
+# /crimes/recent y /geo/incidents: camino anterior (iterrows + un modelo Pydantic por fila +
+# json) contra las columnas vectorizadas codificadas con orjson, sobre el master del store.
+#   python -m benchmarks.bench_serialize --limits 100 1000
+import argparse
+import json
+import time
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from app.config import GEO_DIR
+from app.models.schemas import CrimeRecentRecord, GeoIncident
+from app.routers import crimes, geo
+from app.services import index, store
+
+
+def _severidad(r):
+    cantidad = r.get("cantidad", 0) or 0
+    return "crítica" if cantidad >= 3 else ("alta" if cantidad == 2 else "media")
+
+
+def legacy_recent(df):
+    out = [
+        CrimeRecentRecord(
+            id=f"#{i:03d}", tipo=str(r.get("tipo_delito", "OTRO")),
+            descripcion=f"Reporte reciente de {r.get('delito')}",
+            ubicacion=f"{str(r.get('municipio', ''))}, {str(r.get('departamento', ''))}",
+            fecha=str(r["fecha_hecho"]), severidad=_severidad(r), estado="En Atención",
+        )
+        for i, r in df.iterrows()
+    ]
+    return json.dumps(jsonable_encoder(out), ensure_ascii=False).encode()
+
+
+def legacy_incidents(df, geo_df):
+    df = df.drop(columns=["lat", "lon"], errors="ignore").reset_index(drop=True)
+    df["codigo_dane"] = df["codigo_dane"].astype(str)
+    geo_df["codigo_dane"] = geo_df["codigo_dane"].astype(str)
+    df = df.merge(geo_df, on="codigo_dane", how="left")
+    out = [
+        GeoIncident(lat=float(r.get("lat", 0)), lon=float(r.get("lon", 0)), severidad=_severidad(r),
+                    estado="En Atención", municipio=str(r.get("municipio", "")))
+        for _, r in df.iterrows()
+    ]
+    return json.dumps(jsonable_encoder(out), ensure_ascii=False).encode()
+
+
+def _as_object(df):
+    df = df.copy()
+    for col in df.select_dtypes(include="category").columns:
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
+
+
+def bench(repeticiones: int = 20, limits=(100, 1000)):
+    df = store.get("master")
+    orden = index.get("master").order
+    municipios = pd.read_csv(GEO_DIR / "municipios.csv")
+    caminos = {
+        "/crimes/recent": (
+            lambda n: legacy_recent(_as_object(df.iloc[orden[:n]])),
+            lambda n: crimes.recent(limit=n, cursor=None).body,
+        ),
+        "/geo/incidents": (
+            lambda n: legacy_incidents(_as_object(df.iloc[orden[:n]]), municipios.copy()),
+            lambda n: geo._incidents(n).body,
+        ),
+    }
+    for nombre, (anterior, nuevo) in caminos.items():
+        for n in limits:
+            tiempos = []
+            for fn in (anterior, nuevo):
+                t0 = time.perf_counter()
+                for _ in range(repeticiones):
+                    fn(n)
+                tiempos.append((time.perf_counter() - t0) * 1000 / repeticiones)
+            print(f"📊 {nombre} ({n} filas): iterrows {tiempos[0]:.1f} ms, "
+                  f"vectorizado {tiempos[1]:.1f} ms (x{tiempos[0] / max(tiempos[1], 1e-9):.0f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--limits", type=int, nargs="+", default=[100, 1000])
+    args = parser.parse_args()
+    bench(args.repeticiones, args.limits)
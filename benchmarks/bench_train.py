@@ -0,0 +1,73 @@
+# benchmarks/bench_train.py
+# Backends de entrenamiento con el mismo split temporal: tiempo de fit, AUC, throughput de
+# predict_proba sobre el frame por evento (x`scale`) y latencia con un mes de municipios (lo
+# que se puntúa en la API), con el pipeline y con la forma compacta de app.services.inference
+#   python -m benchmarks.bench_train --estimators gb hgb xgb --scale 8
+import argparse
+import io
+import time
+import joblib
+import pandas as pd
+from sklearn.metrics import auc, precision_recall_curve, roc_auc_score
+from app.services import inference
+from app.services.train import (ESTIMATORS, FEATURES, TARGET, load_frame, make_pipeline, sample_weight,
+                                temporal_split, thread_limit)
+from app.config import TRAIN_GRAIN
+
+
+def _size_kb(obj, save) -> float:
+    buffer = io.BytesIO()
+    save(obj, buffer)
+    return buffer.tell() / 1024
+
+
+def bench(estimators=None, grain: str = None, threads: int = None, scale: int = 1):
+    grain = grain or TRAIN_GRAIN
+    df = load_frame(grain)
+    train_df, test_df = temporal_split(df)
+    eventos = load_frame("evento")[FEATURES]
+    mes = test_df[FEATURES].tail(40)
+    if scale > 1:
+        eventos = pd.concat([eventos] * scale, ignore_index=True)
+    w_train, w_test = sample_weight(train_df), sample_weight(test_df)
+    print(f"📊 Grano {grain}: {len(train_df)} filas de train, {len(test_df)} de validación; "
+          f"predict sobre {len(eventos)} eventos")
+    print(f"   {'backend':<8} {'fit s':>7} {'ROC-AUC':>8} {'PR-AUC':>8} {'pipeline fil/s':>15} "
+          f"{'compacto fil/s':>15} {'40 filas ms':>12} {'pkl KB':>8} {'npz KB':>8}")
+    for name in estimators or ESTIMATORS:
+        try:
+            model = make_pipeline(name, threads)
+        except RuntimeError as e:
+            print(f"   {name:<8} ⚠️ {e}")
+            continue
+        with thread_limit(threads):
+            t0 = time.perf_counter()
+            model.fit(train_df[FEATURES], train_df[TARGET], clf__sample_weight=w_train)
+            fit_s = time.perf_counter() - t0
+            proba = model.predict_proba(test_df[FEATURES])[:, 1]
+            roc = roc_auc_score(test_df[TARGET], proba, sample_weight=w_test)
+            precision, recall, _ = precision_recall_curve(test_df[TARGET], proba, sample_weight=w_test)
+            compact = inference.export(model, grain)
+            tiempos, latencias = [], []
+            for m in (model, compact):
+                t0 = time.perf_counter()
+                m.predict_proba(eventos)
+                tiempos.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                for _ in range(50):
+                    m.predict_proba(mes)
+                latencias.append((time.perf_counter() - t0) * 1000 / 50)
+        print(f"   {name:<8} {fit_s:7.2f} {roc:8.4f} {auc(recall, precision):8.4f} "
+              f"{len(eventos) / tiempos[0]:15,.0f} {len(eventos) / tiempos[1]:15,.0f} "
+              f"{latencias[0]:5.2f} → {latencias[1]:4.2f} "
+              f"{_size_kb(model, joblib.dump):8.0f} {_size_kb(compact, lambda c, f: c.save(f)):8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grano", choices=["municipio_mes", "evento"], default=None)
+    parser.add_argument("--estimators", choices=ESTIMATORS, nargs="+", default=None)
+    parser.add_argument("--threads", type=int, default=None, help="Hilos de hgb/xgb (0 = todos los núcleos)")
+    parser.add_argument("--scale", type=int, default=1, help="Réplicas del frame por evento")
+    args = parser.parse_args()
+    bench(args.estimators, args.grano, args.threads, args.scale)
@@ -22,18 +22,14 @@ function StatsOverview() {
   useEffect(() => {
     const fetchStats = async () => {
       try {
-        const [incidents, response, crime, resolved] = await Promise.all([
-          fetch('http://localhost:8000/analytics/incidents/total').then(r => r.json()),
-          fetch('http://localhost:8000/analytics/response-time').then(r => r.json()),
-          fetch('http://localhost:8000/analytics/crime-rate').then(r => r.json()),
-          fetch('http://localhost:8000/analytics/cases/resolved').then(r => r.json())
-        ]);
+        // Las cuatro tarjetas salen del snapshot precalculado de KPIs
+        const kpis = await fetch('http://localhost:8000/analytics/kpis').then(r => r.json());
 
         setStats({
-          totalIncidents: incidents,
-          responseTime: response,
-          crimeRate: crime,
-          casesResolved: resolved
+          totalIncidents: kpis.incidents_total,
+          responseTime: kpis.response_time,
+          crimeRate: kpis.crime_rate,
+          casesResolved: kpis.cases_resolved
         });
         setIsLoading(false);
       } catch (error) {
@@ -1,8 +1,9 @@
-import { useState, useEffect } from 'react';
-import { MapContainer, TileLayer, Marker, Popup } from 'react-leaflet';
+import { useState, useEffect, useCallback, useRef } from 'react';
+import { MapContainer, TileLayer, Marker, Popup, CircleMarker, Tooltip, useMapEvents } from 'react-leaflet';
 import L from 'leaflet';
+import axios from 'axios';
 import 'leaflet/dist/leaflet.css';
-import { getIncidents } from '../services/analytics';
+import { getIncidents, getHeatmap } from '../services/analytics';
 import { Flame, AlertTriangle, ShieldAlert, CheckCircle, MapPin, Clock, Activity, Layers } from 'lucide-react';
 import { renderToStaticMarkup } from 'react-dom/server';
 import './Map.css';
@@ -81,23 +82,63 @@ const createCustomIcon = (severidad) => {
   });
 };
 
+// Pide al backend solo los incidentes del viewport actual (bbox + zoom) al mover el mapa
+function ViewportIncidents({ onViewportChange }) {
+  const map = useMapEvents({
+    moveend: () => onViewportChange(map),
+  });
+
+  useEffect(() => {
+    onViewportChange(map);
+  }, [map, onViewportChange]);
+
+  return null;
+}
+
 export function MapView() {
   const [incidents, setIncidents] = useState([]);
+  const [heatCells, setHeatCells] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   const [selectedSeverity, setSelectedSeverity] = useState('todos');
   const [error, setError] = useState(null);
+  // Petición del viewport en curso: cada moveend cancela la anterior para que una respuesta
+  // vieja no pise a la del viewport actual
+  const viewportRequest = useRef(null);
 
-  useEffect(() => {
-    setIsLoading(true);
+  useEffect(() => () => viewportRequest.current?.abort(), []);
+
+  const loadViewport = useCallback((map) => {
+    const bounds = map.getBounds();
+    const viewport = {
+      min_lat: bounds.getSouth(),
+      min_lon: bounds.getWest(),
+      max_lat: bounds.getNorth(),
+      max_lon: bounds.getEast(),
+      zoom: map.getZoom(),
+    };
     setError(null);
-    
-    getIncidents()
+    viewportRequest.current?.abort();
+    const controller = new AbortController();
+    viewportRequest.current = controller;
+    const { signal } = controller;
+
+    // Heatmap agregado en el servidor: todos los incidentes con un payload acotado
+    getHeatmap(viewport, { signal })
+      .then((data) => setHeatCells(Array.isArray(data) ? data : []))
+      .catch((err) => {
+        if (axios.isCancel(err)) return;
+        console.error('Error loading heatmap:', err);
+        setHeatCells([]);
+      });
+
+    getIncidents(viewport, { signal })
       .then((data) => {
         console.log('Incidents loaded:', data);
         setIncidents(Array.isArray(data) ? data : []);
         setIsLoading(false);
       })
       .catch((err) => {
+        if (axios.isCancel(err)) return;
         console.error('Error loading incidents:', err);
         setError('Error al cargar los incidentes');
         setIncidents([]);
@@ -329,7 +370,7 @@ export function MapView() {
           </div>
         )}
         
-        {!isLoading && !error && (
+        {!error && (
           <MapContainer
             center={[6.5, -73.5]}
             zoom={11}
@@ -340,6 +381,17 @@ export function MapView() {
               attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a>'
               url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
             />
+            <ViewportIncidents onViewportChange={loadViewport} />
+            {heatCells.map((cell) => (
+              <CircleMarker
+                key={`heat-${cell.lat}-${cell.lon}`}
+                center={[cell.lat, cell.lon]}
+                radius={8 + 30 * Math.sqrt(cell.intensidad)}
+                pathOptions={{ color: '#dc2626', fillColor: '#dc2626', fillOpacity: 0.15 + 0.45 * cell.intensidad, weight: 0 }}
+              >
+                <Tooltip>{cell.incidentes} incidentes ({cell.eventos} eventos)</Tooltip>
+              </CircleMarker>
+            ))}
             {filteredIncidents.map((incident, idx) => {
               if (!incident.lat || !incident.lon) return null;
 
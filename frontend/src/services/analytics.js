@@ -41,8 +41,16 @@ export async function getMunicipiosDistribution() {
 }
 
 // GEO — INCIDENTS ✔ CORRECTO
-export async function getIncidents() {
-  const res = await api.get('/geo/incidents');
+// params opcionales: { min_lat, min_lon, max_lat, max_lon, zoom, desde, hasta, limit }
+// signal: AbortSignal para cancelar la petición si el viewport cambia antes de que responda
+export async function getIncidents(params = {}, { signal } = {}) {
+  const res = await api.get('/geo/incidents', { params, signal });
+  return res.data;
+}
+
+// params: { zoom, min_lat, min_lon, max_lat, max_lon, desde, hasta }
+export async function getHeatmap(params = {}, { signal } = {}) {
+  const res = await api.get('/geo/heatmap', { params, signal });
   return res.data;
 }
 
@@ -77,6 +85,7 @@ export default {
   predictRisk,
   getMunicipiosDistribution,
   getIncidents,
+  getHeatmap,
   getCrimesRecent,
   queryCrimes,
   chatbotAsk,
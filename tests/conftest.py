@@ -0,0 +1,67 @@
+# tests/conftest.py
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+# app.config exige GITHUB_TOKEN al importarse; las pruebas no llaman al proveedor
+os.environ.setdefault("GITHUB_TOKEN", "test")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+GEO_CSV = Path(__file__).resolve().parents[1] / "app" / "data" / "geo" / "municipios.csv"
+
+
+def synthetic_master(n: int = 3000, seed: int = 0) -> pd.DataFrame:
+    # Eventos con el esquema de master.parquet; lat/lon salen de municipios.csv como en el ETL
+    rng = np.random.default_rng(seed)
+    geo = pd.read_csv(GEO_CSV, encoding="utf-8-sig").head(6)
+    geo["codigo_dane"] = geo["codigo_dane"].astype(str)
+    fila = rng.integers(0, len(geo), n)
+    fechas = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 2 * 365 * 4, n) * 6, unit="h")
+    df = pd.DataFrame({
+        "departamento": "SANTANDER",
+        "municipio": geo["miunicipio"].to_numpy()[fila],
+        "codigo_dane": geo["codigo_dane"].to_numpy()[fila],
+        "fecha_hecho": fechas,
+        "tipo_delito": rng.choice(["HURTO", "LESIONES", "VIOLENCIA INTRAFAMILIAR"], n),
+        "delito": rng.choice(["ARTÍCULO 239. HURTO", "ARTÍCULO 111. LESIONES", None], n),
+        "cantidad": rng.integers(1, 4, n),
+        "lat": geo["lat"].to_numpy()[fila],
+        "lon": geo["lon"].to_numpy()[fila],
+    })
+    df["anio"] = df["fecha_hecho"].dt.year
+    df["mes"] = df["fecha_hecho"].dt.month
+    return df
+
+
+@pytest.fixture
+def master_store(tmp_path, monkeypatch):
+    # store.get("master") (y los índices que dependen de él) sobre un master sintético
+    from app.services import store
+    df = synthetic_master()
+    path = tmp_path / "master.parquet"
+    df.to_parquet(path, index=False)
+    monkeypatch.setitem(store.ARTIFACTS, "master", path)
+    return df
+
+
+@pytest.fixture(scope="session")
+def features():
+    # Frame de features (solo las columnas que usan el cubo y el chatbot)
+    rng = np.random.default_rng(11)
+    n = 5000
+    df = pd.DataFrame({
+        "departamento": "SANTANDER",
+        "municipio": rng.choice(["BUCARAMANGA", "GIRÓN", "SAN GIL", "PIEDECUESTA", None], n),
+        "tipo_delito": rng.choice(["HURTO", "VIOLENCIA INTRAFAMILIAR", "DELITOS SEXUALES", "LESIONES PERSONALES"], n),
+        "grupo_etario": rng.choice(["ADOLESCENTES", "ADULTOS", "MENORES", None], n),
+        "franja_hora": rng.choice(["MADRUGADA", "MAÑANA", "TARDE", "NOCHE"], n),
+        "genero": rng.choice(["FEMENINO", "MASCULINO", "NO REPORTA"], n),
+        "dia_semana": rng.choice(["LUNES", "MARTES", "SABADO", "DOMINGO"], n),
+        "anio": rng.choice([2023, 2024], n),
+        "mes": rng.integers(1, 13, n),
+        "cantidad": rng.integers(1, 4, n),
+    })
+    return df
@@ -0,0 +1,28 @@
+# tests/test_admin.py
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import admin
+from app.services import registry
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secreto")
+    monkeypatch.setattr(registry, "versions", lambda: ["20250101-000000"])
+    return TestClient(app)
+
+
+def test_admin_requires_token(client, monkeypatch):
+    assert client.get("/admin/models").status_code == 401
+    assert client.get("/admin/models", headers={"X-Admin-Token": "otro"}).status_code == 401
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    assert client.get("/admin/models", headers={"X-Admin-Token": "secreto"}).status_code == 403
+
+
+def test_reload_unknown_version_is_404(client, monkeypatch):
+    activadas = []
+    monkeypatch.setattr(registry, "activate", activadas.append)
+    r = client.post("/admin/reload", params={"version": "../../etc"}, headers={"X-Admin-Token": "secreto"})
+    assert r.status_code == 404
+    assert activadas == []
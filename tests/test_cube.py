@@ -0,0 +1,48 @@
+# tests/test_cube.py
+import pytest
+from app.services import cube
+
+
+@pytest.fixture(scope="module")
+def tabla(features):
+    return cube.build(features)
+
+
+def _groupby_top(df, campo):
+    serie = df.groupby(campo, observed=True)["cantidad"].sum().sort_values(ascending=False, kind="stable")
+    return serie.index[0]
+
+
+def test_each_rollup_keeps_the_totals(features, tabla):
+    for nombre in cube.ROLLUPS:
+        celdas = cube.split(tabla, nombre)
+        assert cube.total(nombre, cube=celdas) == int(features["cantidad"].sum())
+        assert cube.total(nombre, "eventos", cube=celdas) == len(features)
+
+
+def test_is_smaller_than_the_full_grain(features, tabla):
+    completo = features.groupby(cube.DIMS, dropna=False, observed=True).ngroups
+    assert len(tabla) < completo
+
+
+def test_month_context_matches_groupby(features, tabla):
+    for anio, mes in [(2023, 1), (2024, 6), (2024, 12)]:
+        del_mes = features[(features["anio"] == anio) & (features["mes"] == mes)]
+        for campo in cube.CONTEXTO:
+            celdas = cube.split(tabla, f"mes_{campo}")
+            assert cube.top(f"mes_{campo}", campo, cube=celdas, anio=anio, mes=mes)[0] == _groupby_top(del_mes, campo)
+
+
+def test_municipio_distribution_matches_groupby(features, tabla):
+    celdas = cube.split(tabla, "municipio_anio")
+    esperado = features[features["anio"] == 2024].groupby("municipio", observed=True)["cantidad"].sum() \
+        .sort_values(ascending=False, kind="stable").to_dict()
+    assert cube.rollup("municipio_anio", "municipio", cube=celdas, anio=2024).to_dict() == esperado
+
+
+def test_total_by_municipio_and_tipo(features, tabla):
+    celdas = cube.split(tabla, "entidades")
+    esperado = int(features.loc[(features["municipio"] == "BUCARAMANGA") & (features["tipo_delito"] == "HURTO"),
+                                "cantidad"].sum())
+    assert esperado > 0
+    assert cube.total("entidades", cube=celdas, municipio="BUCARAMANGA", tipo_delito="HURTO") == esperado
@@ -0,0 +1,48 @@
+# tests/test_entities.py
+import pytest
+from app.services import cube, entities
+from app.services.entities import CAMPOS, Catalog, normalize
+
+PREGUNTAS = [
+    "¿Cuántos hurtos hubo en Bucaramanga en la noche?",
+    "violencia intrafamiliar contra adolescentes en San Gil",
+    "delitos sexuales en la madrugada contra mujeres en Girón",
+    "lesiones personales en la tarde, genero masculino",
+    "hola, ¿qué tan seguro es salir?",
+    "hurto en zapatoca",
+]
+
+
+def _legacy_context(df, pregunta):
+    # Camino anterior: .unique() + normalización por candidato + filtros encadenados
+    texto = normalize(pregunta)
+
+    def detectar(lista):
+        lista_norm = [normalize(item) for item in lista]
+        return next((lista[i] for i, item in enumerate(lista_norm) if item in texto), None)
+
+    ent = {c: detectar(df[c].dropna().unique()) for c in CAMPOS}
+    filtrado = df
+    for campo, valor in ent.items():
+        if valor:
+            filtrado = filtrado[filtrado[campo] == valor]
+    if not ent["franja_hora"] and not filtrado.empty:
+        hora = filtrado["franja_hora"].value_counts().idxmax()
+    else:
+        hora = ent["franja_hora"] or "SIN_DATO"
+    conteo = filtrado["municipio"].value_counts()
+    return {**ent, "total": int(filtrado["cantidad"].sum()), "hora": hora,
+            "top_muni": conteo[conteo > 0].head(3).index.tolist()}
+
+
+@pytest.mark.parametrize("desde_cubo", [False, True])
+def test_context_matches_chained_filters(features, monkeypatch, desde_cubo):
+    catalog = Catalog(cube.split(cube.build(features), "entidades") if desde_cubo else features)
+    monkeypatch.setattr(entities, "get", lambda: catalog)
+    for pregunta in PREGUNTAS:
+        assert entities.context(pregunta) == _legacy_context(features, pregunta), pregunta
+
+
+def test_automaton_finds_overlapping_patterns():
+    automaton = entities.Automaton([("san", 1), ("san gil", 2), ("gil", 3)])
+    assert sorted(automaton.find("en san gil")) == [1, 2, 3]
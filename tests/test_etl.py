@@ -0,0 +1,125 @@
+# tests/test_etl.py
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+from app.services import dataset, etl
+
+COLUMNAS = ["departamento", "municipio", "codigo_dane", "armas_medios", "fecha_hecho", "genero",
+            "grupo_etario", "cantidad", "tipo_de_hurto"]
+FILAS = [
+    ["SANTANDER", "BUCARAMANGA", "68001000", "ARMA BLANCA", "02/10/2024 18:00:00", "MASCULINO", "ADULTOS", "1", "HURTO PERSONAS"],
+    ["SANTANDER", "GIRÓN", "68307000", "SIN EMPLEO DE ARMAS", "13/11/2024 12:00:00", "FEMENINO", "ADULTOS", "1", "HURTO RESIDENCIAS"],
+    ["SANTANDER", "FLORIDABLANCA", "68276000", "ARMA DE FUEGO", "20/12/2024 09:00:00", "", "MENORES", "2", "HURTO PERSONAS"],
+    ["BOYACA", "TUNJA", "15001000", "ARMA BLANCA", "21/12/2024 09:00:00", "MASCULINO", "ADULTOS", "1", "HURTO PERSONAS"],
+]
+# Segunda pasada: una fila tardía con la misma marca de agua que la última ya cargada y dos más
+# recientes (una de otro departamento)
+NUEVAS = [
+    ["SANTANDER", "PIEDECUESTA", "68547000", "ARMA BLANCA", "20/12/2024 09:00:00", "MASCULINO", "ADULTOS", "1", "HURTO PERSONAS"],
+    ["SANTANDER", "BUCARAMANGA", "68001000", "ARMA BLANCA", "28/12/2024 22:00:00", "FEMENINO", "ADOLESCENTES", "3", "HURTO PERSONAS"],
+    ["BOYACA", "DUITAMA", "15238000", "ARMA BLANCA", "29/12/2024 09:00:00", "MASCULINO", "ADULTOS", "1", "HURTO PERSONAS"],
+]
+
+
+@pytest.fixture
+def portal(tmp_path, monkeypatch):
+    # Servidor de fixtures CSV que ignora $select/$where/$order (como python -m http.server)
+    root = tmp_path / "portal"
+    (root / "resource").mkdir(parents=True)
+    handler = functools.partial(type("Quiet", (SimpleHTTPRequestHandler,), {"log_message": lambda *a: None}),
+                                directory=str(root))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    proc = tmp_path / "processed"
+    monkeypatch.setattr(etl, "RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr(etl, "PROC_DIR", proc)
+    monkeypatch.setattr(etl, "STATE_PATH", proc / "etl_state.json")
+    monkeypatch.setattr(etl, "SOURCES", {"hurtos": f"http://127.0.0.1:{server.server_port}/resource/d4fr-sbn2.csv?$limit=100000"})
+    yield root / "resource" / "d4fr-sbn2.csv"
+    server.shutdown()
+    server.server_close()
+
+
+def _publish(path, filas, socrata):
+    df = pd.DataFrame(filas, columns=COLUMNAS)
+    if socrata:
+        # Campos de sistema: la fila tardía comparte :updated_at con la última de la primera pasada
+        df.insert(0, ":id", [f"row-{i}" for i in range(len(df))])
+        df.insert(1, ":updated_at", ["2025-01-01T00:00:00.000"] * len(FILAS)
+                  + ["2025-01-01T00:00:00.000", "2025-01-02T08:30:00.250", "2025-01-02T09:00:00.000"][:len(df) - len(FILAS)])
+    df.to_csv(path, index=False)
+
+
+def _master():
+    return dataset.read(etl.PROC_DIR / "master.parquet", categorical=False)
+
+
+@pytest.mark.parametrize("socrata", [True, False], ids=["socrata", "fixture"])
+def test_incremental_pass_appends_only_new_rows(portal, socrata):
+    _publish(portal, FILAS, socrata)
+    etl.build_master(normalize_workers=0, retries=1)
+    assert len(_master()) == 3
+    assert etl.watermark(etl.load_state(), "hurtos")
+    primera = set((etl.PROC_DIR / "hurtos").glob("part-*.parquet"))
+
+    _publish(portal, FILAS + NUEVAS, socrata)
+    etl.build_master(incremental=True, normalize_workers=0, retries=1)
+    master = _master()
+    nuevas = set((etl.PROC_DIR / "hurtos").glob("part-*.parquet")) - primera
+    assert len(nuevas) == 1
+    assert len(pd.read_parquet(nuevas.pop())) == 2
+    assert len(master) == 5
+    assert sorted(master["municipio"]) == ["BUCARAMANGA", "BUCARAMANGA", "FLORIDABLANCA", "GIRÓN", "PIEDECUESTA"]
+    assert not set(etl.ROW_COLS) & set(master.columns)
+
+    # Sin cambios en la fuente: nada que agregar
+    etl.build_master(incremental=True, normalize_workers=0, retries=1)
+    assert len(list((etl.PROC_DIR / "hurtos").glob("part-*.parquet"))) == 2
+    assert len(_master()) == 5
+
+
+def test_corrected_row_replaces_the_stored_version(portal):
+    _publish(portal, FILAS, socrata=True)
+    etl.build_master(normalize_workers=0, retries=1)
+    assert int(_master().loc[lambda m: m["municipio"] == "GIRÓN", "cantidad"].sum()) == 1
+
+    # Socrata corrige row-1 (GIRÓN): mismo :id, :updated_at más reciente y otra cantidad
+    df = pd.read_csv(portal, dtype=str)
+    df.loc[df[":id"] == "row-1", ["cantidad", ":updated_at"]] = ["4", "2025-01-03T10:00:00.000"]
+    df.to_csv(portal, index=False)
+    etl.build_master(incremental=True, normalize_workers=0, retries=1)
+    master = _master()
+    assert len(master) == 3
+    assert master.loc[master["municipio"] == "GIRÓN", "cantidad"].tolist() == [4]
+    assert etl.watermark(etl.load_state(), "hurtos") == "2025-01-03T10:00:00.000"
+
+
+def test_failed_full_load_keeps_previous_partitions(portal, monkeypatch):
+    _publish(portal, FILAS, socrata=True)
+    etl.build_master(normalize_workers=0, retries=1)
+    partes = sorted((etl.PROC_DIR / "hurtos").glob("part-*.parquet"))
+    estado = etl.load_state()
+
+    original = etl.normalize_chunk
+
+    def falla(*args, **kwargs):
+        raise MemoryError("chunk")
+    monkeypatch.setattr(etl, "normalize_chunk", falla)
+    _publish(portal, FILAS + NUEVAS, socrata=True)
+    with pytest.raises(MemoryError):
+        etl.build_master(normalize_workers=0, retries=1)
+    assert sorted((etl.PROC_DIR / "hurtos").glob("part-*.parquet")) == partes
+    assert etl.load_state() == estado
+
+    monkeypatch.setattr(etl, "normalize_chunk", original)
+    etl.build_master(normalize_workers=0, retries=1)
+    assert len(list((etl.PROC_DIR / "hurtos").glob("part-*.parquet"))) == 1
+    assert len(_master()) == 5
+
+
+def test_source_url_uses_inclusive_updated_at_watermark():
+    url = etl.source_url("hurtos", "2025-01-01T00:00:00.000")
+    assert "%3Aupdated_at%20%3E%3D%20%272025-01-01T00%3A00%3A00.000%27" in url
+    assert "fecha_hecho" not in url
@@ -0,0 +1,58 @@
+# tests/test_features.py
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import features
+
+
+def _rolling_sum_apply(df: pd.DataFrame, days: int) -> pd.Series:
+    # Implementación anterior (groupby-apply con rolling por tiempo) como referencia
+    df = df.sort_values(["municipio", "fecha_hecho"])
+
+    def rolling(group):
+        g = group.set_index("fecha_hecho").sort_index()
+        out = group.copy()
+        out["acumulado"] = g["cantidad"].rolling(f"{days}D").sum().values
+        return out
+    return df.groupby("municipio", group_keys=False).apply(rolling, include_groups=False)["acumulado"]
+
+
+@pytest.fixture
+def eventos():
+    rng = np.random.default_rng(7)
+    n = 3000
+    fechas = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, n), unit="D") \
+        + pd.to_timedelta(rng.choice([0, 6, 12, 23], n), unit="h")
+    df = pd.DataFrame({
+        "municipio": rng.choice(["BUCARAMANGA", "GIRON", "PIEDECUESTA", "SAN GIL"], n),
+        "fecha_hecho": fechas,
+        "cantidad": rng.integers(1, 5, n).astype(float),
+    })
+    # Empates exactos de fecha y huecos más largos que cualquier ventana
+    empates = df.sample(300, random_state=1)
+    hueco = pd.DataFrame({
+        "municipio": ["SAN GIL"] * 3 + ["ZAPATOCA"],
+        "fecha_hecho": pd.to_datetime(["2015-03-01", "2015-03-01", "2016-06-30", "2019-01-01"]),
+        "cantidad": [2.0, 3.0, 1.0, 4.0],
+    })
+    return pd.concat([df, empates, hueco], ignore_index=True)
+
+
+@pytest.mark.parametrize("days", [30, 90, 365])
+def test_rolling_sum_matches_groupby_apply(eventos, days):
+    ref = _rolling_sum_apply(eventos, days)
+    srt = eventos.sort_values(["municipio", "fecha_hecho"])
+    new = pd.Series(features.rolling_sum(srt, days), index=srt.index)
+    assert ref.index.equals(new.index)
+    np.testing.assert_allclose(new.to_numpy(), ref.to_numpy(), rtol=0, atol=1e-9)
+
+
+def test_rolling_sum_nat_rows_are_nan():
+    df = pd.DataFrame({
+        "municipio": ["A", "A", "A"],
+        "fecha_hecho": pd.to_datetime(["2024-01-01", "2024-01-05", None]),
+        "cantidad": [1.0, 2.0, 5.0],
+    }).sort_values(["municipio", "fecha_hecho"])
+    out = features.rolling_sum(df, 90)
+    assert out[:2].tolist() == [1.0, 3.0]
+    assert np.isnan(out[2])
@@ -0,0 +1,79 @@
+# tests/test_index.py
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.index import Index
+
+
+def _query_mask(df, filtros, limit):
+    # Camino anterior de /crimes/query: máscaras booleanas + sort_values por consulta
+    filt = pd.Series(True, index=df.index)
+    for col, valor in filtros.items():
+        if valor is not None:
+            filt &= (df[col] == valor)
+    return df.loc[filt].sort_values("fecha_hecho", ascending=False, kind="stable").head(limit)
+
+
+@pytest.fixture(scope="module")
+def master():
+    rng = np.random.default_rng(3)
+    n = 20000
+    fechas = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365 * 4, n) * 6, unit="h")
+    df = pd.DataFrame({
+        "departamento": rng.choice(["SANTANDER", "BOYACA"], n, p=[0.9, 0.1]),
+        "municipio": rng.choice(["BUCARAMANGA", "GIRON", "PIEDECUESTA", "SAN GIL", None], n),
+        "tipo_delito": rng.choice(["HURTO", "LESIONES", "VIOLENCIA INTRAFAMILIAR"], n),
+        "fecha_hecho": fechas,
+    })
+    # Fechas faltantes (quedan al final del orden)
+    df.loc[rng.choice(n, 50, replace=False), "fecha_hecho"] = pd.NaT
+    df["anio"] = df["fecha_hecho"].dt.year
+    df["mes"] = df["fecha_hecho"].dt.month
+    return df
+
+
+def _consultas(df, n=150, seed=0):
+    rng = np.random.default_rng(seed)
+    municipios = df["municipio"].dropna().unique()
+    tipos = df["tipo_delito"].unique()
+    for _ in range(n):
+        yield {
+            "departamento": "SANTANDER",
+            "municipio": rng.choice(municipios) if rng.random() < 0.7 else None,
+            "tipo_delito": rng.choice(tipos) if rng.random() < 0.5 else None,
+            "anio": int(rng.choice([2022, 2023, 2024])) if rng.random() < 0.5 else None,
+            "mes": int(rng.integers(1, 13)) if rng.random() < 0.3 else None,
+        }
+
+
+@pytest.mark.parametrize("limit", [1, 100, None])
+def test_positions_match_mask_and_sort(master, limit):
+    idx = Index(master)
+    for filtros in _consultas(master):
+        ref = _query_mask(master, filtros, limit)
+        res = master.iloc[idx.positions(filtros, limit)]
+        # Mismo orden (fecha desc, fila asc en empates) y mismas filas
+        assert res.index.tolist() == ref.index.tolist(), filtros
+
+
+def test_unknown_value_returns_nothing(master):
+    assert len(Index(master).positions({"municipio": "NO EXISTE"}, 10)) == 0
+
+
+def test_cursor_pages_cover_full_result(master):
+    idx = Index(master)
+    filtros = {"departamento": "SANTANDER", "tipo_delito": "HURTO"}
+    completo = idx.positions(filtros).tolist()
+    paginas, desde = [], 0
+    while True:
+        pos = idx.positions(filtros, 333, desde)
+        paginas += pos.tolist()
+        if len(pos) < 333:
+            break
+        desde = idx.start(idx.cursor(pos[-1]))
+    assert paginas == completo
+
+
+def test_invalid_cursor(master):
+    with pytest.raises(ValueError):
+        Index(master).start("no-es-un-cursor")
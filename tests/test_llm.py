@@ -0,0 +1,60 @@
+# tests/test_llm.py
+import asyncio
+import time
+import pytest
+from app.services import llm
+
+MESSAGES = [{"role": "user", "content": "Genera una predicción   de seguridad para Santander."}]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = llm.ResponseCache(ttl=3600, directory=None)
+    monkeypatch.setattr(llm, "cache", cache)
+    return cache
+
+
+def test_concurrent_identical_asks_make_one_call(cache):
+    fake = llm.FakeAsyncClient(latency=0.05)
+
+    async def run():
+        return await asyncio.gather(*(llm.acomplete(MESSAGES, client=fake) for _ in range(20)))
+
+    respuestas = asyncio.run(run())
+    assert fake.calls == 1
+    assert len(set(respuestas)) == 1
+    assert cache.stats["misses"] == 1 and cache.stats["coalesced"] == 19
+    # Prompt equivalente (solo cambian los espacios): sale de la caché
+    equivalente = [{"role": "user", "content": "Genera una predicción de seguridad para Santander. "}]
+    assert asyncio.run(llm.acomplete(equivalente, client=fake)) == respuestas[0]
+    assert fake.calls == 1
+
+
+def test_expired_entry_is_fetched_again(cache, monkeypatch):
+    fake = llm.FakeAsyncClient()
+    ahora = [time.time()]
+    monkeypatch.setattr(llm.time, "time", lambda: ahora[0])
+    asyncio.run(llm.acomplete(MESSAGES, client=fake))
+    ahora[0] += cache.ttl - 1
+    asyncio.run(llm.acomplete(MESSAGES, client=fake))
+    assert fake.calls == 1
+    ahora[0] += 2
+    asyncio.run(llm.acomplete(MESSAGES, client=fake))
+    assert fake.calls == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others(cache):
+    fake = llm.FakeAsyncClient(latency=0.05)
+
+    async def run():
+        primera = asyncio.ensure_future(llm.acomplete(MESSAGES, client=fake))
+        await asyncio.sleep(0)
+        segunda = asyncio.ensure_future(llm.acomplete(MESSAGES, client=fake))
+        await asyncio.sleep(0)
+        primera.cancel()
+        return await segunda, primera.cancelled()
+
+    respuesta, cancelada = asyncio.run(run())
+    assert cancelada
+    assert respuesta.startswith(f"[{llm.MODEL_NAME}]")
+    assert fake.calls == 1
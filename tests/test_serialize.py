@@ -0,0 +1,73 @@
+# tests/test_serialize.py
+import json
+import pandas as pd
+import pytest
+from fastapi.encoders import jsonable_encoder
+from app.models.schemas import CrimeRecentRecord, GeoIncident
+from app.routers import crimes, geo
+from app.services import index, serialize
+from conftest import GEO_CSV
+
+
+def _severidad(r):
+    cantidad = r.get("cantidad", 0) or 0
+    return "crítica" if cantidad >= 3 else ("alta" if cantidad == 2 else "media")
+
+
+def _legacy_recent(df):
+    # Camino anterior de /crimes/recent: iterrows + un modelo Pydantic por fila
+    out = []
+    for i, r in df.iterrows():
+        out.append(CrimeRecentRecord(
+            id=f"#{i:03d}",
+            tipo=str(r.get("tipo_delito", "OTRO")),
+            descripcion=f"Reporte reciente de {r.get('delito')}",
+            ubicacion=f"{str(r.get('municipio', ''))}, {str(r.get('departamento', ''))}",
+            fecha=str(r["fecha_hecho"]),
+            severidad=_severidad(r),
+            estado="En Atención",
+        ))
+    return jsonable_encoder(out)
+
+
+def _legacy_incidents(df, geo_df):
+    # Camino anterior de /geo/incidents: merge por petición + iterrows + modelo por fila
+    df = df.drop(columns=["lat", "lon"], errors="ignore").reset_index(drop=True)
+    df["codigo_dane"] = df["codigo_dane"].astype(str)
+    geo_df["codigo_dane"] = geo_df["codigo_dane"].astype(str)
+    df = df.merge(geo_df, on="codigo_dane", how="left")
+    return jsonable_encoder([
+        GeoIncident(lat=float(r.get("lat", 0)), lon=float(r.get("lon", 0)), severidad=_severidad(r),
+                    estado="En Atención", municipio=str(r.get("municipio", "")))
+        for _, r in df.iterrows()
+    ])
+
+
+def _as_object(df):
+    # El camino anterior leía textos como object con None para los nulos
+    df = df.copy()
+    for col in df.select_dtypes(include="category").columns:
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
+
+
+@pytest.mark.parametrize("limit", [1, 100, 1000])
+def test_recent_matches_iterrows(master_store, limit):
+    from app.services import store
+    df = store.get("master")
+    esperado = _legacy_recent(_as_object(df.iloc[index.get("master").order[:limit]]))
+    assert json.loads(crimes.recent(limit=limit, cursor=None).body) == esperado
+
+
+@pytest.mark.parametrize("limit", [1, 200])
+def test_incidents_match_iterrows(master_store, limit):
+    from app.services import store
+    df = store.get("master")
+    geo_df = pd.read_csv(GEO_CSV, encoding="utf-8-sig")[["codigo_dane", "lat", "lon"]]
+    esperado = _legacy_incidents(_as_object(df.iloc[index.get("master").order[:limit]]), geo_df)
+    assert json.loads(geo._incidents(limit).body) == esperado
+
+
+def test_severidad_and_texto():
+    assert serialize.severidad(pd.Series([None, 1, 2, 3, 7])).tolist() == ["media", "media", "alta", "crítica", "crítica"]
+    assert serialize.texto(pd.Series(["A", None], dtype="category")).tolist() == ["A", "None"]
@@ -0,0 +1,132 @@
+# tests/test_spatial.py
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.services import spatial
+from app.services.spatial import CELL_DEG, GridIndex
+
+# Bordes del bbox sobre límites de celda de la grilla (múltiplos de CELL_DEG)
+BORDES = (6.95, -73.25, 7.2, -73.0)
+
+
+@pytest.fixture(scope="module")
+def puntos():
+    # Eventos en el orden del índice de master (fecha desc), con coordenadas justo en los
+    # bordes de celda y del bbox y algunas filas sin coordenadas
+    rng = np.random.default_rng(5)
+    n = 6000
+    lat = rng.uniform(6.8, 7.4, n).round(3)
+    lon = rng.uniform(-73.4, -72.8, n).round(3)
+    bordes = rng.choice(n, 600, replace=False)
+    lat[bordes[:300]] = rng.choice([BORDES[0], BORDES[2], 7.0, 7.05, 7.1, 7.15], 300)
+    lon[bordes[300:]] = rng.choice([BORDES[1], BORDES[3], -73.2, -73.15, -73.1, -73.05], 300)
+    lat[rng.choice(n, 50, replace=False)] = np.nan
+    lon[rng.choice(n, 50, replace=False)] = np.nan
+    fechas = np.sort(rng.integers(1_600_000_000, 1_700_000_000, n) * 10 ** 9)[::-1].copy()
+    return lat, lon, fechas, rng.integers(1, 4, n).astype(float)
+
+
+def _fuerza_bruta(lat, lon, fechas, bbox=None, desde=None, hasta=None):
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        ok &= (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+    if desde is not None:
+        ok &= fechas >= desde
+    if hasta is not None:
+        ok &= fechas <= hasta
+    return np.flatnonzero(ok)
+
+
+def _bboxes(seed=0, n=100):
+    rng = np.random.default_rng(seed)
+    yield BORDES
+    yield (7.0, -73.2, 7.0, -73.2)
+    yield (8.0, -74.0, 8.5, -73.5)
+    for _ in range(n):
+        lat0, lon0 = rng.uniform(6.7, 7.4), rng.uniform(-73.5, -72.8)
+        alto, ancho = rng.uniform(0, 0.4, 2)
+        if rng.random() < 0.3:
+            # Bordes sobre límites de celda
+            lat0, lon0 = round(lat0 / CELL_DEG) * CELL_DEG, round(lon0 / CELL_DEG) * CELL_DEG
+            alto, ancho = round(alto / CELL_DEG) * CELL_DEG, round(ancho / CELL_DEG) * CELL_DEG
+        yield (lat0, lon0, lat0 + alto, lon0 + ancho)
+
+
+def test_query_matches_brute_force(puntos):
+    lat, lon, fechas, cantidad = puntos
+    grid = GridIndex(lat, lon, fechas, cantidad)
+    assert grid.query().tolist() == _fuerza_bruta(lat, lon, fechas).tolist()
+    for bbox in _bboxes():
+        assert grid.query(bbox).tolist() == _fuerza_bruta(lat, lon, fechas, bbox).tolist(), bbox
+        assert grid.query(bbox, limit=7).tolist() == _fuerza_bruta(lat, lon, fechas, bbox)[:7].tolist(), bbox
+
+
+def test_window_matches_brute_force(puntos):
+    lat, lon, fechas, cantidad = puntos
+    grid = GridIndex(lat, lon, fechas, cantidad)
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        desde, hasta = np.sort(rng.choice(fechas, 2))
+        inicio, fin = grid.window(desde, hasta)
+        assert np.arange(inicio, fin).tolist() == np.flatnonzero((fechas >= desde) & (fechas <= hasta)).tolist()
+        # Límites exactos de la ventana: una fecha igual a desde o hasta se incluye
+        assert grid.query(BORDES, desde, hasta).tolist() == _fuerza_bruta(lat, lon, fechas, BORDES, desde, hasta).tolist()
+    assert grid.window(None, None) == (0, len(fechas))
+
+
+@pytest.mark.parametrize("zoom", [6, 9, 12, 15])
+def test_bins_keep_every_point(puntos, zoom):
+    lat, lon, fechas, cantidad = puntos
+    grid = GridIndex(lat, lon, fechas, cantidad)
+    for rangos in (grid.rangos, grid.query(BORDES)):
+        celdas = grid.bins(rangos, zoom)
+        assert int(celdas["eventos"].sum()) == len(rangos)
+        assert int(celdas["incidentes"].sum()) == int(cantidad[rangos].sum())
+        assert celdas[["lat", "lon"]].notna().all().all()
+
+
+@pytest.mark.parametrize("zoom", [8, 12, 16])
+def test_declutter_keeps_the_most_recent_marker_per_square(puntos, zoom):
+    lat, lon, fechas, cantidad = puntos
+    grid = GridIndex(lat, lon, fechas, cantidad)
+    rangos = grid.query(BORDES)
+    grados = spatial.MARKER_PX * 360.0 / (256 * 2 ** zoom)
+    cuadro = pd.Series(list(zip(np.floor(lat[rangos] / grados), np.floor(lon[rangos] / grados))))
+    esperado = rangos[~cuadro.duplicated().to_numpy()]
+    assert grid.declutter(rangos, zoom).tolist() == esperado.tolist()
+
+
+def test_incidents_endpoint_matches_brute_force(master_store):
+    from app.main import app
+    master = master_store.sort_values("fecha_hecho", ascending=False, kind="stable")
+    lat, lon = master["lat"].to_numpy(), master["lon"].to_numpy()
+    min_lat, max_lat = float(np.min(lat)), float(np.median(lat))
+    min_lon, max_lon = float(np.min(lon)), float(np.max(lon))
+    esperado = master[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+    r = TestClient(app).get("/geo/incidents", params={"min_lat": min_lat, "min_lon": min_lon, "max_lat": max_lat,
+                                                      "max_lon": max_lon, "limit": 5000})
+    assert r.status_code == 200
+    assert [(i["lat"], i["lon"], i["municipio"]) for i in r.json()] == \
+        list(zip(esperado["lat"], esperado["lon"], esperado["municipio"]))
+
+
+def test_heatmap_follows_the_dataset_version(master_store, tmp_path, monkeypatch):
+    # El heatmap se cachea por (zoom, versión): al recargar master no se sirven celdas viejas
+    from app.main import app
+    from app.services import store
+    from conftest import synthetic_master
+    client = TestClient(app)
+    antes = client.get("/geo/heatmap", params={"zoom": 9}).json()
+    assert sum(c["eventos"] for c in antes) == len(master_store)
+
+    nuevo = synthetic_master(n=1200, seed=7)
+    nuevo["cantidad"] = 5
+    path = tmp_path / "master_v2.parquet"
+    nuevo.to_parquet(path, index=False)
+    monkeypatch.setitem(store.ARTIFACTS, "master", path)
+    despues = client.get("/geo/heatmap", params={"zoom": 9}).json()
+    assert sum(c["eventos"] for c in despues) == len(nuevo)
+    assert sum(c["incidentes"] for c in despues) == 5 * len(nuevo)
+    assert despues != antes
@@ -0,0 +1,12 @@
+# tests/test_store.py
+from app.services import store
+
+
+def test_stats_report_process_rss_and_frame_size(master_store):
+    store.get("master")
+    stats = store.stats()
+    assert stats["rss_mb"] > 0
+    master = stats["datasets"]["master"]
+    assert master["rows"] == len(master_store)
+    assert 0 < master["frame_mb"] < master["rss_mb"]
+    assert "df" not in master and "signature" not in master
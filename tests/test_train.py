@@ -0,0 +1,62 @@
+# tests/test_train.py
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import inference, train
+
+
+@pytest.fixture(scope="module")
+def frame():
+    # Municipio-mes sintético con las columnas de train.FEATURES y un target que depende de ellas
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({
+        "departamento": rng.choice(["SANTANDER", "BOYACA"], n, p=[0.9, 0.1]),
+        "anio": rng.choice([2022, 2023, 2024], n),
+        "mes": rng.integers(1, 13, n),
+        "tasa_delitos_muni_mes_lag": rng.gamma(2.0, 1.5, n),
+        "tasa_delitos_dep_mes_lag": rng.gamma(3.0, 1.0, n),
+        "acumulado_90d": rng.poisson(20, n).astype(float),
+        "eventos": rng.integers(1, 30, n),
+    })
+    df.loc[rng.random(n) < 0.05, "tasa_delitos_muni_mes_lag"] = np.nan
+    riesgo = df["tasa_delitos_muni_mes_lag"].fillna(0) + 0.05 * df["acumulado_90d"] + rng.normal(0, 1, n)
+    df["riesgo_alto"] = (riesgo > riesgo.median()).astype(int)
+    return df
+
+
+@pytest.mark.parametrize("name", train.ESTIMATORS)
+def test_compact_export_matches_pipeline(frame, name):
+    if name == "xgb":
+        pytest.importorskip("xgboost")
+    params = {"n_estimators": 30} if name != "hgb" else {"max_iter": 30}
+    model = train.make_pipeline(name, threads=1, **params)
+    with train.thread_limit(1):
+        model.fit(frame[train.FEATURES], frame[train.TARGET], clf__sample_weight=train.sample_weight(frame))
+        esperado = model.predict_proba(frame[train.FEATURES])
+    compact = inference.export(model, "municipio_mes")
+    # xgb puntúa en float32
+    np.testing.assert_allclose(compact.predict_proba(frame[train.FEATURES]), esperado,
+                               atol=1e-6 if name == "xgb" else 1e-12)
+    np.testing.assert_array_equal(compact.classes_, model.classes_)
+    with train.thread_limit(1):
+        np.testing.assert_array_equal(compact.predict(frame[train.FEATURES]), model.predict(frame[train.FEATURES]))
+
+
+def test_compact_predict_breaks_ties_like_sklearn(frame, monkeypatch):
+    model = train.make_pipeline("gb", n_estimators=5)
+    model.fit(frame[train.FEATURES], frame[train.TARGET])
+    compact = inference.export(model)
+    # Logit 0 -> probabilidad 0.5 exacta: argmax de sklearn elige la primera clase
+    monkeypatch.setattr(compact, "decision_function", lambda X: np.zeros(len(X)))
+    X = frame[train.FEATURES].head(3)
+    assert compact.predict(X).tolist() == [model.classes_[np.argmax([0.5, 0.5])]] * 3
+
+
+def test_export_fails_loudly_without_sklearn_internals(frame):
+    model = train.make_pipeline("hgb", threads=1, max_iter=5)
+    with train.thread_limit(1):
+        model.fit(frame[train.FEATURES], frame[train.TARGET])
+    del model.named_steps["clf"]._baseline_prediction
+    with pytest.raises(RuntimeError, match="_baseline_prediction"):
+        inference.export(model)